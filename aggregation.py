@@ -0,0 +1,90 @@
+import collections
+import os
+
+import numpy as np
+
+import cost_engine
+import scenario_cache
+
+#-----------------------------------------------------------------------
+#AGGREGATION
+#-----------------------------------------------------------------------
+# Every typology is a bar in each of the fuel subplots, so a district with
+# hundreds of typologies (or buildings) would ship megabytes of figure JSON.
+# Past MAX_BARS rows the chart switches to buckets whose $/sf is computed
+# from summed capital cost and floor area, so each bucket is the true
+# floor-area weighted cost of its members:
+#   typology   one bar per row (no aggregation)
+#   top_n      the MAX_BARS - 1 costliest rows plus an 'Other' bucket
+#   occupancy  one bar per typology_occupany (past OCCUPANCY_ROWS rows)
+
+MAX_BARS = int(os.environ.get('MAX_BARS', 30))
+OCCUPANCY_ROWS = int(os.environ.get('OCCUPANCY_ROWS', 5000))
+OTHER = 'Other'
+
+# mode    'typology' | 'top_n' | 'occupancy'
+# labels  bucket names, in chart order
+# index   bucket number of every input row
+Grouping = collections.namedtuple('Grouping', ['mode', 'labels', 'index'])
+
+
+def choose_mode(n_rows, n_occupancies, max_bars=MAX_BARS, occupancy_rows=OCCUPANCY_ROWS):
+    if n_rows <= max_bars:
+        return 'typology'
+    if n_rows > occupancy_rows and n_occupancies <= max_bars:
+        return 'occupancy'
+    return 'top_n'
+
+
+def choose_grouping(inputs, scenario, max_bars=MAX_BARS, occupancy_rows=OCCUPANCY_ROWS):
+    """Bucket the rows of inputs; top_n ranks rows by their mean total $/sf
+    over all fuels in `scenario` (the default slider position), so buckets
+    stay put while the sliders move."""
+    n = len(inputs.typology_name)
+    occupancies = list(dict.fromkeys(inputs.typology_occupany))
+    mode = choose_mode(n, len(occupancies), max_bars, occupancy_rows)
+    if mode == 'typology':
+        return Grouping(mode, inputs.typology_name, np.arange(n))
+    if mode == 'occupancy':
+        position = {o: k for k, o in enumerate(occupancies)}
+        return Grouping(mode, tuple(occupancies), np.array([position[o] for o in inputs.typology_occupany]))
+
+    keep = max_bars - 1
+    ranking = np.argsort(-scenario.costs.total.mean(axis=1), kind='stable')
+    index = np.full(n, keep)
+    index[ranking[:keep]] = np.arange(keep)
+    labels = tuple(inputs.typology_name[k] for k in ranking[:keep]) + (OTHER,)
+    return Grouping(mode, labels, index)
+
+
+def chart_grouping(inputs, catalog=cost_engine.FUEL_CATALOG):
+    """The grouping the dashboard plots: ranked at the default slider position."""
+    ct, payback, elec, interest = scenario_cache.DEFAULT_KEY
+    default = cost_engine.evaluate_scenario(inputs, ct, payback, interest / 100, elec, catalog)
+    return choose_grouping(inputs, default)
+
+
+def group_inputs(inputs, grouping):
+    """DistrictInputs with one row per bucket of grouping."""
+    if grouping.mode == 'typology':
+        return inputs
+    k = len(grouping.labels)
+    index = grouping.index
+    sf = np.bincount(index, weights=inputs.typology_sf, minlength=k)
+    base_fuel_cost = np.bincount(index, weights=inputs.base_fuel_cost * inputs.typology_sf, minlength=k) / sf
+    mech_cost = np.zeros((k, len(inputs.fuels)))
+    elec_cost = np.zeros((k, len(inputs.fuels)))
+    np.add.at(mech_cost, index, inputs.mech_cost)
+    np.add.at(elec_cost, index, inputs.elec_cost)
+    if grouping.mode == 'occupancy':
+        occupancy = grouping.labels
+    else:
+        occupancy = tuple(inputs.typology_occupany[np.flatnonzero(index == b)[0]] for b in range(k - 1)) + ('Mixed',)
+    return cost_engine.make_inputs(grouping.labels, occupancy, sf, base_fuel_cost, mech_cost, elec_cost, inputs.fuels)
+
+
+def members(grouping, label):
+    """Row numbers of the inputs that make up the bucket `label`."""
+    if label not in grouping.labels:
+        return np.array([], dtype=int)
+    return np.flatnonzero(grouping.index == grouping.labels.index(label))
@@ -0,0 +1,47 @@
+import numpy as np
+
+#-----------------------------------------------------------------------
+#ANNUITY FACTOR TABLE
+#-----------------------------------------------------------------------
+# The payback and interest sliders are discrete (1..40 years, 0..10% in
+# 0.5% steps), so the factor that turns a capital cost into a yearly payment
+# is looked up from a table built once at import instead of being
+# recomputed through the amortization package on every callback.
+
+PERIODS = np.arange(1, 41)                # payback-slider, years
+RATES = np.arange(0, 10.5, 0.5) / 100     # interest-slider, fraction per year
+RATE_STEP = 0.005
+
+
+def annuity_factor(rate, period):
+    """Yearly payment per $ of principal: r(1+r)^n / ((1+r)^n - 1).
+
+    Broadcasts over arrays. A 0% rate uses the limit 1/n, where the
+    closed form would divide 0 by 0.
+    """
+    rate = np.asarray(rate, dtype=float)
+    period = np.asarray(period, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = (1 + rate) ** period
+        factor = rate * x / (x - 1)
+    return np.where(rate == 0, 1 / period, factor)
+
+
+def _build_table():
+    table = annuity_factor(RATES[:, None], PERIODS[None, :])
+    table.setflags(write=False)
+    return table
+
+
+TABLE = _build_table()   # rate x period
+
+
+def factor(rate, period):
+    """Table lookup for slider positions, closed form for anything off-grid."""
+    i = int(round(rate / RATE_STEP))
+    j = int(period) - 1
+    if 0 <= i < len(RATES) and 0 <= j < len(PERIODS) and period == j + 1 \
+            and abs(RATES[i] - rate) < 1e-12:
+        return float(TABLE[i, j])
+    return float(annuity_factor(rate, period))
+
@@ -0,0 +1,199 @@
+import math
+import os
+import zlib
+
+import brotli
+import flask
+import numpy as np
+import orjson
+
+import cost_engine
+import scenario_cache
+
+#-----------------------------------------------------------------------
+#BATCH SCENARIO API
+#-----------------------------------------------------------------------
+# POST /api/scenarios evaluates many slider positions in one go for
+# planning tools, with the same cost formulas as the chart:
+#
+#   {"scenarios": [{"carbon_tax": 170, "amortization_period": 20,
+#                   "interest_rate": 5, "electricity_price": 0.16,
+#                   "fuels": {"gh": {"pgj_rate": 45}}}, ...]}
+#
+# interest_rate is in % like the slider; "fuels" optionally overrides
+# pgj_rate, ct_rate or cop of a fuel for that scenario. The response is
+#
+#   {"typologies": [...], "fuels": [...], "results": [
+#       {"scenario": {...}, "mech": [[...]], "elec": ..., "fuel": ..., "total": ...}]}
+#
+# with typology x fuel $/sf matrices. The whole batch is validated before
+# anything is evaluated; results are then computed API_CHUNK scenarios at a
+# time and streamed (compressed chunk by chunk), so response size does not
+# set the worker's memory.
+
+API_MAX_SCENARIOS = int(os.environ.get('API_MAX_SCENARIOS', 10000))
+API_MAX_CELLS = int(os.environ.get('API_MAX_CELLS', 20_000_000))   # scenarios x typologies x fuels
+API_MAX_BODY = int(os.environ.get('API_MAX_BODY', 8 * 2**20))     # request bytes
+API_CHUNK = int(os.environ.get('API_CHUNK', 256))
+OVERRIDABLE = {'pgj_rate': 0.0, 'ct_rate': 0.0, 'cop': None}       # parameter -> lowest allowed value (cop > 0)
+COMPONENTS = ('mech', 'elec', 'fuel', 'total')
+
+
+class BadRequest(ValueError):
+    """Invalid batch; status is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400, index=None):
+        super().__init__(message)
+        self.status = status
+        self.index = index
+
+
+def _number(scenario, name, index):
+    value = scenario.get(name)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise BadRequest(f'{name} must be a number', index=index)
+    low, high = scenario_cache.SLIDER_RANGES[name]
+    if not low <= value <= high:
+        raise BadRequest(f'{name}={value} is outside the slider range [{low}, {high}]', index=index)
+    return value
+
+
+def _overrides(scenario, fuels, index):
+    given = scenario.get('fuels', {})
+    if not isinstance(given, dict):
+        raise BadRequest('fuels must be an object', index=index)
+    for fuel, parameters in given.items():
+        if fuel not in fuels:
+            raise BadRequest(f'unknown fuel {fuel!r}', index=index)
+        if not isinstance(parameters, dict):
+            raise BadRequest(f'fuels.{fuel} must be an object', index=index)
+        for name, value in parameters.items():
+            if name not in OVERRIDABLE:
+                raise BadRequest(f'fuels.{fuel}.{name}: only {sorted(OVERRIDABLE)} can be overridden', index=index)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise BadRequest(f'fuels.{fuel}.{name} must be a number', index=index)
+            low = OVERRIDABLE[name]
+            if (value <= 0) if low is None else (value < low):
+                raise BadRequest(f'fuels.{fuel}.{name}={value} is out of range', index=index)
+    return given
+
+
+def parse_batch(payload, inputs, catalog=cost_engine.FUEL_CATALOG):
+    """Validated request -> (echoed scenarios, per-scenario parameter arrays)."""
+    if not isinstance(payload, dict) or not isinstance(payload.get('scenarios'), list):
+        raise BadRequest('body must be {"scenarios": [...]}')
+    scenarios = payload['scenarios']
+    if not scenarios:
+        raise BadRequest('no scenarios')
+    cells = len(scenarios) * len(inputs.typology_name) * len(inputs.fuels)
+    if len(scenarios) > API_MAX_SCENARIOS or cells > API_MAX_CELLS:
+        raise BadRequest(f'batch too large: at most {API_MAX_SCENARIOS} scenarios and '
+                         f'{API_MAX_CELLS} typology x fuel results per request', status=413)
+
+    fuels = inputs.fuels
+    n = len(scenarios)
+    ct, period, rate = np.empty(n), np.empty(n, dtype=int), np.empty(n)
+    pgj_rate, ct_rate, cop = np.empty((n, len(fuels))), np.empty((n, len(fuels))), np.empty((n, len(fuels)))
+    base_ct_rate = catalog.column('ct_rate', fuels)
+    base_cop = catalog.column('cop', fuels)
+    echo = []
+    for index, scenario in enumerate(scenarios):
+        if not isinstance(scenario, dict):
+            raise BadRequest('scenario must be an object', index=index)
+        tax = _number(scenario, 'carbon_tax', index)
+        ct[index] = tax
+        years = _number(scenario, 'amortization_period', index)
+        if years != int(years):
+            raise BadRequest('amortization_period must be a whole number of years', index=index)
+        period[index] = int(years)
+        interest = _number(scenario, 'interest_rate', index)
+        rate[index] = interest / 100
+        elec = _number(scenario, 'electricity_price', index)
+        given = _overrides(scenario, fuels, index)
+        pgj_rate[index] = cost_engine.fuel_pgj_rates(catalog, fuels, elec)
+        ct_rate[index] = base_ct_rate
+        cop[index] = base_cop
+        for fuel, parameters in given.items():
+            k = fuels.index(fuel)
+            for name, value in parameters.items():
+                {'pgj_rate': pgj_rate, 'ct_rate': ct_rate, 'cop': cop}[name][index, k] = value
+        echo.append({'carbon_tax': tax, 'amortization_period': int(years), 'interest_rate': interest,
+                     'electricity_price': elec, 'fuels': given})
+    return echo, (pgj_rate, ct_rate, cop, ct, rate, period)
+
+
+def evaluate_chunks(inputs, parameters, chunk=API_CHUNK):
+    """CostResult of each run of `chunk` scenarios, in order."""
+    pgj_rate, ct_rate, cop, ct, rate, period = parameters
+    for start in range(0, len(ct), chunk):
+        part = slice(start, start + chunk)
+        yield cost_engine.compute_costs_batch(inputs, pgj_rate[part], ct_rate[part], cop[part],
+                                              ct[part], rate[part], period[part])
+
+
+def response_body(inputs, echo, parameters, chunk=API_CHUNK):
+    """The response JSON in pieces, one per chunk of scenarios."""
+    head = orjson.dumps({'typologies': list(inputs.typology_name), 'fuels': list(inputs.fuels)})
+    yield head[:-1] + b',"results":['
+    start = 0
+    for costs in evaluate_chunks(inputs, parameters, chunk):
+        rows = []
+        for k in range(len(costs.total)):
+            row = {'scenario': echo[start + k]}
+            row.update((c, np.ascontiguousarray(getattr(costs, c)[k])) for c in COMPONENTS)
+            rows.append(orjson.dumps(row, option=orjson.OPT_SERIALIZE_NUMPY))
+        yield (b',' if start else b'') + b','.join(rows)
+        start += len(costs.total)
+    yield b']}'
+
+
+def encoded(pieces, encoding):
+    """Compress a stream of byte pieces as it goes; encoding is 'br', 'gzip' or None."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=4)
+        for piece in pieces:
+            yield compressor.process(piece) + compressor.flush()
+        yield compressor.finish()
+    elif encoding == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for piece in pieces:
+            yield compressor.compress(piece) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    else:
+        yield from pieces
+
+
+def _error(message, status, index=None):
+    body = {'error': message}
+    if index is not None:
+        body['index'] = index
+    return flask.Response(orjson.dumps(body), status=status, content_type='application/json')
+
+
+def init_app(server, get_inputs, catalog=cost_engine.FUEL_CATALOG):
+    """Register POST /api/scenarios; get_inputs() returns the DistrictInputs to evaluate."""
+
+    @server.route('/api/scenarios', methods=['POST'])
+    def _scenarios():
+        if (flask.request.content_length or 0) > API_MAX_BODY:
+            return _error(f'request body over {API_MAX_BODY} bytes', 413)
+        try:
+            payload = orjson.loads(flask.request.get_data())
+        except orjson.JSONDecodeError as e:
+            return _error(f'invalid JSON: {e}', 400)
+        inputs = get_inputs()
+        try:
+            echo, parameters = parse_batch(payload, inputs, catalog)
+        except BadRequest as e:
+            return _error(str(e), e.status, e.index)
+
+        # compressed here, chunk by chunk: flask-compress would buffer the stream
+        encoding = flask.request.accept_encodings.best_match(['br', 'gzip'])
+        response = flask.Response(encoded(response_body(inputs, echo, parameters), encoding),
+                                  content_type='application/json', direct_passthrough=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+            response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    return server
@@ -0,0 +1,291 @@
+"""Micro-benchmarks for the update_graph path.
+
+Times each phase separately over a grid of slider positions and over
+synthetic district files scaled up from district_data.csv:
+
+    cost        cost_engine.evaluate_scenario
+    traces      make_subplots + the per-fuel bar traces
+    layout      average hlines, annotations and axis/layout updates
+    serialize   plotly JSON encoding of the full figure
+    patch       figures.build_patch + its JSON encoding
+    endpoint    POST /_dash-update-component through the Flask test client
+                (cold = caches cleared, warm = cache hit), real data only
+    fuels       figures.build_figure / build_patch on catalogs stretched to N
+                fuels (variants sharing the base fuels' capital costs);
+                past figures.FACET_FUELS the figure is faceted
+    first_chart time to first chart of a page load through the test client:
+                index, then layout and dependencies (fetched in parallel by
+                the browser, so the slower one counts), then any initial
+                callback that outputs graph_output.figure; 'repeat' sends
+                the layout's ETag back like a returning browser. Server
+                time only, no network or rendering
+
+Run from the repository root, fully offline:
+
+    python -m benchmarks.bench_callback --rows 9 1000 100000 --output bench.json
+"""
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+from plotly.subplots import make_subplots
+
+import cost_engine
+import figures
+
+DATA_PATH = 'district_data.csv'
+SLIDER_GRID = {
+    'ct': (30, 170, 340),
+    'payback': (1, 20, 40),
+    'elec': (0.0, 0.16, 0.30),
+    'interest': (0, 5, 10),
+}
+
+
+def slider_grid(limit=None):
+    grid = list(itertools.product(*SLIDER_GRID.values()))
+    return grid[:limit] if limit else grid
+
+
+def synthetic_district(rows, seed=0, path=DATA_PATH):
+    """district_data.csv resampled to `rows` rows with +-20% noise on costs."""
+    base = pd.read_csv(path)
+    rng = np.random.default_rng(seed)
+    df = base.iloc[rng.integers(0, len(base), rows)].reset_index(drop=True)
+    numeric = [c for c in df.columns if c.endswith('_cost') or c == 'typology_sf']
+    df[numeric] = df[numeric] * rng.uniform(0.8, 1.2, size=(rows, len(numeric)))
+    df['typology_name'] = [f'{name}_{k}' for k, name in enumerate(df['typology_name'])]
+    return df
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    return {'n': len(ordered),
+            'mean_ms': statistics.fmean(ordered) * 1e3,
+            'p50_ms': ordered[len(ordered) // 2] * 1e3,
+            'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1e3,
+            'p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e3,
+            'min_ms': ordered[0] * 1e3}
+
+
+def bench_phases(inputs, grid, repeat):
+    catalog = cost_engine.FUEL_CATALOG
+    phases = {name: [] for name in ('cost', 'traces', 'layout', 'serialize', 'patch')}
+    payload = {'figure_bytes': 0, 'patch_bytes': 0}
+    for ct, payback, elec, interest in grid:
+        scenario = None
+
+        def cost():
+            nonlocal scenario
+            scenario = cost_engine.evaluate_scenario(inputs, ct, payback, interest / 100, elec, catalog)
+        phases['cost'] += _time(cost, repeat)
+
+        fig = None
+
+        def traces():
+            nonlocal fig
+            fig = make_subplots(rows=1, cols=len(inputs.fuels))
+            figures.add_cost_traces(fig, scenario, inputs, catalog)
+        phases['traces'] += _time(traces, repeat)
+
+        def layout():
+            figures.add_average_lines(fig, scenario, inputs, catalog)
+            figures.add_annotations(fig, scenario)
+        # hlines/annotations accumulate, so the layout phase is timed once per figure
+        phases['layout'] += _time(layout, 1)
+
+        encoded = None
+
+        def serialize():
+            nonlocal encoded
+            encoded = pio.to_json(fig, validate=False)
+        phases['serialize'] += _time(serialize, repeat)
+
+        patch_encoded = None
+
+        def patch():
+            nonlocal patch_encoded
+            patch_encoded = pio.to_json(figures.build_patch(scenario, inputs, catalog), validate=False)
+        phases['patch'] += _time(patch, repeat)
+
+        payload['figure_bytes'] = max(payload['figure_bytes'], len(encoded))
+        payload['patch_bytes'] = max(payload['patch_bytes'], len(patch_encoded))
+    return {name: _summary(samples) for name, samples in phases.items()}, payload
+
+
+def update_component_body(ct, payback, elec, interest):
+    values = {'ct-slider': ct, 'payback-slider': payback, 'elec-slider': elec, 'interest-slider': interest,
+              'uncertainty-toggle': []}
+    return {'output': 'graph_output.figure',
+            'outputs': {'id': 'graph_output', 'property': 'figure'},
+            'inputs': [{'id': k, 'property': 'value', 'value': v} for k, v in values.items()],
+            'changedPropIds': ['ct-slider.value']}
+
+
+def bench_endpoint(grid, repeat):
+    import dashboard
+    import scenario_cache
+    import shared_cache
+
+    dashboard.prefetcher.workers = 0   # cold means cold: no background warm-up between requests
+    client = dashboard.server.test_client()
+    headers = {'Accept-Encoding': 'br, gzip'}
+    cold, warm, sent = [], [], []
+    for values in grid:
+        body = update_component_body(*values)
+
+        def post():
+            response = client.post('/_dash-update-component', json=body, headers=headers)
+            assert response.status_code == 200, response.status_code
+            sent.append(len(response.data))
+
+        for _ in range(repeat):
+            scenario_cache.scenarios.clear()
+            scenario_cache.figures.clear()
+            if shared_cache.store is not None:
+                shared_cache.store.clear()
+            cold += _time(post, 1)
+        warm += _time(post, repeat)
+    return {'endpoint_cold': _summary(cold), 'endpoint_warm': _summary(warm)}, {'sent_bytes': max(sent)}
+
+
+def bench_first_chart(repeat):
+    import dashboard
+    import scenario_cache
+
+    client = dashboard.server.test_client()
+    headers = {'Accept-Encoding': 'br, gzip'}
+    initial_body = update_component_body(*scenario_cache.DEFAULT_INPUTS)
+    # does the page still need a callback round trip before the chart shows?
+    initial = [d for d in client.get('/_dash-dependencies').json if not d.get('prevent_initial_call')]
+    needs_callback = any('graph_output.figure' in d['output'] for d in initial)
+
+    def timed(request, path, **kwargs):
+        start = time.perf_counter()
+        response = request(path, **kwargs)
+        assert response.status_code in (200, 304), (path, response.status_code)
+        return time.perf_counter() - start, response
+
+    def page_load(etag=None):
+        t_index, _ = timed(client.get, '/', headers=headers)
+        t_layout, layout = timed(client.get, '/_dash-layout',
+                                 headers=dict(headers, **({'If-None-Match': etag} if etag else {})))
+        t_deps, _ = timed(client.get, '/_dash-dependencies', headers=headers)
+        elapsed, requests = t_index + max(t_layout, t_deps), 3
+        if needs_callback:
+            t_update, _ = timed(client.post, '/_dash-update-component', json=initial_body, headers=headers)
+            elapsed, requests = elapsed + t_update, requests + 1
+        return elapsed, requests, layout
+
+    first, again = [], []
+    for _ in range(repeat):
+        elapsed, requests, layout = page_load()
+        first.append(elapsed)
+        elapsed, _, revalidated = page_load(layout.headers.get('ETag'))
+        again.append(elapsed)
+    return ({'first_chart': _summary(first), 'first_chart_repeat': _summary(again)},
+            {'first_chart_requests': requests, 'layout_bytes': len(layout.data),
+             'layout_repeat_bytes': len(revalidated.data)})
+
+
+def synthetic_catalog(n_fuels):
+    """FUEL_CATALOG stretched to n_fuels: COP and blend variants of its fuels."""
+    base = list(cost_engine.FUEL_CATALOG.values())
+    fuels = []
+    for k in range(n_fuels):
+        f = base[k % len(base)]
+        step = k // len(base)
+        if step:
+            f = f._replace(str=f'{f.str}_{step}', label=f'{f.label} {step}', capital=f.capital or f.str,
+                           cop=f.cop * (1 + 0.05 * step) if f.cop > 1 else f.cop,
+                           pgj_adder=f.pgj_adder + 0.5 * step)
+        fuels.append(f)
+    return cost_engine.FuelCatalog(fuels)
+
+
+def bench_fuels(counts, repeat):
+    df = pd.read_csv(DATA_PATH)
+    results = []
+    for n in counts:
+        catalog = synthetic_catalog(n)
+        inputs = cost_engine.load_inputs(df, catalog)
+        scenario = cost_engine.evaluate_scenario(inputs, 30, 20, 0.05, 0.16, catalog)
+        figure = _time(lambda: figures.build_figure(scenario, inputs, catalog), repeat)
+        patch = _time(lambda: pio.to_json(figures.build_patch(scenario, inputs, catalog), validate=False), repeat)
+        results.append({'fuels': n, 'faceted': figures.faceted(inputs),
+                        'phases': {'figure': _summary(figure), 'patch': _summary(patch)}})
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(rows, scenarios=None, repeat=5, fuels=(7, 14, 35)):
+    grid = slider_grid(scenarios)
+    results = []
+    for n in rows:
+        df = synthetic_district(n)
+        inputs = cost_engine.load_inputs(df, cost_engine.FUEL_CATALOG)
+        # large files get a smaller grid so one run stays in minutes
+        run_grid = grid if len(df) <= 10_000 else grid[:3]
+        phases, payload = bench_phases(inputs, run_grid, repeat)
+        results.append({'rows': len(df), 'scenarios': len(run_grid), 'phases': phases, 'payload': payload})
+
+    phases, payload = bench_endpoint(grid, repeat)
+    first_chart, first_chart_payload = bench_first_chart(repeat)
+    phases.update(first_chart)
+    payload.update(first_chart_payload)
+    results.append({'rows': 'district_data.csv', 'scenarios': len(grid), 'phases': phases, 'payload': payload})
+    return {'meta': {'commit': _git_commit(),
+                     'python': platform.python_version(),
+                     'machine': platform.machine(),
+                     'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                     'repeat': repeat},
+            'results': results,
+            'fuels': bench_fuels(fuels, repeat)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[9, 100, 1000, 10_000, 100_000],
+                        help='synthetic district sizes to benchmark')
+    parser.add_argument('--scenarios', type=int, default=None,
+                        help='only use the first N slider combinations of the grid')
+    parser.add_argument('--fuels', type=int, nargs='+', default=[7, 14, 35],
+                        help='fuel catalog sizes for the figure build benchmark')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default='-', help="JSON results file, '-' for stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args.rows, args.scenarios, args.repeat, args.fuels)
+    text = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""One lifecycle projection against one snapshot evaluation.
+
+Times lifecycle.project (every year of a carbon price path in one batch)
+and cost_engine.evaluate_scenario (one year) on district_data.csv:
+
+    snapshot      evaluate_scenario at one slider position
+    projection    project over lifecycle.years()
+    per_year_ms   snapshot mean x number of years, what evaluating the
+                  years one by one would cost
+
+Run from the repository root:
+
+    python -m benchmarks.bench_lifecycle --path rising --output lifecycle.json
+"""
+import argparse
+import json
+import platform
+import time
+
+from benchmarks.bench_callback import DATA_PATH, _git_commit, _summary, _time
+
+import cost_engine
+import lifecycle
+
+
+def run(path='rising', repeat=50, ct=30, int_period=20, int_rate=0.05, elec_value=0.16):
+    inputs = cost_engine.read_inputs(DATA_PATH)
+    n_years = len(lifecycle.years())
+    snapshot = _summary(_time(lambda: cost_engine.evaluate_scenario(inputs, ct, int_period, int_rate, elec_value),
+                              repeat))
+    projection = _summary(_time(lambda: lifecycle.project(inputs, path, ct, int_period, int_rate, elec_value),
+                                repeat))
+    return {'meta': {'commit': _git_commit(),
+                     'python': platform.python_version(),
+                     'machine': platform.machine(),
+                     'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                     'path': path,
+                     'years': n_years},
+            'results': {'snapshot': snapshot,
+                        'projection': projection,
+                        'per_year_ms': snapshot['mean_ms'] * n_years}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', default='rising', choices=sorted(lifecycle.PATHS))
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output', default='-', help="JSON results file, '-' for stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args.path, args.repeat)
+    text = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,392 @@
+"""Concurrent load test: simulated users dragging the dashboard's sliders.
+
+Starts dashboard:server once per deployment and lets --users sessions drag
+the sliders of the served layout (every dcc.Slider in /_dash-layout) for
+--duration seconds after a --ramp of staggered session starts. A session
+starts at the layout's values; each move drags one slider a few steps
+(now and then anywhere in its range), releases it and sends what the
+browser sends on release: one /_dash-update-component POST per callback
+that has the slider among its inputs (from /_dash-dependencies), one after
+the other on the session's keep-alive connection. Then it thinks for an
+exponential time with mean --think seconds (0: a closed loop at full speed).
+
+Deployments, as many as given to --deploy:
+
+    gthread:2x8     gunicorn gthread workers, 2 workers x 8 threads
+    sync:4          gunicorn sync workers, one request at a time each
+    gevent:2x100    gunicorn async workers, 100 connections each (needs gevent)
+    flask           the Flask development server, one thread per request
+
+gunicorn reads gunicorn.conf.py as in production (preload, shared metrics).
+Each deployment gets its own empty shared cache.
+
+Reported per deployment, over the requests sent after the ramp:
+
+    throughput_rps  answered requests per second
+    latency         per request, overall and per callback output
+    move_latency    release until the last POST of the move answered
+    error_rate      share of requests that failed or answered >= 400
+    memory          Rss/Pss of every server process at the end (Linux only)
+                    and the peak Rss sampled during the run
+
+The simulated users run in --clients processes on the same machine as the
+server, so they take CPU from it; keep them to what it takes to produce
+the load, and compare deployments at equal --users and --think.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_load --deploy sync:4 gthread:2x8 flask --users 50 --duration 30
+"""
+import argparse
+import http.client
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_callback import _git_commit, _summary
+from benchmarks.bench_startup import _children, _free_port, _post_default, memory
+
+HEADERS = {'Content-Type': 'application/json', 'Accept-Encoding': 'br, gzip'}
+ASYNC_WORKERS = ('gevent', 'eventlet')
+JUMP = 0.15   # share of moves that drag a slider anywhere in its range
+
+
+#-----------------------------------------------------------------------
+#DEPLOYMENTS
+#-----------------------------------------------------------------------
+
+def parse_deploy(spec):
+    """'gthread:2x8' -> ('gthread', 2, 8); 'flask' -> ('flask', 1, None)."""
+    kind, _, size = spec.partition(':')
+    workers, _, threads = size.partition('x')
+    return kind, int(workers or 1), int(threads) if threads else None
+
+
+def _command(kind, workers, threads, port):
+    if kind == 'flask':
+        return [sys.executable, '-c',
+                f'import dashboard; dashboard.warm_up(); '
+                f'dashboard.server.run(host="127.0.0.1", port={port}, threaded=True)']
+    command = [sys.executable, '-m', 'gunicorn', 'dashboard:server', '--worker-class', kind,
+               '--workers', str(workers), '-b', f'127.0.0.1:{port}']
+    # gunicorn turns sync workers with --threads > 1 into gthread ones
+    if threads and kind == 'gthread':
+        command += ['--threads', str(threads)]
+    elif threads and kind in ASYNC_WORKERS:
+        command += ['--worker-connections', str(threads)]
+    return command
+
+
+def _missing(kind):
+    if kind in ASYNC_WORKERS and importlib.util.find_spec(kind) is None:
+        return f'{kind} is not installed'
+    return None
+
+
+def _rss_kb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+class PeakRss(threading.Thread):
+    """Samples the Rss of a process and its children until stopped."""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            for pid in [self.pid] + _children(self.pid):
+                try:
+                    self.peak[pid] = max(self.peak.get(pid, 0), _rss_kb(pid))
+                except OSError:
+                    pass
+
+
+#-----------------------------------------------------------------------
+#SIMULATED USERS
+#-----------------------------------------------------------------------
+
+def _get(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        return json.loads(response.read())
+    finally:
+        conn.close()
+
+
+def _components(node):
+    if isinstance(node, list):
+        for child in node:
+            yield from _components(child)
+    elif isinstance(node, dict):
+        if 'props' in node:
+            yield node
+            node = node['props']
+        for value in node.values():
+            if isinstance(value, (list, dict)):
+                yield from _components(value)
+
+
+def _spec(ref):
+    component, _, prop = ref.rpartition('.')
+    return {'id': component, 'property': prop}
+
+
+def app_model(port):
+    """(values, sliders, callbacks) of the served app.
+
+    values     {component id: props} from the layout
+    sliders    [(id, min, max, step)] of every dcc.Slider
+    callbacks  {slider id: [dependency]} the callbacks each slider fires
+    """
+    values, sliders = {}, []
+    for node in _components(_get(port, '/_dash-layout')):
+        props = node['props']
+        if isinstance(props.get('id'), str):
+            values[props['id']] = props
+            if node.get('type') == 'Slider':
+                sliders.append((props['id'], props['min'], props['max'], props.get('step') or 1))
+    callbacks = {}
+    for dep in _get(port, '/_dash-dependencies'):
+        if dep['output'].startswith('{') or any(i['id'].startswith('{') for i in dep['inputs']):
+            continue   # pattern-matching ids; the dashboard has none
+        for slider, *_ in sliders:
+            if any(i['id'] == slider and i['property'] == 'value' for i in dep['inputs']):
+                callbacks.setdefault(slider, []).append(dep)
+    return values, sliders, callbacks
+
+
+def _body(dep, values, changed):
+    output = dep['output']
+    if output.startswith('..'):   # several outputs: '..a.x...b.y..'
+        outputs = [_spec(ref) for ref in output[2:-2].split('...')]
+    else:
+        outputs = _spec(output)
+
+    def current(refs):
+        return [dict(ref, value=values.get(ref['id'], {}).get(ref['property'])) for ref in refs]
+    return json.dumps({'output': output, 'outputs': outputs,
+                       'inputs': current(dep['inputs']), 'state': current(dep.get('state', [])),
+                       'changedPropIds': [f'{changed}.value']}).encode()
+
+
+def _move(rng, value, low, high, step):
+    positions = round((high - low) / step)
+    k = round((value - low) / step)
+    if rng.random() < JUMP:
+        k = rng.randint(0, positions)
+    else:
+        distance = 1
+        while rng.random() < 0.5:   # mostly a step or two, sometimes more
+            distance += 1
+        k += distance if rng.random() < 0.5 else -distance
+    k = min(max(k, 0), positions)
+    value = round(low + k * step, 10)
+    return int(value) if value == int(value) and isinstance(step, int) else value
+
+
+class Session:
+    """One user on one keep-alive connection."""
+
+    def __init__(self, port, model, seed):
+        values, self.sliders, self.callbacks = model
+        self.values = {component: dict(props) for component, props in values.items()}
+        self.port = port
+        self.rng = random.Random(seed)
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+
+    def post(self, body):
+        """HTTP status, or None if the request failed."""
+        for attempt in (0, 1):
+            reused = self.conn.sock is not None
+            try:
+                self.conn.request('POST', '/_dash-update-component', body, HEADERS)
+                response = self.conn.getresponse()
+                response.read()
+                return response.status
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                # the server may close an idle keep-alive connection; a browser reconnects
+                if attempt or not reused:
+                    return None
+
+    def move(self, record):
+        slider, low, high, step = self.rng.choice(self.sliders)
+        value = _move(self.rng, self.values[slider]['value'], low, high, step)
+        if value == self.values[slider]['value']:
+            return None
+        self.values[slider]['value'] = value
+        released = time.time()
+        for dep in self.callbacks.get(slider, []):
+            sent = time.time()
+            status = self.post(_body(dep, self.values, slider))
+            record(dep['output'], sent, time.time(), status)
+        return released, time.time()
+
+    def run(self, start, end, think, requests, moves):
+        def record(output, sent, done, status):
+            requests.append((output, sent, done, status))
+        time.sleep(max(0.0, start - time.time()))
+        while time.time() < end:
+            move = self.move(record)
+            if move is not None:
+                moves.append(move)
+            if think:
+                time.sleep(self.rng.expovariate(1 / think))
+        self.conn.close()
+
+
+def run_clients(args):
+    """One client process: its share of the sessions as threads."""
+    port, model, seeds, starts, end, think = args
+    requests, moves = [], []
+    threads = [threading.Thread(target=Session(port, model, seed).run,
+                                args=(start, end, think, requests, moves))
+               for seed, start in zip(seeds, starts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return requests, moves
+
+
+#-----------------------------------------------------------------------
+#ONE DEPLOYMENT
+#-----------------------------------------------------------------------
+
+def _report(requests, moves, window):
+    begin, end = window
+    requests = [r for r in requests if begin <= r[1] and r[2] <= end]
+    moves = [m for m in moves if begin <= m[0] and m[1] <= end]
+    answered = [r for r in requests if r[3] is not None and r[3] < 400]
+    by_output = {}
+    for output, sent, done, status in answered:
+        by_output.setdefault(output, []).append(done - sent)
+    return {'requests': len(requests),
+            'throughput_rps': len(answered) / (end - begin),
+            'error_rate': (len(requests) - len(answered)) / len(requests) if requests else None,
+            'statuses': {str(s): sum(1 for r in requests if r[3] == s) for s in sorted({r[3] or 0 for r in requests})},
+            'latency': _summary([done - sent for _, sent, done, _ in answered]) if answered else None,
+            'latency_by_output': {output: _summary(samples) for output, samples in sorted(by_output.items())},
+            'move_latency': _summary([done - released for released, done in moves]) if moves else None}
+
+
+def run_deployment(spec, users, duration, ramp, think, clients, seed, timeout):
+    kind, workers, threads = parse_deploy(spec)
+    result = {'deploy': spec, 'worker_class': kind, 'workers': workers, 'threads': threads}
+    missing = _missing(kind)
+    if missing:
+        return dict(result, skipped=missing)
+
+    port = _free_port()
+    scratch = tempfile.mkdtemp(prefix='bench-load-')
+    env = dict(os.environ,
+               PROMETHEUS_MULTIPROC_DIR=os.path.join(scratch, 'metrics'),
+               SHARED_CACHE_PATH=os.path.join(scratch, 'cache.sqlite'))
+    env.pop('DASHBOARD_MASTER_PID', None)
+    os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'])   # gunicorn.conf.py makes it, the Flask server does not
+    server = subprocess.Popen(_command(kind, workers, threads, port), env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        launched = time.time()
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f'{spec}: server exited with {server.returncode}')
+            if time.time() - launched > timeout:
+                raise RuntimeError(f'{spec}: no answer within {timeout}s')
+            try:
+                _post_default(port, timeout)
+                break
+            except OSError:
+                time.sleep(0.1)
+        model = app_model(port)
+        if not model[1]:
+            raise RuntimeError(f'{spec}: no dcc.Slider in the layout')
+
+        peak = PeakRss(server.pid)
+        peak.start()
+        start = time.time() + 1   # time for the client processes to start
+        end = start + ramp + duration
+        starts = [start + ramp * k / users for k in range(users)]
+        clients = max(1, min(clients, users))
+        jobs = [(port, model, range(seed + k, seed + users, clients), starts[k::clients], end, think)
+                for k in range(clients)]
+        with multiprocessing.Pool(clients) as pool:
+            shares = pool.map(run_clients, jobs)
+        peak.stopped.set()
+        peak.join()
+
+        requests = [r for share, _ in shares for r in share]
+        moves = [m for _, share in shares for m in share]
+        result.update(_report(requests, moves, (start + ramp, end)))
+        pids = [server.pid] + _children(server.pid)
+        processes = {str(pid): dict(memory(pid), peak_Rss_kb=peak.peak.get(pid, 0)) for pid in pids}
+        result['memory'] = {'processes': processes,
+                            'total_pss_kb': sum(p.get('Pss_kb', 0) for p in processes.values()),
+                            'peak_total_rss_kb': sum(peak.peak.values())}
+        return result
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def run(deploy, users=20, duration=30, ramp=5, think=1.0, clients=2, seed=0, timeout=300):
+    results = [run_deployment(spec, users, duration, ramp, think, clients, seed, timeout) for spec in deploy]
+    return {'meta': {'commit': _git_commit(),
+                     'python': platform.python_version(),
+                     'machine': platform.machine(),
+                     'cpus': os.cpu_count(),
+                     'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                     'users': users,
+                     'duration_s': duration,
+                     'ramp_s': ramp,
+                     'think_s': think,
+                     'clients': clients,
+                     'seed': seed},
+            'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--deploy', nargs='+', default=['sync:4', 'gthread:2x8', 'flask'],
+                        help="worker_class:WORKERSxTHREADS (gthread:2x8, sync:4, gevent:2x100) or 'flask'")
+    parser.add_argument('--users', type=int, default=20, help='concurrent sessions')
+    parser.add_argument('--duration', type=float, default=30, help='seconds measured after the ramp')
+    parser.add_argument('--ramp', type=float, default=5, help='seconds over which the sessions start')
+    parser.add_argument('--think', type=float, default=1.0, help='mean seconds between moves, 0 for none')
+    parser.add_argument('--clients', type=int, default=2, help='client processes the sessions run in')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=300, help='seconds to wait for the server')
+    parser.add_argument('--output', default='-', help="JSON results file, '-' for stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args.deploy, args.users, args.duration, args.ramp, args.think, args.clients,
+                 args.seed, args.timeout)
+    text = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
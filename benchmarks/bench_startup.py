@@ -0,0 +1,153 @@
+"""Cold start and memory of the gunicorn deployment, with and without preload.
+
+Starts gunicorn (gunicorn.conf.py, gthread workers) once with
+GUNICORN_PRELOAD=1 and once with GUNICORN_PRELOAD=0 and reports
+
+    cold_start_s      launch until the default update_graph POST first answers
+    first_requests    latency of the first default update_graph POSTs, one
+                      connection each, so every worker gets some of them
+    memory            Rss, Pss and private/shared kB of the master and each
+                      worker from /proc/<pid>/smaps_rollup (Linux only); the
+                      Pss sum is what the whole deployment really costs
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup --workers 2 --output startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks.bench_callback import _git_commit, _summary, update_component_body
+
+import scenario_cache
+
+SMAPS_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _post_default(port, timeout):
+    body = json.dumps(update_component_body(*scenario_cache.DEFAULT_KEY)).encode()
+    request = urllib.request.Request(f'http://127.0.0.1:{port}/_dash-update-component', data=body,
+                                     headers={'Content-Type': 'application/json', 'Connection': 'close'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+        return response.status
+
+
+def _children(pid):
+    out = []
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            try:
+                with open(f'/proc/{name}/stat') as f:
+                    # the ppid is the second field after the parenthesized command
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        out.append(int(name))
+            except (OSError, IndexError, ValueError):
+                pass
+    return sorted(out)
+
+
+def memory(pid):
+    """kB of SMAPS_FIELDS for one process."""
+    out = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in SMAPS_FIELDS:
+                out[name + '_kb'] = int(rest.split()[0])
+    return out
+
+
+def run_server(preload, workers, threads, requests, timeout):
+    port = _free_port()
+    scratch = tempfile.mkdtemp(prefix='bench-startup-')
+    env = dict(os.environ,
+               GUNICORN_PRELOAD='1' if preload else '0',
+               PROMETHEUS_MULTIPROC_DIR=os.path.join(scratch, 'metrics'),
+               SHARED_CACHE_PATH=os.path.join(scratch, 'cache.sqlite'))
+    env.pop('DASHBOARD_MASTER_PID', None)
+    start = time.perf_counter()
+    master = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'dashboard:server', '--worker-class', 'gthread',
+         '--workers', str(workers), '--threads', str(threads), '-b', f'127.0.0.1:{port}'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if master.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with {master.returncode}')
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError(f'no answer within {timeout}s')
+            try:
+                sent = time.perf_counter()
+                _post_default(port, timeout)
+                break
+            except OSError:
+                time.sleep(0.05)
+        cold_start = time.perf_counter() - start
+        latencies = [time.perf_counter() - sent]
+        for _ in range(requests - 1):
+            sent = time.perf_counter()
+            _post_default(port, timeout)
+            latencies.append(time.perf_counter() - sent)
+        # every worker is up by now in both modes; give late ones a moment to settle
+        while len(_children(master.pid)) < workers and time.perf_counter() - start < timeout:
+            time.sleep(0.05)
+        time.sleep(1)
+        return {'preload': preload,
+                'cold_start_s': cold_start,
+                'first_requests': _summary(latencies),
+                'memory': {'master': memory(master.pid),
+                           'workers': [memory(pid) for pid in _children(master.pid)]}}
+    finally:
+        master.terminate()
+        master.wait(timeout=30)
+
+
+def run(workers=2, threads=8, requests=20, timeout=300):
+    results = [run_server(preload, workers, threads, requests, timeout) for preload in (False, True)]
+    for result in results:
+        processes = [result['memory']['master']] + result['memory']['workers']
+        result['memory']['total_pss_kb'] = sum(p.get('Pss_kb', 0) for p in processes)
+    return {'meta': {'commit': _git_commit(),
+                     'python': platform.python_version(),
+                     'machine': platform.machine(),
+                     'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                     'workers': workers,
+                     'threads': threads},
+            'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=20, help='default POSTs timed after startup')
+    parser.add_argument('--timeout', type=float, default=300, help='seconds to wait for gunicorn')
+    parser.add_argument('--output', default='-', help="JSON results file, '-' for stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args.workers, args.threads, args.requests, args.timeout)
+    text = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""What a full uncertainty band computation costs.
+
+Times uncertainty.rate_percentiles for every catalog fuel at one slider
+position, with a budget large enough that no chunk is dropped:
+
+    cold      the first call, including the start of the spawn process pool
+    warm      the following calls on the running pool
+    samples   samples behind each result (less than --samples means the
+              budget cut it short)
+
+Run from the repository root:
+
+    python -m benchmarks.bench_uncertainty --samples 1000000 --output uncertainty.json
+"""
+import argparse
+import json
+import platform
+import time
+
+from benchmarks.bench_callback import _git_commit, _summary
+
+import uncertainty
+
+
+def run(samples=1_000_000, repeat=5, budget=30.0, ct=100, elec_value=0.16):
+    fuels = tuple(uncertainty.FUEL_CATALOG)
+    timings, used = [], []
+    try:
+        for _ in range(repeat + 1):
+            start = time.perf_counter()
+            _, n = uncertainty.rate_percentiles(fuels, ct, elec_value, samples=samples, budget=budget)
+            timings.append(time.perf_counter() - start)
+            used.append(n)
+    finally:
+        uncertainty.shutdown()
+    return {'meta': {'commit': _git_commit(),
+                     'python': platform.python_version(),
+                     'machine': platform.machine(),
+                     'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                     'workers': uncertainty.WORKERS,
+                     'chunk': uncertainty.CHUNK,
+                     'fuels': len(fuels)},
+            'results': {'cold_ms': timings[0] * 1e3,
+                        'warm': _summary(timings[1:]),
+                        'samples': used}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--samples', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5, help='warm calls after the cold one')
+    parser.add_argument('--budget', type=float, default=30.0, help='seconds per call')
+    parser.add_argument('--output', default='-', help="JSON results file, '-' for stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args.samples, args.repeat, args.budget)
+    text = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
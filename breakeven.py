@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+import annuity
+from cost_engine import BASE_CT, BASE_PGJ_RATE, GJ_PER_KWH, FUEL_CATALOG
+
+#-----------------------------------------------------------------------
+#BREAK-EVEN SOLVER
+#-----------------------------------------------------------------------
+# For a fixed amortization setting the yearly $/sf of every typology x fuel
+# is linear in the carbon tax and in the electricity price:
+#
+#   total = K + alpha * ct + beta * elec
+#
+# so the carbon tax (or electricity price) at which two fuels cost the same
+# is one division per pair, solved here for all typologies and all fuel
+# pairs at once instead of dragging sliders until the bars cross.
+
+BASELINE_FUEL = 'ng'   # the overlay on the chart compares every fuel with this one
+
+
+def coefficients(inputs, factor, catalog=FUEL_CATALOG):
+    """K, alpha, beta of total $/sf for each typology x fuel.
+
+    factor is an annuity factor or an array of them (e.g. annuity.TABLE);
+    K gets its shape prepended, alpha and beta do not depend on it.
+    """
+    fuels = inputs.fuels
+    ct_rate = catalog.column('ct_rate', fuels)
+    cop = catalog.column('cop', fuels)
+    share = catalog.column('elec_share', fuels)
+    fixed = np.where(share != 0, catalog.column('pgj_adder', fuels), catalog.column('pgj_rate', fuels))
+
+    scale = inputs.base_fuel_cost[:, None] / (BASE_PGJ_RATE * cop)    # $/sf per $/GJ
+    capital = inputs.capital_psf.sum(axis=0)                          # mech + elec
+    factor = np.asarray(factor, dtype=float)[..., None, None]
+    K = capital * factor + scale * (fixed - ct_rate * BASE_CT)
+    alpha = scale * ct_rate
+    beta = scale * share / GJ_PER_KWH
+    return K, alpha, beta
+
+
+def _pairwise(a):
+    return a[..., :, None] - a[..., None, :]
+
+
+def carbon_tax_breakeven(inputs, elec_value, factor, catalog=FUEL_CATALOG):
+    """ct[..., typology, a, b] where fuels a and b cost the same; NaN if parallel."""
+    K, alpha, beta = coefficients(inputs, factor, catalog)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ct = -(_pairwise(K) + _pairwise(beta) * elec_value) / _pairwise(alpha)
+    return np.where(_pairwise(alpha) == 0, np.nan, ct)
+
+
+def elec_price_breakeven(inputs, ct, factor, catalog=FUEL_CATALOG):
+    """$/kWh[..., typology, a, b] where fuels a and b cost the same; NaN if parallel."""
+    K, alpha, beta = coefficients(inputs, factor, catalog)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        elec = -(_pairwise(K) + _pairwise(alpha) * ct) / _pairwise(beta)
+    return np.where(_pairwise(beta) == 0, np.nan, elec)
+
+
+def breakeven_grid(inputs, ct, elec_value, catalog=FUEL_CATALOG):
+    """Both break-evens for every interest rate x amortization period of the
+    sliders: arrays of shape (rates, periods, typologies, fuels, fuels)."""
+    return (carbon_tax_breakeven(inputs, elec_value, annuity.TABLE, catalog),
+            elec_price_breakeven(inputs, ct, annuity.TABLE, catalog))
+
+
+def breakeven_table(inputs, ct, elec_value, int_rate, int_period, catalog=FUEL_CATALOG):
+    """One row per typology and fuel pair at the given slider position.
+
+    cheaper_above_ct / cheaper_above_elec name the fuel that wins once the
+    carbon tax / electricity price rises past the break-even. A break-even
+    below zero cannot be reached, so it is NaN like a pair that never
+    crosses; the cheaper_above fuel then wins at every tax (price).
+    """
+    factor = annuity.factor(int_rate, int_period)
+    _, alpha, beta = coefficients(inputs, factor, catalog)
+    ct_star = carbon_tax_breakeven(inputs, elec_value, factor, catalog)
+    elec_star = elec_price_breakeven(inputs, ct, factor, catalog)
+    fuels = inputs.fuels
+    a, b = np.triu_indices(len(fuels), k=1)
+    n = len(inputs.typology_name)
+    rows = np.repeat(np.arange(n), len(a))
+    fa, fb = np.tile(a, n), np.tile(b, n)
+    names = np.asarray(fuels, dtype=object)
+    ct_pair, elec_pair = ct_star[rows, fa, fb], elec_star[rows, fa, fb]
+    cheaper_above_ct = np.where(np.isnan(ct_pair), None,
+                                np.where(alpha[rows, fa] > alpha[rows, fb], names[fb], names[fa]))
+    cheaper_above_elec = np.where(np.isnan(elec_pair), None,
+                                  np.where(beta[rows, fa] > beta[rows, fb], names[fb], names[fa]))
+    return pd.DataFrame({
+        'typology_name': np.asarray(inputs.typology_name, dtype=object)[rows],
+        'fuel_a': names[fa],
+        'fuel_b': names[fb],
+        'carbon_tax': np.where(ct_pair < 0, np.nan, ct_pair),
+        'cheaper_above_ct': cheaper_above_ct,
+        'elec_price': np.where(elec_pair < 0, np.nan, elec_pair),
+        'cheaper_above_elec': cheaper_above_elec,
+    })
+
+
+def overlay_texts(inputs, scenario, catalog=FUEL_CATALOG, baseline=BASELINE_FUEL):
+    """Per-fuel label for the chart: the carbon tax at which the fuel's
+    average bar (as drawn by the avg line) crosses the baseline fuel's."""
+    fuels = inputs.fuels
+    if baseline not in fuels:
+        return [''] * len(fuels)
+    K, alpha, beta = coefficients(inputs, annuity.factor(scenario.int_rate, scenario.int_period), catalog)
+    # the avg lines are plain means over typologies, and so is a mean of linear functions
+    K, alpha, beta = K.mean(axis=0), alpha.mean(axis=0), beta.mean(axis=0)
+    j = fuels.index(baseline)
+    name = catalog[baseline].label
+    texts = []
+    for k in range(len(fuels)):
+        dk = K[k] - K[j] + (beta[k] - beta[j]) * scenario.elec_value
+        da = alpha[k] - alpha[j]
+        if k == j:
+            texts.append('')
+        elif da == 0:
+            texts.append(f'{"cheaper" if dk < 0 else "dearer"} than {name} at any carbon tax')
+        else:
+            ct_star = -dk / da
+            side = 'above' if da < 0 else 'below'
+            if (side == 'above' and ct_star <= 0) or (side == 'below' and ct_star < 0):
+                texts.append(f'{"cheaper" if side == "above" else "dearer"} than {name} at any carbon tax')
+            else:
+                texts.append(f'cheaper than {name} {side} {round(ct_star)}$/ton')
+    return texts
@@ -0,0 +1,56 @@
+import logging
+
+import flask
+import plotly.io as pio
+from flask_compress import Compress
+
+#-----------------------------------------------------------------------
+#RESPONSE COMPRESSION
+#-----------------------------------------------------------------------
+# Brotli/gzip for callback, layout and asset responses and orjson for the
+# figure JSON. Every compressed response carries its size before
+# compression in X-Uncompressed-Length; metrics.py turns that and the sent
+# size into the per-route dashboard_response_*bytes histograms on /metrics.
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_CONFIG = {
+    'COMPRESS_ALGORITHM': ['br', 'gzip'],
+    # quality 11 (brotli's default) costs more CPU than it saves on these
+    # small JSON payloads; 4 is close to gzip speed and still smaller
+    'COMPRESS_BR_LEVEL': 4,
+    'COMPRESS_LEVEL': 6,
+    'COMPRESS_MIN_SIZE': 500,
+    'COMPRESS_MIMETYPES': ['text/html', 'text/css', 'text/xml', 'text/plain',
+                           'application/json', 'application/javascript'],
+}
+
+
+def init_app(server):
+    pio.json.config.default_engine = 'orjson'
+    for key, value in COMPRESS_CONFIG.items():
+        server.config.setdefault(key, value)
+
+    # after_request hooks run in reverse registration order: _record_sent is
+    # registered first so it sees the compressed body, _record_raw last so it
+    # sees the body before flask-compress touches it
+    @server.after_request
+    def _record_sent(response):
+        raw_bytes = flask.g.pop('raw_bytes', None)
+        if raw_bytes is None or response.direct_passthrough:
+            return response
+        sent_bytes = response.calculate_content_length() or 0
+        response.headers['X-Uncompressed-Length'] = str(raw_bytes)
+        logger.debug('%s %s: %d -> %d bytes (%s)', flask.request.method, flask.request.path,
+                     raw_bytes, sent_bytes, response.headers.get('Content-Encoding', 'identity'))
+        return response
+
+    Compress(server)
+
+    @server.after_request
+    def _record_raw(response):
+        if not response.direct_passthrough:
+            flask.g.raw_bytes = response.calculate_content_length() or 0
+        return response
+
+    return server
@@ -0,0 +1,225 @@
+import collections
+import collections.abc
+import os
+
+import numpy as np
+import pandas as pd
+
+import annuity
+
+#-----------------------------------------------------------------------
+#COST ENGINE
+#-----------------------------------------------------------------------
+# Holds the district_data.csv inputs as typology x fuel matrices and
+# evaluates every fuel in one broadcast pass, so the callback never has to
+# write pandas columns.
+
+BASE_PGJ_RATE = 44  # whatever the base value of electricity is in $/GJ
+BASE_CT = 30        # carbon tax ($/ton) the pgj rates are quoted at
+GJ_PER_KWH = 0.0036
+
+#-----------------------------------------------------------------------
+#FUEL CATALOG
+#-----------------------------------------------------------------------
+# Read from fuels.csv (or the file in FUEL_CATALOG), see the comments there.
+# Immutable: scenario evaluation derives slider-dependent rates instead of
+# writing them back here, so concurrent requests cannot see each other's
+# electricity price. Besides the Fuel records by key, the catalog keeps
+# every numeric field as a read-only array in catalog order, so per-fuel
+# vectors are one fancy-index instead of a Python loop over the fuels.
+Fuel = collections.namedtuple(
+    'Fuel', ['str', 'pgj_rate', 'ct_rate', 'cop', 'colour', 'label', 'elec_share', 'pgj_adder', 'capital'])
+NUMERIC_FIELDS = ('pgj_rate', 'ct_rate', 'cop', 'elec_share', 'pgj_adder')
+FUEL_CATALOG_PATH = os.environ.get('FUEL_CATALOG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fuels.csv'))
+
+
+class FuelCatalog(collections.abc.Mapping):
+    """Read-only key -> Fuel mapping in file order, with array columns."""
+
+    def __init__(self, fuels):
+        self._fuels = {f.str: f for f in fuels}
+        self._position = {key: k for k, key in enumerate(self._fuels)}
+        self._columns = {name: _read_only(np.array([getattr(f, name) for f in fuels], dtype=float))
+                         for name in NUMERIC_FIELDS}
+
+    def __getitem__(self, key):
+        return self._fuels[key]
+
+    def __iter__(self):
+        return iter(self._fuels)
+
+    def __len__(self):
+        return len(self._fuels)
+
+    def __repr__(self):
+        return f'FuelCatalog({list(self._fuels.values())!r})'
+
+    def index(self, fuels):
+        """Catalog positions of fuels."""
+        return np.array([self._position[i] for i in fuels], dtype=np.intp)
+
+    def column(self, name, fuels=None):
+        """One of NUMERIC_FIELDS for fuels (default: all of them, in catalog order)."""
+        column = self._columns[name]
+        return column if fuels is None else column[self.index(fuels)]
+
+
+def read_catalog(path):
+    df = pd.read_csv(path, comment='#', keep_default_na=False, skipinitialspace=True)
+    missing = set(Fuel._fields) - set(df.columns)
+    if missing:
+        raise ValueError(f'{path}: missing columns {sorted(missing)}')
+    fuels = []
+    for row in df.itertuples(index=False):
+        try:
+            fuel = Fuel(str=str(row.str), colour=str(row.colour), label=str(row.label), capital=str(row.capital),
+                        **{name: float(getattr(row, name)) for name in NUMERIC_FIELDS})
+        except ValueError:
+            raise ValueError(f'{path}: {row.str}: numeric field is not a number')
+        if fuel.cop <= 0 or not 0 <= fuel.elec_share <= 1:
+            raise ValueError(f'{path}: {fuel.str}: cop must be > 0 and elec_share in [0, 1]')
+        fuels.append(fuel)
+    keys = [f.str for f in fuels]
+    if len(set(keys)) != len(keys):
+        raise ValueError(f'{path}: duplicate fuel keys')
+    for f in fuels:
+        if f.capital and f.capital not in keys:
+            raise ValueError(f'{path}: {f.str}: capital {f.capital!r} is not a fuel of the catalog')
+    return FuelCatalog(fuels)
+
+
+def _read_only(a):
+    a.setflags(write=False)
+    return a
+
+
+FUEL_CATALOG = read_catalog(FUEL_CATALOG_PATH)
+
+DistrictInputs = collections.namedtuple(
+    'DistrictInputs',
+    ['typology_name', 'typology_occupany', 'typology_sf', 'base_fuel_cost',
+     'mech_cost', 'elec_cost', 'capital_psf', 'fuels'])
+
+CostResult = collections.namedtuple('CostResult', ['mech', 'elec', 'fuel', 'total'])
+
+Scenario = collections.namedtuple('Scenario', ['ct', 'int_period', 'int_rate', 'elec_value', 'pgj_rate', 'costs'])
+
+
+def make_inputs(typology_name, typology_occupany, typology_sf, base_fuel_cost, mech_cost, elec_cost, fuels):
+    """DistrictInputs from per-typology arrays; cost matrices are typology x fuel."""
+    typology_sf = np.array(typology_sf, dtype=float)
+    mech_cost = np.array(mech_cost, dtype=float)
+    elec_cost = np.array(elec_cost, dtype=float)
+    return DistrictInputs(
+        typology_name=tuple(typology_name),
+        typology_occupany=tuple(typology_occupany),
+        typology_sf=_read_only(typology_sf),
+        base_fuel_cost=_read_only(np.array(base_fuel_cost, dtype=float)),
+        mech_cost=_read_only(mech_cost),
+        elec_cost=_read_only(elec_cost),
+        # mech/elec capital per sf, amortized with a single multiply per request
+        capital_psf=_read_only(np.stack([mech_cost, elec_cost]) / typology_sf[:, None]),
+        fuels=tuple(fuels),
+    )
+
+
+def load_inputs(df, fuels):
+    """Pack a district DataFrame into arrays; fuels is a catalog or a list of keys."""
+    # catalog variants (another COP, another blend) share their capital's cost columns
+    capital = [fuels[i].capital or i for i in fuels] if isinstance(fuels, FuelCatalog) else list(fuels)
+    return make_inputs(df['typology_name'], df['typology_occupany'], df['typology_sf'].to_numpy(),
+                       df['base_fuel_cost'].to_numpy(),
+                       df[[f'{i}_mech_cost' for i in capital]].to_numpy(),
+                       df[[f'{i}_elec_cost' for i in capital]].to_numpy(),
+                       fuels)
+
+
+def read_inputs(path, fuels=FUEL_CATALOG):
+    return load_inputs(pd.read_csv(path), fuels)
+
+
+def fuel_pgj_rates(catalog, fuels, elec_value):
+    """$/GJ of each fuel at an electricity price of elec_value $/kWh."""
+    share = catalog.column('elec_share', fuels)
+    return np.where(share != 0, (elec_value * share) / GJ_PER_KWH + catalog.column('pgj_adder', fuels),
+                    catalog.column('pgj_rate', fuels))
+
+
+def compute_costs(inputs, pgj_rate, ct_rate, cop, ct, int_rate, int_period, base_pgj_rate=BASE_PGJ_RATE):
+    """Yearly $/sf of every typology x fuel.
+
+    pgj_rate, ct_rate and cop are per-fuel vectors in the order of
+    inputs.fuels. Returns a CostResult of (n_typologies, n_fuels) arrays.
+    """
+    pgj_rate = np.asarray(pgj_rate, dtype=float)
+    ct_rate = np.asarray(ct_rate, dtype=float)
+    cop = np.asarray(cop, dtype=float)
+
+    mech, elec = inputs.capital_psf * annuity.factor(int_rate, int_period)
+
+    fuel_rate = (pgj_rate + ct_rate * (ct - BASE_CT)) / base_pgj_rate / cop
+    fuel = inputs.base_fuel_cost[:, None] * fuel_rate[None, :]
+
+    return CostResult(mech=mech, elec=elec, fuel=fuel, total=mech + elec + fuel)
+
+
+def compute_costs_batch(inputs, pgj_rate, ct_rate, cop, ct, int_rate, int_period, base_pgj_rate=BASE_PGJ_RATE):
+    """compute_costs for many scenarios at once.
+
+    ct, int_rate and int_period have one entry per scenario; pgj_rate,
+    ct_rate and cop are (n_scenarios, n_fuels). Returns a CostResult of
+    (n_scenarios, n_typologies, n_fuels) arrays, element for element equal
+    to compute_costs on each scenario.
+    """
+    pgj_rate = np.asarray(pgj_rate, dtype=float)
+    ct_rate = np.asarray(ct_rate, dtype=float)
+    cop = np.asarray(cop, dtype=float)
+    ct = np.asarray(ct, dtype=float)
+
+    factors = np.array([annuity.factor(r, n) for r, n in zip(np.ravel(int_rate), np.ravel(int_period))])
+    mech, elec = inputs.capital_psf[:, None] * factors[None, :, None, None]
+
+    fuel_rate = (pgj_rate + ct_rate * (ct[:, None] - BASE_CT)) / base_pgj_rate / cop
+    fuel = inputs.base_fuel_cost[None, :, None] * fuel_rate[:, None, :]
+
+    return CostResult(mech=mech, elec=elec, fuel=fuel, total=mech + elec + fuel)
+
+
+def changed_rows(old, new):
+    """Row numbers where new differs from old, or None if they do not have
+    the same typologies and fuels in the same order."""
+    if (old.typology_name != new.typology_name or old.typology_occupany != new.typology_occupany
+            or old.fuels != new.fuels):
+        return None
+    differs = (old.typology_sf != new.typology_sf) | (old.base_fuel_cost != new.base_fuel_cost)
+    differs |= (old.mech_cost != new.mech_cost).any(axis=1) | (old.elec_cost != new.elec_cost).any(axis=1)
+    return np.flatnonzero(differs)
+
+
+def update_rows(scenario, inputs, rows, catalog=FUEL_CATALOG):
+    """scenario recomputed for inputs that only differ from its own in rows;
+    the other rows are copied, so the result equals a full evaluation."""
+    fuels = inputs.fuels
+    subset = make_inputs([inputs.typology_name[r] for r in rows], [inputs.typology_occupany[r] for r in rows],
+                         inputs.typology_sf[rows], inputs.base_fuel_cost[rows],
+                         inputs.mech_cost[rows], inputs.elec_cost[rows], fuels)
+    part = compute_costs(subset, scenario.pgj_rate, catalog.column('ct_rate', fuels), catalog.column('cop', fuels),
+                         scenario.ct, scenario.int_rate, scenario.int_period)
+    arrays = []
+    for whole, changed in zip(scenario.costs, part):
+        whole = np.array(whole)
+        whole[rows] = changed
+        arrays.append(whole)
+    return scenario._replace(costs=CostResult(*arrays))
+
+
+def evaluate_scenario(inputs, ct, int_period, int_rate, elec_value, catalog=FUEL_CATALOG):
+    """Pure evaluation of one slider position; reads inputs and catalog only."""
+    fuels = inputs.fuels
+    pgj_rate = fuel_pgj_rates(catalog, fuels, elec_value)
+    costs = compute_costs(inputs, pgj_rate,
+                          catalog.column('ct_rate', fuels),
+                          catalog.column('cop', fuels),
+                          ct, int_rate, int_period)
+    return Scenario(ct=ct, int_period=int_period, int_rate=int_rate, elec_value=elec_value,
+                    pgj_rate=pgj_rate, costs=costs)
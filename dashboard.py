@@ -1,13 +1,42 @@
-import pandas as pd
-from plotly.subplots import make_subplots
-import plotly.graph_objects as go
-from dash import Dash, dcc, html, dash_table
+import collections
+import os
+import flask
+from dash import Dash, ctx, dcc, html, dash_table
+from dash.dash_table.Format import Format
 from dash.dependencies import Input, Output
-from amortization.amount import calculate_amortization_amount
+from dash.exceptions import PreventUpdate
 import plotly.io as pio
+import aggregation
+import api
+import breakeven
+import compression
+import cost_engine
+import data_loader
+import data_watcher
+import export
+import figures
+import http_cache
+import lifecycle
+import metrics
+import pages
+import prefetch
+import scenario_cache
+import scenario_cube
+import shared_cache
+import uncertainty
 
-app = Dash(__name__)
+# the pages' components are not in the initial layout, see pages/__init__.py
+app = Dash(__name__, suppress_callback_exceptions=True)
 server = app.server   # <-- Gunicorn will use this
+metrics.init_app(server)       # /metrics, must come before compression (see metrics.init_app)
+compression.init_app(server)   # brotli/gzip + orjson for callback and layout responses
+http_cache.init_app(server, app)   # layout serialized once; ETag/304 for it and assets/
+api.init_app(server, lambda: data.typologies)   # POST /api/scenarios, batch evaluation for other tools
+export.init_app(server, lambda: data.district)  # GET /api/export, CSV/Parquet of the chart's bars
+scenario_cache.scenarios.on_lookup = metrics.cache_lookup('scenarios')
+scenario_cache.figures.on_lookup = metrics.cache_lookup('figures')
+for name in ('scenarios', 'figures', 'bands', 'projections'):   # identical concurrent requests share one computation
+      getattr(scenario_cache, name).on_coalesce = metrics.coalesced(name)
 
 # pio.renderers.default = "browser"           # REMOVE for deployment
 # app.css.config.serve_locally = True         # Deprecated in Dash 2
@@ -15,221 +44,504 @@ server = app.server   # <-- Gunicorn will use this
 #-----------------------------------------------------------------------
 #LOAD DATA
 #-----------------------------------------------------------------------
-df = pd.read_csv('district_data.csv')
-dfa = df  #create a copy
-base_pgj_rate = 44 #whatever the base value of electricity is in $/GJ
+DATA_PATH = os.environ.get('DISTRICT_DATA', 'district_data.csv')  # per-typology or per-building, .csv or .parquet
 #-----------------------------------------------------------------------
 #FUEL VALUES DICTIONARY
 #-----------------------------------------------------------------------
-fv = {'ng'   : {'str':'ng',   'pgj_rate':9,  'ct_rate':0.061, 'cop':1.0, 'colour':'35, 31, 32', 'label':'Natural Gas'},
-      'bh'   : {'str':'bh',   'pgj_rate':18, 'ct_rate':0.007, 'cop':1.0, 'colour':'74, 113, 183', 'label':'Blue Hydrogen'},
-      'gh'   : {'str':'gh',   'pgj_rate':60, 'ct_rate':0.028, 'cop':1.0, 'colour':'56, 180, 73', 'label':'Green Hydrogen'},
-      'er'   : {'str':'er',   'pgj_rate':44, 'ct_rate':0.028, 'cop':1.0, 'colour':'251, 175, 63', 'label':'Electrical Resistance'},
-      'ashp' : {'str':'ashp', 'pgj_rate':44, 'ct_rate':0.028, 'cop':2.8, 'colour':'145, 38, 143', 'label':'Air Source Heat Pump'},
-      'gshp' : {'str':'gshp', 'pgj_rate':44, 'ct_rate':0.028, 'cop':3.1, 'colour':'138, 93, 59', 'label':'Ground Source Heat Pump'},
-      'hyb'  : {'str':'hyb',  'pgj_rate':52.7, 'ct_rate':0.028, 'cop':2.8, 'colour':'239, 64, 54', 'label':'Hybrid ASHP & RNG'}
-     }
-#pgj_rate of hybrid option = 95% elec->(44*0.95 = 41.8) + 5% RNG->(29+9 * 0.05 = 1.9) + 100% NG delivery->(9 * 1 = 9) = 52.7
+fv = cost_engine.FUEL_CATALOG  # read-only, from fuels.csv (FUEL_CATALOG=), see cost_engine.py
+DEFAULT_KEY = scenario_cache.DEFAULT_KEY
+DRILLDOWN_ROWS = 500
+
+
+def evaluate(inputs, key):
+      ct, int_period, elec_value, interest_value = key  # normalized slider tuple
+      # pure function of the slider inputs: nothing module-level is written,
+      # so concurrent sessions (gunicorn --threads) cannot leak into each other
+      return cost_engine.evaluate_scenario(inputs, ct, int_period, interest_value / 100, elec_value, fv)
+
+
+# Everything read or derived from DATA_PATH. It is replaced as a whole when
+# the file changes (see DATA RELOAD below), so code that reads `data` once
+# sees one version of the data whatever a reload does meanwhile.
+#
+# source      data_loader.District; building-level arrays stay in source.columns
+# typologies  read-only typology x fuel matrices for the cost engine
+# grouping    large districts are plotted as a bounded number of buckets, see aggregation.py
+# district    one row per bar of the chart
+# cube        every slider position precomputed, or None, see scenario_cube.py
+# version     fingerprint of the bars and the fuel catalog; every cache key starts with it
+# skeleton    static structure of graph_output, drawn at the default sliders so
+#             the page shows the chart without a callback; the callback patches values into it
+DataState = collections.namedtuple(
+      'DataState', ['source', 'typologies', 'grouping', 'district', 'cube', 'version', 'skeleton'])
+
+
+def load_data(path, previous=None):
+      """DataState of the file at path; previous itself if its bars are the same."""
+      source = data_loader.load_district(path, data_loader.CACHE_DIR)
+      typologies = cost_engine.load_inputs(source.typologies, fv)
+      grouping = aggregation.chart_grouping(typologies, fv)
+      district = aggregation.group_inputs(typologies, grouping)
+      # content only: a file saved again unchanged keeps its cache entries
+      version = scenario_cube.fingerprint(district, fv, '')
+      if previous is not None and version == previous.version:
+            return previous
+      # built here unless BUILD_SCENARIO_CUBE=0 or it would exceed CUBE_MAX_BYTES
+      cube = scenario_cube.open_or_build(district, fv, source.version, data_loader.CACHE_DIR,
+                                         build=os.environ.get('BUILD_SCENARIO_CUBE', '1') == '1')
+      d = DataState(source, typologies, grouping, district, cube, version, skeleton=None)
+      return d._replace(skeleton=figures.build_figure(get_scenario(DEFAULT_KEY, d), district, fv))
+
+
+def get_scenario(key, d=None):
+      d = d or data
+      def compute():
+            with metrics.phase('cost'):
+                  # slider positions are a cube lookup, anything else is computed
+                  scenario = scenario_cube.scenario(d.cube, key) if d.cube is not None else None
+                  return scenario if scenario is not None else evaluate(d.district, key)
+      return scenario_cache.scenarios.get_or_compute((d.version,) + key, compute)
+
+
+def get_bands(key, d=None):
+      d = d or data
+      def compute():
+            with metrics.phase('uncertainty'):
+                  # bounded by uncertainty.BUDGET, see uncertainty.py
+                  return uncertainty.bands(d.district, get_scenario(key, d))
+      # bands cut short by the budget are served but computed again next time
+      return scenario_cache.bands.get_or_compute((d.version,) + key, compute, keep=uncertainty.complete)
+
+
+def get_patch(key, uncertain=False, clear=False, d=None):
+      d = d or data
+      complete = True
+      def build():
+            nonlocal complete
+            scenario = get_scenario(key, d)
+            bands = get_bands(key, d) if uncertain else None
+            complete = bands is None or uncertainty.complete(bands)
+            with metrics.phase('figure'):
+                  # the layout already holds the skeleton figure, only the changed values go out
+                  return figures.build_patch(scenario, d.district, fv, bands, clear)
+      return scenario_cache.figures.get_or_compute((d.version,) + key + (uncertain, clear), build,
+                                                   keep=lambda patch: complete)
+
+
+# second cache tier shared by all workers on the host, see shared_cache.py;
+# the keys carry the data version, as in the local caches
+scenario_cache.scenarios.shared = shared_cache.scenario_cache('', metrics.cache_lookup('shared_scenarios'))
+scenario_cache.figures.shared = shared_cache.figure_cache('', metrics.cache_lookup('shared_figures'))
+
+data = load_data(DATA_PATH)
+
+
+def client_id():
+      # one prefetch queue per browser; X-Forwarded-For when behind a proxy
+      forwarded = flask.request.headers.get('X-Forwarded-For', '')
+      address = forwarded.split(',')[0].strip() or flask.request.remote_addr
+      return (address, flask.request.headers.get('User-Agent', ''))
+
+
+# after a slider move, warm the figures one step away on each slider, see prefetch.py
+prefetcher = prefetch.Prefetcher(warm=get_patch,
+                                 is_cached=lambda key: (data.version,) + key + (False, False) in scenario_cache.figures,
+                                 on_job=metrics.prefetch_job)
+
+
+def breakeven_records(key, d=None):
+      d = d or data
+      ct, int_period, elec, interest = key
+      table = breakeven.breakeven_table(d.district, ct, elec, interest / 100, int_period, fv)
+      labels = {i: fv[i].label for i in fv}
+      for c in ('fuel_a', 'fuel_b', 'cheaper_above_ct', 'cheaper_above_elec'):
+            table[c] = table[c].map(labels)
+      table['carbon_tax'] = table['carbon_tax'].round(0)
+      table['elec_price'] = table['elec_price'].round(3)
+      # NaN (no crossing, or only at a negative tax/price) goes out as None, shown as n/a
+      return table.astype(object).where(table.notna(), None).to_dict('records')
+
+
+def heatmap_figure(payback, interest, typology=None, d=None):
+      d = d or data
+      if d.cube is None:
+            return {'layout': {'annotations': [{'text': 'Needs the scenario cube (python scenario_cube.py)',
+                                                'showarrow': False, 'xref': 'paper', 'yref': 'paper'}],
+                               'xaxis': {'visible': False}, 'yaxis': {'visible': False}}}
+      cheapest = scenario_cube.winning_fuel(d.cube, payback, interest, typology)
+      name = 'District average' if typology is None else d.district.typology_name[typology]
+      return figures.build_winning_fuel_heatmap(
+            cheapest, scenario_cube.CT_VALUES, scenario_cube.ELEC_VALUES, d.cube.fuels, fv,
+            f'{name}: {payback} years at {interest}% interest')
+
+
+def get_projection(path, key, d=None):
+      d = d or data
+      ct, int_period, elec_value, interest_value = key
+      start = lifecycle.start_year()   # in the key: the projection moves on at New Year
+      # every year of the path in one batch, see lifecycle.py
+      return scenario_cache.projections.get_or_compute(
+            (d.version, path, start) + key,
+            lambda: lifecycle.project(d.district, path, ct, int_period, interest_value / 100, elec_value, fv,
+                                      lifecycle.years(start)))
+
+
+def lifecycle_figure(path, key, d=None):
+      d = d or data
+      ct, int_period, _, interest = key
+      return figures.build_lifecycle_figure(
+            get_projection(path, key, d), d.district.fuels, fv,
+            f'District Lifecycle Cost to {lifecycle.END_YEAR}: {int_period} year loans, '
+            f'discounted at {interest}%')
+
 
 #-----------------------------------------------------------------------
 #CSS - HEADER & FIGURE
 #-----------------------------------------------------------------------
-app.layout = html.Div([
-      html.Header(
-        style={
-        'padding-top': '0px',
-        'padding-bottom': '0px',
-        'text-align': 'center',
-        'background-color': 'rgb(52,58,64)',
-        'margin': '10px'
-        },
-          children=[
-              html.H4('Toronto 2030 District',
-                  style={
-                      'padding-top': '0px',
-                      'padding-bottom': '0px',
-                      'text-align': 'center',
-                      'background-color': 'rgb(52,58,64)',
-                      'color': 'white'
-                  },
-              ),
-          ]
-      ),
-      html.Div([
-          dcc.Graph(
-            style={
-                  'font-size': '200%',
-                  'width': '95%',
-                  'padding-bottom': '10px',
-                  'margin-left': '2%',
-                  'margin-right': 'auto'
-            },
-            id='graph_output',
-            figure={}
-      ),
-    #-----------------------------------------------------------------------
-    #CSS - CARBON TAX SLIDER
-    #-----------------------------------------------------------------------
-          html.Div(
-                className="ct-slider-container",
-                style={
-                      'float': 'left',
-                      'width': '25%',
-                      'margin-left': '5%',
-                      'margin-right': 'auto',
-                      'padding-bottom': '20px',
-                      'padding-top': '20px'
-                },
-                children=[
-                      html.H5('Carbon Tax (in $/ton of CO2)',
-                              style={
-                                    'padding-bottom': '20px',
-                                    'text-align': 'center'
-                              }
-                              ),
-                      dcc.Slider(
-                            id='ct-slider',
-                            updatemode='mouseup',
-                            min=30,
-                            max=340,
-                            step=10,
-                            value=30,
-                            marks={
-                                  30: '30$/ton (current)',
-                                  170: '170$/ton (projected)',
-                                  340: '340$/ton',
-                            },
-                            dots=False,
-                            tooltip={'always_visible': True}
-                      )
-                ]
-          ),
-    #-----------------------------------------------------------------------
-    #CSS - AMORTIZATION RATE SLIDER
-    #-----------------------------------------------------------------------
-          html.Div(
-                className="payback-slider-container",
-                style={
-                      'width': '25%',
-                      'margin-left': '35%',
-                      'margin-right': 'auto',
-                      'padding-bottom': '20px',
-                      'padding-top': '20px'
-                },
-                children=[
-                      html.H5('Amortization Period of Capital Costs in Years*',
-                              style={
-                                    'padding-bottom': '20px',
-                                    'text-align': 'center'
-                              }
-                              ),
-                      dcc.Slider(
-                            id='payback-slider',
-                            updatemode='mouseup',
-                            min=1,
-                            max=40,
-                            step=1,
-                            value=20,
-                            marks={
-                                  1: '1 year',
-                                  10: '10 years',
-                                  20: '20 years',
-                                  30: '30 years',
-                                  40: '40 years',
-                            },
-                            dots=True,
-                            tooltip={'always_visible': True}
-                      )
-                ]
-          ),
-    #-----------------------------------------------------------------------
-    #CSS - ELEC PRICE SLIDER
-    #-----------------------------------------------------------------------
-          html.Div(
-                className="elec-price-slider-container",
-                style={
-                      'float': 'left',
-                      'width': '25%',
-                      'margin-left': '5%',
-                      'margin-right': 'auto',
-                      'padding-bottom': '20px',
-                      'padding-top': '20px'
-                },
+def build_layout(d):
+      """The page as served, with the default values drawn from d."""
+      return html.Div(pages.routing() + [
+            html.Header(
+              style={
+              'padding-top': '0px',
+              'padding-bottom': '0px',
+              'text-align': 'center',
+              'background-color': 'rgb(52,58,64)',
+              'margin': '10px'
+              },
                 children=[
-                      html.H5('Assumed Price of Electricity ($/kWh)',
-                              style={
-                                    'padding-bottom': '20px',
-                                    'text-align': 'center'
-                              }
-                              ),
-                      dcc.Slider(
-                            id='elec-slider',
-                            updatemode='mouseup',
-                            min=0.00,
-                            max=0.30,
-                            step=0.01,
-                            value=0.16,
-                            marks={
-                                  0: '0.00$/kWH',
-                                  0.16: '0.16$/kWH',
-                                  0.30: '0.30$/kWH',
-                            },
-                            dots=True,
-                            tooltip={'always_visible': True}
-                      )
+                    html.H4('Toronto 2030 District',
+                        style={
+                            'padding-top': '0px',
+                            'padding-bottom': '0px',
+                            'text-align': 'center',
+                            'background-color': 'rgb(52,58,64)',
+                            'color': 'white'
+                        },
+                    ),
+                    html.Nav(pages.links(style={'color': 'white', 'margin': '0px 15px'}),
+                        style={'padding-bottom': '5px'}),
                 ]
-          ),
-    #-----------------------------------------------------------------------
-    #CSS - AMORTIZATION RATE SLIDER
-    #-----------------------------------------------------------------------
-          html.Div(
-                className="interest-slider-container",
-                style={
-                      'width': '25%',
-                      'margin-left': '35%',
-                      'margin-right': 'auto',
-                      'padding-bottom': '20px',
-                      'padding-top': '20px'
-                },
-                children=[
-                      html.H5('Interest Rate',
-                              style={
-                                    'padding-bottom': '20px',
-                                    'text-align': 'center'
-                              }
-                              ),
-                      dcc.Slider(
-                            id='interest-slider',
-                            updatemode='mouseup',
-                            min=0,
-                            max=10,
-                            step=0.5,
-                            value=5,
-                            marks={
-                                  0: '0.0% interest',
-                                  5: '5.0% interest',
-                                  10: '10.0% interest'
-                            },
-                            dots=True,
-                            tooltip={'always_visible': True}
-                      )
-                ]
-          ),
-          ])
-#-----------------------------------------------------------------------
-#CSS - DISCLAIMER
-#-----------------------------------------------------------------------
-      # html.P('*a yearly interest rate of 3% is assumed',
-      #         style={
-      #             'font-size': '50%',
-      #             'padding-top': '20px',
-      #             'padding-bottom': '20px',
-      #             'text-align': 'center',
-      #             'margin-right': 'auto',
-      #             'margin-left': 'auto'
-      #         }
-      # )
-])
+            ),
+            html.Div(id='page-content', children=[
+                dcc.Graph(
+                  style={
+                        'font-size': '200%',
+                        'width': '95%',
+                        'padding-bottom': '10px',
+                        'margin-left': '2%',
+                        'margin-right': 'auto'
+                  },
+                  id='graph_output',
+                  figure=d.skeleton
+            ),
+          #-----------------------------------------------------------------------
+          #CSS - CARBON TAX SLIDER
+          #-----------------------------------------------------------------------
+                html.Div(
+                      className="ct-slider-container",
+                      style={
+                            'float': 'left',
+                            'width': '25%',
+                            'margin-left': '5%',
+                            'margin-right': 'auto',
+                            'padding-bottom': '20px',
+                            'padding-top': '20px'
+                      },
+                      children=[
+                            html.H5('Carbon Tax (in $/ton of CO2)',
+                                    style={
+                                          'padding-bottom': '20px',
+                                          'text-align': 'center'
+                                    }
+                                    ),
+                            dcc.Slider(
+                                  id='ct-slider',
+                                  updatemode='mouseup',
+                                  min=30,
+                                  max=340,
+                                  step=10,
+                                  value=30,
+                                  marks={
+                                        30: '30$/ton (current)',
+                                        170: '170$/ton (projected)',
+                                        340: '340$/ton',
+                                  },
+                                  dots=False,
+                                  tooltip={'always_visible': True}
+                            )
+                      ]
+                ),
+          #-----------------------------------------------------------------------
+          #CSS - AMORTIZATION RATE SLIDER
+          #-----------------------------------------------------------------------
+                html.Div(
+                      className="payback-slider-container",
+                      style={
+                            'width': '25%',
+                            'margin-left': '35%',
+                            'margin-right': 'auto',
+                            'padding-bottom': '20px',
+                            'padding-top': '20px'
+                      },
+                      children=[
+                            html.H5('Amortization Period of Capital Costs in Years*',
+                                    style={
+                                          'padding-bottom': '20px',
+                                          'text-align': 'center'
+                                    }
+                                    ),
+                            dcc.Slider(
+                                  id='payback-slider',
+                                  updatemode='mouseup',
+                                  min=1,
+                                  max=40,
+                                  step=1,
+                                  value=20,
+                                  marks={
+                                        1: '1 year',
+                                        10: '10 years',
+                                        20: '20 years',
+                                        30: '30 years',
+                                        40: '40 years',
+                                  },
+                                  dots=True,
+                                  tooltip={'always_visible': True}
+                            )
+                      ]
+                ),
+          #-----------------------------------------------------------------------
+          #CSS - ELEC PRICE SLIDER
+          #-----------------------------------------------------------------------
+                html.Div(
+                      className="elec-price-slider-container",
+                      style={
+                            'float': 'left',
+                            'width': '25%',
+                            'margin-left': '5%',
+                            'margin-right': 'auto',
+                            'padding-bottom': '20px',
+                            'padding-top': '20px'
+                      },
+                      children=[
+                            html.H5('Assumed Price of Electricity ($/kWh)',
+                                    style={
+                                          'padding-bottom': '20px',
+                                          'text-align': 'center'
+                                    }
+                                    ),
+                            dcc.Slider(
+                                  id='elec-slider',
+                                  updatemode='mouseup',
+                                  min=0.00,
+                                  max=0.30,
+                                  step=0.01,
+                                  value=0.16,
+                                  marks={
+                                        0: '0.00$/kWH',
+                                        0.16: '0.16$/kWH',
+                                        0.30: '0.30$/kWH',
+                                  },
+                                  dots=True,
+                                  tooltip={'always_visible': True}
+                            )
+                      ]
+                ),
+          #-----------------------------------------------------------------------
+          #CSS - AMORTIZATION RATE SLIDER
+          #-----------------------------------------------------------------------
+                html.Div(
+                      className="interest-slider-container",
+                      style={
+                            'width': '25%',
+                            'margin-left': '35%',
+                            'margin-right': 'auto',
+                            'padding-bottom': '20px',
+                            'padding-top': '20px'
+                      },
+                      children=[
+                            html.H5('Interest Rate',
+                                    style={
+                                          'padding-bottom': '20px',
+                                          'text-align': 'center'
+                                    }
+                                    ),
+                            dcc.Slider(
+                                  id='interest-slider',
+                                  updatemode='mouseup',
+                                  min=0,
+                                  max=10,
+                                  step=0.5,
+                                  value=5,
+                                  marks={
+                                        0: '0.0% interest',
+                                        5: '5.0% interest',
+                                        10: '10.0% interest'
+                                  },
+                                  dots=True,
+                                  tooltip={'always_visible': True}
+                            )
+                      ]
+                ),
+          #-----------------------------------------------------------------------
+          #CSS - UNCERTAINTY TOGGLE
+          #-----------------------------------------------------------------------
+                html.Div(
+                      className="uncertainty-container",
+                      style={
+                            'clear': 'both',
+                            'text-align': 'center',
+                            'padding-bottom': '10px'
+                      },
+                      children=[
+                            dcc.Checklist(
+                                  id='uncertainty-toggle',
+                                  options=[{'label': ' Show P10-P90 range for uncertain fuel prices and heat pump COP',
+                                            'value': 'on'}],
+                                  value=[]
+                            )
+                      ]
+                ),
+          #-----------------------------------------------------------------------
+          #CSS - WINNING FUEL HEATMAP
+          #-----------------------------------------------------------------------
+                html.Div(
+                      className="heatmap-container",
+                      style={
+                            'clear': 'both',
+                            'width': '60%',
+                            'margin-left': '20%',
+                            'margin-right': 'auto',
+                            'padding-bottom': '20px',
+                            'padding-top': '20px'
+                      },
+                      children=[
+                            html.H5('Cheapest Fuel by Carbon Tax and Electricity Price',
+                                    style={
+                                          'padding-bottom': '10px',
+                                          'text-align': 'center'
+                                    }
+                                    ),
+                            dcc.Dropdown(
+                                  id='heatmap-typology',
+                                  options=[{'label': 'District average', 'value': -1}] +
+                                          [{'label': name, 'value': k} for k, name in enumerate(d.district.typology_name)],
+                                  value=-1,
+                                  clearable=False
+                            ),
+                            dcc.Graph(id='heatmap_output',
+                                      figure=heatmap_figure(DEFAULT_KEY[1], DEFAULT_KEY[3], d=d))
+                      ]
+                ),
+          #-----------------------------------------------------------------------
+          #CSS - LIFECYCLE COST
+          #-----------------------------------------------------------------------
+                html.Div(
+                      className="lifecycle-container",
+                      style={
+                            'width': '60%',
+                            'margin-left': '20%',
+                            'margin-right': 'auto',
+                            'padding-bottom': '20px',
+                            'padding-top': '20px'
+                      },
+                      children=[
+                            html.H5(f'Lifecycle Cost to {lifecycle.END_YEAR} along a Carbon Price Path',
+                                    style={
+                                          'padding-bottom': '10px',
+                                          'text-align': 'center'
+                                    }
+                                    ),
+                            dcc.Dropdown(
+                                  id='lifecycle-path',
+                                  options=[{'label': label, 'value': path} for path, label in lifecycle.PATHS.items()],
+                                  value=lifecycle.DEFAULT_PATH,
+                                  clearable=False
+                            ),
+                            dcc.Graph(id='lifecycle_output',
+                                      figure=lifecycle_figure(lifecycle.DEFAULT_PATH, DEFAULT_KEY, d))
+                      ]
+                ),
+          #-----------------------------------------------------------------------
+          #CSS - DRILL-DOWN TABLE (click a bar)
+          #-----------------------------------------------------------------------
+                html.Div(
+                      className="drilldown-container",
+                      style={
+                            'width': '90%',
+                            'margin-left': '5%',
+                            'margin-right': 'auto',
+                            'padding-bottom': '20px'
+                      },
+                      children=[
+                            html.H5(id='drilldown-title',
+                                    children='Click a bar to list the typologies behind it',
+                                    style={
+                                          'padding-bottom': '10px',
+                                          'text-align': 'center'
+                                    }
+                                    ),
+                            dash_table.DataTable(
+                                  id='drilldown-table',
+                                  page_size=20,
+                                  sort_action='native',
+                                  style_table={'overflowX': 'auto'}
+                            )
+                      ]
+                ),
+          #-----------------------------------------------------------------------
+          #CSS - BREAK-EVEN TABLE
+          #-----------------------------------------------------------------------
+                html.Details(
+                      className="breakeven-container",
+                      style={
+                            'width': '90%',
+                            'margin-left': '5%',
+                            'margin-right': 'auto',
+                            'padding-bottom': '20px'
+                      },
+                      children=[
+                            html.Summary('Break-even carbon tax and electricity price by typology and fuel pair'),
+                            dash_table.DataTable(
+                                  id='breakeven-table',
+                                  data=breakeven_records(DEFAULT_KEY, d),
+                                  columns=[{'name': 'Typology', 'id': 'typology_name'},
+                                           {'name': 'Fuel A', 'id': 'fuel_a'},
+                                           {'name': 'Fuel B', 'id': 'fuel_b'},
+                                           {'name': 'Break-even Carbon Tax ($/ton)', 'id': 'carbon_tax',
+                                            'type': 'numeric', 'format': Format(nully='n/a')},
+                                           {'name': 'Cheaper Above That Tax', 'id': 'cheaper_above_ct'},
+                                           {'name': 'Break-even Electricity ($/kWh)', 'id': 'elec_price',
+                                            'type': 'numeric', 'format': Format(nully='n/a')},
+                                           {'name': 'Cheaper Above That Price', 'id': 'cheaper_above_elec'}],
+                                  page_size=21,
+                                  sort_action='native',
+                                  filter_action='native',
+                                  style_table={'overflowX': 'auto'}
+                            )
+                      ]
+                ),
+                ])
+      #-----------------------------------------------------------------------
+      #CSS - DISCLAIMER
+      #-----------------------------------------------------------------------
+            # html.P('*a yearly interest rate of 3% is assumed',
+            #         style={
+            #             'font-size': '50%',
+            #             'padding-top': '20px',
+            #             'padding-bottom': '20px',
+            #             'text-align': 'center',
+            #             'margin-right': 'auto',
+            #             'margin-left': 'auto'
+            #         }
+            # )
+      ])
+
+
+app.layout = build_layout(data)
+# other pages are imported on their first visit, see pages/__init__.py
+pages.init_app(app, lambda: app.layout['page-content'].children,
+               pages.Context(data=lambda: data, catalog=fv, defaults=DEFAULT_KEY))
 #-----------------------------------------------------------------------
 #CALLBACK
 #-----------------------------------------------------------------------
@@ -239,105 +551,221 @@ app.layout = html.Div([
        Input('payback-slider', 'value'),
        Input('elec-slider', 'value'),
        Input('interest-slider', 'value'),
-      ]
+       Input('uncertainty-toggle', 'value'),
+      ],
+      # the layout already holds the figure for the default sliders
+      prevent_initial_call=True
 )
 #-----------------------------------------------------------------------
 #UPDATE FUNCTION
 #-----------------------------------------------------------------------
-def update_graph(ct_value, payback_value, elec_value, interest_value):
-
-
-      ct = ct_value  # slider
-      int_period = payback_value  # slider
-      int_rate = (interest_value / 100)  # slider
-
-#DIRTY WAY TO UPDATE VARIABLE ELECTRICITY PRICES (FROM SLIDER)
-      fv['er']['pgj_rate'] = elec_value / 0.0036
-      fv['ashp']['pgj_rate'] = elec_value / 0.0036
-      fv['gshp']['pgj_rate'] = elec_value / 0.0036
-      fv['hyb']['pgj_rate'] = ((elec_value * 0.95) / 0.0036) + ((29+9) * 0.05)
-      # pgj_rate of hybrid option = 95% elec->(44*0.95 = 41.8) + 5% RNG->(29+9 * 0.05 = 1.9) + 100% NG delivery->(9 * 1 = 9) = 52.7
-
-      yaxis_max = []
-      avg_list = []
-      for i in fv:
-
-            dfa[f'{i}_mech_psf'] = calculate_amortization_amount(dfa[f'{i}_mech_cost'], int_rate, int_period) / dfa.typology_sf
-            dfa[f'{i}_elec_psf'] = calculate_amortization_amount(dfa[f'{i}_elec_cost'], int_rate, int_period) / dfa.typology_sf
-            dfa[f'{i}_fuel_psf'] = (dfa.base_fuel_cost * ((fv[i]['pgj_rate'] + (fv[i]['ct_rate'] * (ct - 30))) / base_pgj_rate)) * (1 / fv[i]['cop'])
-            dfa[f'{i}_total_psf'] = dfa[f'{i}_mech_psf'] + dfa[f'{i}_elec_psf'] + dfa[f'{i}_fuel_psf']
-            yaxis_max.append(dfa[f'{i}_total_psf'].max())
-            avg_list.append(dfa[f'{i}_total_psf'].mean())
-
-      # GENERATE PLOTS
-      fig = make_subplots(rows=1, cols=len(fv))
-
-      for i in fv:
-            cur_index = list(fv).index(i)
-            cur_colour = fv[i]['colour']
-            pgj_rate_value = fv[i]['pgj_rate']
-            fig = go.Figure(
-                  fig.add_trace(go.Bar(x=dfa.typology_name,
-                                       y=round(dfa[f'{i}_mech_psf'],2),
-                                       name='Mechanical System $/sf',
-                                       marker=dict(color=f'rgba({cur_colour},1)', line=dict(width=1, color=f'rgba({cur_colour},1)'))),
-                                       row=1, col=cur_index + 1
-                                )
-                  )
-            fig.add_trace(go.Bar(x=dfa.typology_name,
-                                 y=round(dfa[f'{i}_elec_psf'],2),
-                                 name='Electrical System $/sf',
-                                 marker=dict(color=f'rgba({cur_colour},0.25)', line=dict(width=1, color=f'rgba({cur_colour},1)'))),
-                                 row=1, col=cur_index + 1
-                         )
-            fig.add_trace(go.Bar(x=dfa.typology_name,
-                                 y=round(dfa[f'{i}_fuel_psf'],2),
-                                 name='Fuel Cost $/sf',
-                                 marker=dict(color=f'rgba({cur_colour},0.67)', line=dict(width=1, color=f'rgba({cur_colour},1)'))),
-                                 row=1, col=cur_index + 1
-                         )
-            fig.update_yaxes(title_text='$ per Square Foot per Year', row=1, col=1)
-            fig.update_yaxes(range=[0, max(yaxis_max) + 1])
-            fig.update_xaxes(title_text=fv[i]['label'], row=1, col=cur_index + 1)
-            avg_y = dfa[f'{i}_total_psf'].mean()
-            fig.add_hline(y=avg_y,
-                          line_width=4,
-                          line_color=f'rgba({cur_colour},1)',
-                          opacity=1,
-                          annotation_text=f'avg: {round(avg_y, 2)}$/sf',
-                          row=1, col=cur_index + 1
-                          )
-            fig.update_layout(font_family="Roboto", barmode='stack', hovermode='x unified',
-                              hoverlabel=dict(namelength=-1),
-                              showlegend=False
-                             )
-      # fig.add_annotation(x=dfa.typology_name, y=[max(yaxis_max) - 1],
-      #                    text=f'Electricity Cost = {round(pgj_rate_value, 2)}$/GJ',
-      #                    showarrow=False,
-      #                    arrowhead=1)
-
-      fig.add_annotation(text=f'Carbon Tax = {round(ct, 0)}$/ton',
-                         xref="paper", yref="paper",
-                         x=0.01, y=0.95, showarrow=False)
-      fig.add_annotation(text=f'Electricity Cost = {round(pgj_rate_value, 2)}$/GJ',
-                         xref="paper", yref="paper",
-                         x=0.01, y=0.90, showarrow=False)
-      fig.add_annotation(text=f'Amortization Period = {int_period} years',
-                         xref="paper", yref="paper",
-                         x=0.01, y=0.85, showarrow=False)
-      fig.add_annotation(text=f'Interest Rate = {round(int_rate*100, 1)}%',
-                         xref="paper", yref="paper",
-                         x=0.01, y=0.80, showarrow=False)
-
-      fig.update_layout(
-            title_text="Yearly Space Heating Cost per Square Foot in Toronto District by Fuel and Building Type",
-            title_x=0.5,
-            height=640,
-            #   width=2000,
-            template='simple_white'
-      )
-      return fig
+def update_graph(ct_value, payback_value, elec_value, interest_value, uncertainty_value=None):
+
+      with metrics.phase('normalize'):
+            key = scenario_cache.normalize_inputs(ct_value, payback_value, elec_value, interest_value)
+            uncertain = 'on' in (uncertainty_value or ())
+            # error bars only have to be taken off when the toggle was just turned off
+            clear = uncertainty_value is not None and not uncertain and ctx.triggered_id == 'uncertainty-toggle'
+
+      with prefetcher.foreground():
+            patch = get_patch(key, uncertain, clear)
+      if not uncertain and flask.has_request_context():   # Monte Carlo bands are too heavy to prefetch
+            prefetcher.schedule(client_id(), prefetch.neighbours(key))
+      metrics.callback_done()
+      return patch
+
+
+#-----------------------------------------------------------------------
+#DRILL-DOWN CALLBACK
+#-----------------------------------------------------------------------
+@app.callback(
+      [Output('drilldown-table', 'data'),
+       Output('drilldown-table', 'columns'),
+       Output('drilldown-title', 'children')],
+      [Input('graph_output', 'clickData'),
+       Input('ct-slider', 'value'),
+       Input('payback-slider', 'value'),
+       Input('elec-slider', 'value'),
+       Input('interest-slider', 'value'),
+      ],
+      # nothing to list until a bar is clicked
+      prevent_initial_call=True
+)
+def update_drilldown(click_data, ct_value, payback_value, elec_value, interest_value):
+
+      if not click_data:
+            raise PreventUpdate
+      d = data
+      label = click_data['points'][0]['x']
+      if isinstance(label, list):   # faceted figure: multicategory x is [fuel label, bar]
+            label = label[-1]
+      rows = aggregation.members(d.grouping, label)
+      if not len(rows):
+            raise PreventUpdate
+
+      key = scenario_cache.normalize_inputs(ct_value, payback_value, elec_value, interest_value)
+      total = evaluate(d.typologies, key).costs.total
+      # costliest members first, capped so a huge bucket does not flood the browser
+      rows = rows[(-total[rows].mean(axis=1)).argsort(kind='stable')]
+
+      columns = [{'name': 'Typology', 'id': 'typology'},
+                 {'name': 'Occupancy', 'id': 'occupancy'},
+                 {'name': 'Floor Area (sf)', 'id': 'sf'}]
+      columns += [{'name': f'{fv[i].label} $/sf', 'id': i} for i in fv]
+      records = []
+      for r in rows[:DRILLDOWN_ROWS]:
+            row = {'typology': d.typologies.typology_name[r],
+                   'occupancy': d.typologies.typology_occupany[r],
+                   'sf': int(d.typologies.typology_sf[r])}
+            row.update({i: round(float(total[r, j]), 2) for j, i in enumerate(fv)})
+            records.append(row)
+      title = f'{label}: {len(rows)} typologies' + (f' (top {DRILLDOWN_ROWS} shown)' if len(rows) > DRILLDOWN_ROWS else '')
+      return records, columns, title
+
+
+#-----------------------------------------------------------------------
+#BREAK-EVEN CALLBACK
+#-----------------------------------------------------------------------
+@app.callback(
+      Output('breakeven-table', 'data'),
+      [Input('ct-slider', 'value'),
+       Input('payback-slider', 'value'),
+       Input('elec-slider', 'value'),
+       Input('interest-slider', 'value'),
+      ],
+      # the layout's data= is the table for the default sliders
+      prevent_initial_call=True
+)
+def update_breakeven(ct_value, payback_value, elec_value, interest_value):
+
+      return breakeven_records(scenario_cache.normalize_inputs(ct_value, payback_value, elec_value, interest_value))
+
+
+#-----------------------------------------------------------------------
+#HEATMAP CALLBACK
+#-----------------------------------------------------------------------
+@app.callback(
+      Output('heatmap_output', 'figure'),
+      [Input('payback-slider', 'value'),
+       Input('interest-slider', 'value'),
+       Input('heatmap-typology', 'value'),
+      ],
+      # the layout's figure= is the heatmap for the default sliders
+      prevent_initial_call=True
+)
+def update_heatmap(payback_value, interest_value, typology):
+
+      _, payback, _, interest = scenario_cache.normalize_inputs(0, payback_value, 0, interest_value)
+      return heatmap_figure(payback, interest, None if typology is None or typology < 0 else typology)
+
+
+#-----------------------------------------------------------------------
+#LIFECYCLE CALLBACK
+#-----------------------------------------------------------------------
+@app.callback(
+      Output('lifecycle_output', 'figure'),
+      [Input('ct-slider', 'value'),
+       Input('payback-slider', 'value'),
+       Input('elec-slider', 'value'),
+       Input('interest-slider', 'value'),
+       Input('lifecycle-path', 'value'),
+      ],
+      # the layout's figure= is the projection for the default sliders and path
+      prevent_initial_call=True
+)
+def update_lifecycle(ct_value, payback_value, elec_value, interest_value, path):
+
+      key = scenario_cache.normalize_inputs(ct_value, payback_value, elec_value, interest_value)
+      return lifecycle_figure(path or lifecycle.DEFAULT_PATH, key)
+
+
+#-----------------------------------------------------------------------
+#DATA RELOAD
+#-----------------------------------------------------------------------
+# data_watcher.py calls reload_data() from a background thread when
+# DATA_PATH changes on disk. The new DataState, its default figures and its
+# layout are made while the old ones keep serving, then swapped in by plain
+# assignments. When the chart keeps the same bars, the cached scenarios are
+# carried over with only the changed rows recomputed (cost_engine.update_rows);
+# every entry keyed by the old version is dropped after the swap. An old
+# computation finishing later is stored under the old version, where nothing
+# looks it up any more, and ages out of the LRU.
+def reload_data():
+      global data
+      old = data
+      new = load_data(DATA_PATH, old)
+      if new is old:
+            return 'unchanged'
+      rows = cost_engine.changed_rows(old.district, new.district)
+      if rows is not None:
+            for key, scenario in scenario_cache.scenarios.items():
+                  moved = (new.version,) + key[1:]
+                  if key[0] == old.version and moved not in scenario_cache.scenarios:
+                        scenario_cache.scenarios.put(moved, cost_engine.update_rows(scenario, new.district, rows, fv))
+      warm(new)
+      layout = build_layout(new)
+      data = new
+      app.layout = layout   # http_cache re-serializes it, with a new ETag
+      for name in ('scenarios', 'figures', 'bands', 'projections'):
+            getattr(scenario_cache, name).invalidate(lambda key: key[0] == old.version)
+      # every worker reloads the same file, so none serves the old files for
+      # long; the first one done deletes them and the others' maps stay valid
+      if old.cube is not None and (new.cube is None or new.cube.path != old.cube.path):
+            scenario_cube.discard(old.cube)
+      if new.source.version != old.source.version:
+            data_loader.discard(DATA_PATH, old.source.version, data_loader.CACHE_DIR)
+      return 'full' if rows is None else 'rows'
+
+
+watcher = data_watcher.DataWatcher(DATA_PATH, reload_data, data.source.version, on_reload=metrics.data_reload)
+
+
+@server.before_request
+def _watch_data():
+      watcher.start()   # once per process, see data_watcher.py
+
+
+# the layout's lifecycle figure starts at the year it was drawn in; the
+# first page load of a new year (its GET / comes before the layout) redraws it
+layout_year = lifecycle.start_year()
+
+
+@server.before_request
+def _new_year():
+      global layout_year
+      year = lifecycle.start_year()
+      if year != layout_year:
+            layout_year = year
+            app.layout = build_layout(data)
+
+
+#-----------------------------------------------------------------------
+#WARM-UP
+#-----------------------------------------------------------------------
+def warm(d):
+      get_patch(DEFAULT_KEY, d=d)   # the initial update_graph
+      for key in prefetch.neighbours(DEFAULT_KEY):   # and the first slider move
+            get_patch(key, d=d)
+
+
+# Everything the first page load would otherwise pay for. Not run on
+# import: gunicorn.conf.py calls it once in the preloaded master, whose
+# forked workers inherit the warm caches copy-on-write (or in every worker
+# without preload), and the development server below calls it before it
+# starts. Nothing here may start a thread or a process pool in the
+# master: those do not survive a fork.
+def warm_up():
+      warm(data)
+      # Dash sets itself up on the first request (callback map, asset scan,
+      # script tags); the page requests also load the encoders and compressors
+      client = server.test_client()
+      for path in ('/', '/_dash-layout', '/_dash-dependencies'):
+            client.get(path, headers={'Accept-Encoding': 'br, gzip'})
+      if shared_cache.store is not None:
+            shared_cache.store.close()   # the workers open their own connections
+
 
 if __name__ == '__main__':
+      warm_up()
       app.run(debug=False)
 
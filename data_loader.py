@@ -0,0 +1,146 @@
+import collections
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+#-----------------------------------------------------------------------
+#DISTRICT DATA LOADER
+#-----------------------------------------------------------------------
+# Reads per-building (or per-typology) records from CSV or Parquet with a
+# compact schema, keeps a binary columnar copy next to the source so later
+# worker starts memory-map it instead of parsing text, and rolls buildings
+# up to one row per typology for the chart.
+
+CATEGORICAL_COLUMNS = ('typology_name', 'typology_occupany')
+NUMERIC_COLUMNS = ('typology_sf', 'base_fuel_cost')
+NUMERIC_SUFFIXES = ('_mech_cost', '_elec_cost')   # one pair per fuel
+COST_DTYPE = np.float32
+CACHE_DIR = os.environ.get('DISTRICT_CACHE_DIR', '.district_cache')
+CACHE_FORMAT = 1
+
+# columns     column name -> 1-D array, one entry per building (read-only,
+#             memory-mapped from the cache); categoricals hold int32 codes
+# categories  categorical column name -> list of labels the codes index
+# typologies  DataFrame with one row per typology, district_data.csv schema
+# version     content key of the source file
+District = collections.namedtuple('District', ['columns', 'categories', 'typologies', 'version'])
+
+
+def schema(columns):
+    """pandas dtypes of the columns of a district_data.csv-style header the
+    dashboard reads; anything else (notes, addresses) is left out."""
+    dtypes = {}
+    for c in columns:
+        if c in CATEGORICAL_COLUMNS:
+            dtypes[c] = 'object'   # made categorical in first-seen order after reading
+        elif c in NUMERIC_COLUMNS or c.endswith(NUMERIC_SUFFIXES):
+            dtypes[c] = COST_DTYPE
+    return dtypes
+
+
+def read_source(path):
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow  # noqa: F401  optional, only needed for Parquet
+        except ImportError:
+            raise ImportError(f'{path}: Parquet district files need pyarrow installed (pip install pyarrow), '
+                              f'or use a .csv file') from None
+        import pyarrow.parquet as pq
+        dtypes = schema(pq.read_schema(path).names)
+        df = pd.read_parquet(path, engine='pyarrow', columns=list(dtypes))
+        df = df.astype({c: t for c, t in dtypes.items() if t != 'object'})
+    else:
+        dtypes = schema(pd.read_csv(path, nrows=0).columns)
+        df = pd.read_csv(path, usecols=list(dtypes), dtype=dtypes)
+    for c in CATEGORICAL_COLUMNS:
+        values = df[c].astype(str)
+        df[c] = pd.Categorical(values, categories=pd.unique(values))
+    return df
+
+
+def source_version(path):
+    st = os.stat(path)
+    key = f'{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}:{CACHE_FORMAT}'
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def _write_cache(df, target):
+    tmp = tempfile.mkdtemp(prefix='.tmp-', dir=os.path.dirname(target))
+    meta = {'columns': list(df.columns), 'categories': {}}
+    for c in df.columns:
+        if c in CATEGORICAL_COLUMNS:
+            meta['categories'][c] = [str(v) for v in df[c].cat.categories]
+            values = df[c].cat.codes.to_numpy(dtype=np.int32)
+        else:
+            values = df[c].to_numpy(dtype=COST_DTYPE)
+        np.save(os.path.join(tmp, f'{c}.npy'), values)
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    try:
+        os.rename(tmp, target)   # atomic: other workers see all of it or nothing
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)   # another worker got there first
+
+
+def _read_cache(target):
+    with open(os.path.join(target, 'meta.json')) as f:
+        meta = json.load(f)
+    columns = {c: np.load(os.path.join(target, f'{c}.npy'), mmap_mode='r') for c in meta['columns']}
+    return columns, meta['categories']
+
+
+def aggregate_typologies(columns, categories):
+    """One row per typology: capital costs and floor area are summed, the
+    per-sf base fuel cost is floor-area weighted. A file that already has one
+    row per typology comes back unchanged (up to float32 rounding)."""
+    codes = np.asarray(columns['typology_name'])
+    n = len(categories['typology_name'])
+    sf = np.bincount(codes, weights=columns['typology_sf'], minlength=n)
+    out = {'typology_name': categories['typology_name']}
+    _, first = np.unique(codes, return_index=True)
+    occupancy = np.asarray(columns['typology_occupany'])[first]
+    out['typology_occupany'] = [categories['typology_occupany'][k] for k in occupancy]
+    for c, values in columns.items():
+        if c in CATEGORICAL_COLUMNS:
+            continue
+        if c == 'typology_sf':
+            out[c] = sf
+        elif c == 'base_fuel_cost':
+            out[c] = np.bincount(codes, weights=values * columns['typology_sf'].astype(float), minlength=n) / sf
+        else:
+            out[c] = np.bincount(codes, weights=values, minlength=n)
+    return pd.DataFrame(out)
+
+
+def _cache_path(path, version, cache_dir):
+    return os.path.join(cache_dir, f'{os.path.basename(path)}-{version}')
+
+
+def load_district(path, cache_dir=CACHE_DIR):
+    version = source_version(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    target = _cache_path(path, version, cache_dir)
+    if not os.path.isdir(target):
+        _write_cache(read_source(path), target)
+    columns, categories = _read_cache(target)
+    return District(columns=columns, categories=categories,
+                    typologies=aggregate_typologies(columns, categories), version=version)
+
+
+def discard(path, version, cache_dir=CACHE_DIR):
+    """Delete the binary copy of one version of the file at path; processes
+    that still map its columns keep reading their mapping."""
+    shutil.rmtree(_cache_path(path, version, cache_dir), ignore_errors=True)
+
+
+def buildings_of(district, typology_name):
+    """Building-level rows of one typology, for drill-down."""
+    code = district.categories['typology_name'].index(typology_name)
+    mask = np.asarray(district.columns['typology_name']) == code
+    return pd.DataFrame({c: np.asarray(v)[mask] for c, v in district.columns.items()
+                         if c not in CATEGORICAL_COLUMNS})
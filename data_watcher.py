@@ -0,0 +1,84 @@
+import logging
+import os
+import threading
+import time
+
+import data_loader
+
+#-----------------------------------------------------------------------
+#DATA WATCHER
+#-----------------------------------------------------------------------
+# Polls the version of the district data file (size and mtime, see
+# data_loader.source_version) every DATA_POLL_INTERVAL seconds from a
+# daemon thread and calls reload() once a new version has stayed the same
+# for two polls in a row, so a file that is still being written is not
+# read half way. reload() runs in the watcher thread; requests go on
+# being served from the old data until it returns. If it raises, the old
+# data stays and the next change of the file is tried again.
+#
+# The thread is started on first use in every process but the gunicorn
+# master (gunicorn.conf.py marks it with DASHBOARD_MASTER_PID), which
+# serves nothing and hands its forked workers no threads. Each worker
+# reloads for itself; data_loader's binary copy and the scenario cube of
+# the new version are written once and shared through CACHE_DIR.
+
+DATA_POLL_INTERVAL = float(os.environ.get('DATA_POLL_INTERVAL', 5))   # seconds, 0 turns the watcher off
+
+log = logging.getLogger(__name__)
+
+
+class DataWatcher:
+    """Calls reload() after the file at path changed on disk."""
+
+    def __init__(self, path, reload, version=None, interval=DATA_POLL_INTERVAL, on_reload=None):
+        self.path = path
+        self.reload = reload
+        self.interval = interval
+        self.on_reload = on_reload   # called with what reload() returned, or 'failed'
+        self.version = version or self._current()   # of the data being served
+        self._seen = self.version
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _current(self):
+        try:
+            return data_loader.source_version(self.path)
+        except OSError:
+            return None   # being replaced; the next poll will see the new file
+
+    def start(self):
+        # first use, and again in a forked child
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        if os.environ.get('DASHBOARD_MASTER_PID') == str(os.getpid()):
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='data-watcher', daemon=True).start()
+
+    def check(self):
+        """One poll: reload if the file changed and has settled; True if it was reloaded."""
+        current = self._current()
+        settled = current == self._seen
+        self._seen = current
+        if current is None or current == self.version or not settled:
+            return False
+        try:
+            result = self.reload()
+        except Exception:
+            log.exception('reloading %s failed, still serving the previous data', self.path)
+            self.version = current   # not again until the file changes once more
+            if self.on_reload is not None:
+                self.on_reload('failed')
+            return False
+        self.version = current
+        if self.on_reload is not None:
+            self.on_reload(result or 'reloaded')
+        return True
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.check()
@@ -0,0 +1,243 @@
+"""Export scenario results as CSV or Parquet.
+
+    python export.py --carbon-tax all --elec 0.1,0.16 --format parquet --out sweep.parquet
+
+Each slider option takes a value, a comma-separated list, start:stop:step
+or 'all' (every slider position) and defaults to the slider's value on
+page load. The same rows are served by GET /api/export?carbon_tax=...&format=csv.
+Parquet needs the optional pyarrow package; without it format=parquet is
+answered with 501 (an argument error on the command line).
+"""
+import argparse
+import io
+import os
+import sys
+
+import flask
+import numpy as np
+import pandas as pd
+
+import api
+import cost_engine
+import scenario_cache
+import scenario_cube
+
+#-----------------------------------------------------------------------
+#SCENARIO EXPORT
+#-----------------------------------------------------------------------
+# One row per scenario x bar x fuel. Scenarios are enumerated lazily in
+# slider-grid order and evaluated EXPORT_CHUNK at a time with
+# cost_engine.compute_costs_batch (the chart's formulas, element for
+# element), and every chunk becomes one CSV block or one Parquet row group,
+# so memory stays flat however large the sweep is.
+
+EXPORT_CHUNK = int(os.environ.get('EXPORT_CHUNK', 1024))             # scenarios per chunk
+EXPORT_MAX_ROWS = int(os.environ.get('EXPORT_MAX_ROWS', 100_000_000))
+FORMATS = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+PARAMETERS = ('carbon_tax', 'amortization_period', 'electricity_price', 'interest_rate')   # grid order
+ALL_VALUES = dict(zip(PARAMETERS, (scenario_cube.CT_VALUES, scenario_cube.PAYBACK_VALUES,
+                                   scenario_cube.ELEC_VALUES, scenario_cube.INTEREST_VALUES)))
+COLUMNS = PARAMETERS + ('typology_name', 'fuel', 'mech', 'elec', 'fuel_cost', 'total')
+
+
+def parse_values(name, spec):
+    """Sorted unique values of one parameter from 'all', 'a:b:step', 'a,b,c' or a number."""
+    if spec is None:
+        return np.array([dict(zip(PARAMETERS, scenario_cache.DEFAULT_KEY))[name]], dtype=float)
+    spec = str(spec).strip()
+    try:
+        if spec == 'all':
+            values = np.asarray(ALL_VALUES[name], dtype=float)
+        elif ':' in spec:
+            start, stop, step = (float(v) for v in spec.split(':'))
+            # inclusive of stop, snapped like the sliders so 0.1 steps do not drift
+            values = np.round(start + step * np.arange(max(0, int(np.floor((stop - start) / step + 1e-9)) + 1)), 6)
+        else:
+            values = np.array([float(v) for v in spec.split(',')])
+    except (ValueError, ZeroDivisionError):
+        raise api.BadRequest(f'{name}: cannot read {spec!r}')
+    if not len(values) or (':' in spec and step <= 0):
+        raise api.BadRequest(f'{name}: {spec!r} is empty')
+    low, high = scenario_cache.SLIDER_RANGES[name]
+    if values.min() < low or values.max() > high or not np.isfinite(values).all():
+        raise api.BadRequest(f'{name} outside the slider range [{low}, {high}]')
+    if name == 'amortization_period' and np.any(values != np.round(values)):
+        raise api.BadRequest('amortization_period must be whole years')
+    return np.unique(values)
+
+
+def sweep(values_of):
+    """Grid of value arrays in PARAMETERS order from a name -> spec lookup."""
+    return [parse_values(name, values_of(name)) for name in PARAMETERS]
+
+
+def n_scenarios(grid):
+    return int(np.prod([len(v) for v in grid]))
+
+
+def chunks(inputs, grid, catalog=cost_engine.FUEL_CATALOG, chunk=EXPORT_CHUNK):
+    """DataFrames of COLUMNS, EXPORT_CHUNK scenarios (x bars x fuels rows) each."""
+    ct_values, period_values, elec_values, interest_values = grid
+    fuels = inputs.fuels
+    n_typologies, n_fuels = len(inputs.typology_name), len(fuels)
+    shape = tuple(len(v) for v in grid)
+    # pgj rates only depend on the electricity price, same calls as evaluate_scenario
+    pgj_by_elec = np.stack([cost_engine.fuel_pgj_rates(catalog, fuels, e) for e in elec_values])
+    ct_rate = catalog.column('ct_rate', fuels)
+    cop = catalog.column('cop', fuels)
+    typology = pd.Categorical.from_codes(np.tile(np.repeat(np.arange(n_typologies), n_fuels), chunk),
+                                         categories=list(inputs.typology_name))
+    fuel = pd.Categorical.from_codes(np.tile(np.arange(n_fuels), n_typologies * chunk), categories=list(fuels))
+    per_scenario = n_typologies * n_fuels
+    total = n_scenarios(grid)
+    for start in range(0, total, chunk):
+        c, p, e, r = np.unravel_index(np.arange(start, min(start + chunk, total)), shape)
+        n = len(c)
+        ct, period, elec, interest = ct_values[c], period_values[p], elec_values[e], interest_values[r]
+        costs = cost_engine.compute_costs_batch(
+            inputs, pgj_by_elec[e], np.broadcast_to(ct_rate, (n, n_fuels)), np.broadcast_to(cop, (n, n_fuels)),
+            ct, interest / 100, period.astype(int))
+        yield pd.DataFrame({
+            'carbon_tax': np.repeat(ct, per_scenario),
+            'amortization_period': np.repeat(period.astype(int), per_scenario),
+            'electricity_price': np.repeat(elec, per_scenario),
+            'interest_rate': np.repeat(interest, per_scenario),
+            'typology_name': typology[:n * per_scenario],
+            'fuel': fuel[:n * per_scenario],
+            'mech': costs.mech.ravel(),
+            'elec': costs.elec.ravel(),
+            'fuel_cost': costs.fuel.ravel(),
+            'total': costs.total.ravel(),
+        }, columns=COLUMNS)
+
+
+def csv_pieces(frames):
+    header = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header).encode()
+        header = False
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last take()."""
+
+    def __init__(self):
+        self._pieces = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._pieces.append(bytes(b))
+        self._position += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        out = b''.join(self._pieces)
+        self._pieces = []
+        return out
+
+
+def parquet_pieces(frames):
+    import pyarrow as pa          # optional, only needed for Parquet
+    import pyarrow.parquet as pq
+
+    sink = _Sink()
+    writer = None
+    for frame in frames:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)   # one row group per chunk
+        yield sink.take()
+    if writer is not None:
+        writer.close()
+    yield sink.take()
+
+
+def pieces(inputs, grid, fmt, catalog=cost_engine.FUEL_CATALOG, chunk=EXPORT_CHUNK):
+    frames = chunks(inputs, grid, catalog, chunk)
+    return parquet_pieces(frames) if fmt == 'parquet' else csv_pieces(frames)
+
+
+def check_size(inputs, grid, fmt):
+    if fmt not in FORMATS:
+        raise api.BadRequest(f'format must be one of {sorted(FORMATS)}')
+    rows = n_scenarios(grid) * len(inputs.typology_name) * len(inputs.fuels)
+    if rows > EXPORT_MAX_ROWS:
+        raise api.BadRequest(f'{rows} rows is over the {EXPORT_MAX_ROWS} row limit', status=413)
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise api.BadRequest('Parquet export needs pyarrow installed', status=501)
+
+
+def init_app(server, get_inputs, catalog=cost_engine.FUEL_CATALOG):
+    """Register GET /api/export; get_inputs() returns the DistrictInputs to export (the chart's bars)."""
+
+    @server.route('/api/export')
+    def _export():
+        args = flask.request.args
+        fmt = args.get('format', 'csv')
+        inputs = get_inputs()
+        try:
+            grid = sweep(args.get)
+            check_size(inputs, grid, fmt)
+        except api.BadRequest as e:
+            return flask.Response(f'{e}\n', status=e.status, content_type='text/plain')
+        body = pieces(inputs, grid, fmt, catalog)
+        encoding = None
+        if fmt == 'csv':   # parquet pages are compressed already
+            encoding = flask.request.accept_encodings.best_match(['br', 'gzip'])
+            body = api.encoded(body, encoding)
+        response = flask.Response(body, content_type=FORMATS[fmt], direct_passthrough=True)
+        response.headers['Content-Disposition'] = f'attachment; filename=scenarios.{fmt}'
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+            response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    return server
+
+
+def main(argv=None):
+    import aggregation
+    import data_loader
+
+    parser = argparse.ArgumentParser(description='Export scenario results for a slider sweep.')
+    parser.add_argument('--data', default=os.environ.get('DISTRICT_DATA', 'district_data.csv'))
+    parser.add_argument('--carbon-tax', dest='carbon_tax')
+    parser.add_argument('--payback', dest='amortization_period')
+    parser.add_argument('--elec', dest='electricity_price')
+    parser.add_argument('--interest', dest='interest_rate')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--typologies', action='store_true',
+                        help='one row per typology instead of per chart bar')
+    parser.add_argument('--out', help='file to write (default: stdout)')
+    args = parser.parse_args(argv)
+
+    district_data = data_loader.load_district(args.data)
+    inputs = cost_engine.load_inputs(district_data.typologies, cost_engine.FUEL_CATALOG)
+    if not args.typologies:
+        inputs = aggregation.group_inputs(inputs, aggregation.chart_grouping(inputs))
+    try:
+        grid = sweep(lambda name: getattr(args, name))
+        check_size(inputs, grid, args.format)
+    except api.BadRequest as e:
+        parser.error(str(e))
+    out = open(args.out, 'wb') if args.out else sys.stdout.buffer
+    try:
+        for piece in pieces(inputs, grid, args.format):
+            out.write(piece)
+    finally:
+        if args.out:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
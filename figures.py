@@ -0,0 +1,291 @@
+import os
+
+from plotly.subplots import make_subplots
+import plotly.graph_objects as go
+from dash import Patch
+import numpy as np
+
+import breakeven
+
+#-----------------------------------------------------------------------
+#FIGURES
+#-----------------------------------------------------------------------
+# build_figure() makes the full per-fuel subplot figure. It is used once
+# for the skeleton that ships with the layout; slider moves only send a
+# build_patch() with the values that depend on the scenario (bar heights,
+# average lines, axis range and annotation texts).
+# Annotation order in the layout: one avg label per fuel (from add_hline),
+# the four scenario texts, then one break-even label per fuel.
+#
+# Past FACET_FUELS fuels a subplot per fuel gets slow to build and to draw,
+# so the figure is faceted instead: one axis with (fuel, typology) bars,
+# one stacked bar trace per cost component coloured by fuel, and one
+# line trace holding every fuel's average (with its label and break-even
+# text), whatever the number of fuels. The only annotations are the four
+# scenario texts.
+
+FACET_FUELS = int(os.environ.get('FACET_FUELS', 12))
+TITLE = "Yearly Space Heating Cost per Square Foot in Toronto District by Fuel and Building Type"
+COMPONENTS = (('mech', 'Mechanical System $/sf', 1),
+              ('elec', 'Electrical System $/sf', 0.25),
+              ('fuel', 'Fuel Cost $/sf', 0.67))
+
+
+def annotation_texts(scenario):
+    # 'Electricity Cost' has always shown the rate of the last fuel in the catalog
+    return [f'Carbon Tax = {round(scenario.ct, 0)}$/ton',
+            f'Electricity Cost = {round(scenario.pgj_rate[-1], 2)}$/GJ',
+            f'Amortization Period = {scenario.int_period} years',
+            f'Interest Rate = {round(scenario.int_rate * 100, 1)}%']
+
+
+def _bar_values(scenario):
+    costs = scenario.costs
+    return {'mech': costs.mech.round(2), 'elec': costs.elec.round(2), 'fuel': costs.fuel.round(2)}
+
+
+def add_cost_traces(fig, scenario, inputs, catalog):
+    bars = _bar_values(scenario)
+    for cur_index, i in enumerate(inputs.fuels):
+        cur_colour = catalog[i].colour
+        for component, name, alpha in COMPONENTS:
+            fig.add_trace(go.Bar(x=inputs.typology_name,
+                                 y=bars[component][:, cur_index],
+                                 name=name,
+                                 marker=dict(color=f'rgba({cur_colour},{alpha})', line=dict(width=1, color=f'rgba({cur_colour},1)'))),
+                          row=1, col=cur_index + 1)
+        fig.update_xaxes(title_text=catalog[i].label, row=1, col=cur_index + 1)
+    return fig
+
+
+def add_average_lines(fig, scenario, inputs, catalog):
+    avg_list = scenario.costs.total.mean(axis=0)
+    for cur_index, i in enumerate(inputs.fuels):
+        avg_y = avg_list[cur_index]
+        fig.add_hline(y=avg_y,
+                      line_width=4,
+                      line_color=f'rgba({catalog[i].colour},1)',
+                      opacity=1,
+                      annotation_text=f'avg: {round(avg_y, 2)}$/sf',
+                      row=1, col=cur_index + 1)
+    return fig
+
+
+def add_annotations(fig, scenario):
+    fig.update_layout(yaxis_title_text='$ per Square Foot per Year')   # the first subplot's
+    fig.update_yaxes(range=[0, scenario.costs.total.max() + 1])
+    fig.update_layout(font_family="Roboto", barmode='stack', hovermode='x unified',
+                      hoverlabel=dict(namelength=-1),
+                      showlegend=False)
+    for text, y in zip(annotation_texts(scenario), (0.95, 0.90, 0.85, 0.80)):
+        fig.add_annotation(text=text, xref="paper", yref="paper", x=0.01, y=y, showarrow=False)
+    fig.update_layout(
+        title_text=TITLE,
+        title_x=0.5,
+        height=640,
+        template='simple_white'
+    )
+    return fig
+
+
+def add_breakeven_labels(fig, scenario, inputs, catalog):
+    for cur_index, text in enumerate(breakeven.overlay_texts(inputs, scenario, catalog)):
+        axis = '' if cur_index == 0 else cur_index + 1
+        fig.add_annotation(text=text, xref=f'x{axis} domain', yref=f'y{axis} domain',
+                           x=0.5, y=1.0, yanchor='bottom', showarrow=False, font=dict(size=10))
+    return fig
+
+
+def faceted(inputs):
+    return len(inputs.fuels) > FACET_FUELS
+
+
+def _fuel_major(a):
+    """(typology, fuel) values as the faceted bars run: every typology of the first fuel first."""
+    return a.T.ravel()
+
+
+def _average_texts(scenario, bands=None):
+    """The avg label of each fuel, with the P10-P90 of its avg line when bands are given."""
+    texts = []
+    for cur_index, avg_y in enumerate(scenario.costs.total.mean(axis=0).tolist()):
+        text = f'avg: {round(avg_y, 2)}$/sf'
+        if bands is not None:
+            # the avg line is a mean of lines in the fuel rate, so its bands are the mean bands
+            text += (f' (P10-P90 {round(float(bands.low[:, cur_index].mean()), 2)}'
+                     f'-{round(float(bands.high[:, cur_index].mean()), 2)})')
+        texts.append(text)
+    return texts
+
+
+def _facet_texts(scenario, inputs, catalog, bands=None):
+    # the subplots show the break-even text above each fuel, the facets under its avg label
+    return [avg + (f'<br>{text}' if text else '')
+            for avg, text in zip(_average_texts(scenario, bands), breakeven.overlay_texts(inputs, scenario, catalog))]
+
+
+def _average_line(scenario, inputs, avg_texts):
+    """y and text of the faceted average trace: one segment per fuel over its
+    typologies, each followed by a gap."""
+    avg_list = scenario.costs.total.mean(axis=0).tolist()
+    y, text = [], []
+    for avg_y, avg_text in zip(avg_list, avg_texts):
+        y += [round(avg_y, 4), round(avg_y, 4), None]
+        text += [avg_text, '', '']
+    return y, text
+
+
+def _fuel_colorscale(catalog, fuels):
+    # one flat band per fuel; colour values are fuel positions, cmin/cmax centre them in their band
+    n = len(fuels)
+    scale = []
+    for k, i in enumerate(fuels):
+        colour = f'rgb({catalog[i].colour})'
+        scale += [[k / n, colour], [(k + 1) / n, colour]]
+    return dict(colorscale=scale, cmin=-0.5, cmax=n - 0.5, showscale=False)
+
+
+def build_facet_figure(scenario, inputs, catalog):
+    fuels = inputs.fuels
+    labels = [catalog[i].label for i in fuels]
+    names = list(inputs.typology_name)
+    x = [np.repeat(labels, len(names)).tolist(), names * len(labels)]
+    # bar colours are fuel numbers on one shared colour axis: colour strings are
+    # validated one by one, per bar or per colorscale entry of every trace,
+    # and the build time would grow with the fuel count again
+    fuel_number = np.repeat(np.arange(len(fuels)), len(names))
+    bars = _bar_values(scenario)
+    fig = go.Figure()
+    for component, name, alpha in COMPONENTS:
+        fig.add_trace(go.Bar(x=x, y=_fuel_major(bars[component]), name=name,
+                             marker=dict(color=fuel_number, coloraxis='coloraxis', opacity=alpha,
+                                         line=dict(width=1, color=fuel_number, coloraxis='coloraxis'))))
+    fig.update_layout(coloraxis=_fuel_colorscale(catalog, fuels))
+    y, text = _average_line(scenario, inputs, _facet_texts(scenario, inputs, catalog))
+    fig.add_trace(go.Scatter(x=[np.repeat(labels, 3).tolist(), [names[0], names[-1], names[-1]] * len(labels)],
+                             y=y, text=text, mode='lines+text', textposition='top right', name='avg',
+                             line=dict(width=4, color='rgba(0,0,0,0.7)'), hoverinfo='skip'))
+    return add_annotations(fig, scenario)
+
+
+def build_figure(scenario, inputs, catalog):
+    if faceted(inputs):
+        return build_facet_figure(scenario, inputs, catalog)
+    fig = make_subplots(rows=1, cols=len(inputs.fuels))
+    add_cost_traces(fig, scenario, inputs, catalog)
+    add_average_lines(fig, scenario, inputs, catalog)
+    add_annotations(fig, scenario)
+    return add_breakeven_labels(fig, scenario, inputs, catalog)
+
+
+def _error_bars(scenario, bands, cur_index):
+    """error_y/customdata of the top (fuel) bar: P10-P90 around the stacked
+    total at the catalog's point values, P50 in the hover. cur_index may be
+    a slice of fuels, flattened like the faceted bars."""
+    total = scenario.costs.total[:, cur_index]
+    low, mid, high = (b[:, cur_index] for b in (bands.low, bands.mid, bands.high))
+    if total.ndim == 2:
+        total, low, mid, high = (_fuel_major(a) for a in (total, low, mid, high))
+    error_y = dict(type='data', symmetric=False, visible=True, thickness=1.5, color='rgba(0,0,0,0.6)',
+                   array=(high - total).clip(0).round(2).tolist(),
+                   arrayminus=(total - low).clip(0).round(2).tolist())
+    customdata = np.stack([low, mid, high], axis=1).round(2).tolist()
+    return error_y, customdata
+
+
+def build_patch(scenario, inputs, catalog, bands=None, clear_bands=False):
+    """Partial update of a build_figure() skeleton with the same fuels and typologies.
+
+    bands (uncertainty.Bands) adds P10/P90 error bars; clear_bands removes
+    the ones an earlier patch added.
+    """
+    costs = scenario.costs
+    bars = _bar_values(scenario)
+    # line positions only need to be right to the pixel, full doubles just add bytes
+    top = costs.total.max() if bands is None else max(costs.total.max(), bands.high.max())
+    y_range = [0, round(float(top) + 1, 4)]
+    n_fuels = len(inputs.fuels)
+
+    patch = Patch()
+    if faceted(inputs):
+        for k, (component, _, _) in enumerate(COMPONENTS):
+            patch['data'][k]['y'] = _fuel_major(bars[component]).tolist()
+        avg_trace = patch['data'][len(COMPONENTS)]
+        avg_trace['y'], avg_trace['text'] = _average_line(scenario, inputs, _facet_texts(scenario, inputs, catalog, bands))
+        patch['layout']['yaxis']['range'] = y_range
+        _patch_bands(patch['data'][len(COMPONENTS) - 1], scenario, bands, clear_bands, slice(None))
+        for k, text in enumerate(annotation_texts(scenario)):
+            patch['layout']['annotations'][k]['text'] = text
+        return patch
+
+    avg_list = costs.total.mean(axis=0).tolist()
+    avg_texts = _average_texts(scenario, bands)
+    for cur_index in range(n_fuels):
+        for k, (component, _, _) in enumerate(COMPONENTS):
+            patch['data'][len(COMPONENTS) * cur_index + k]['y'] = bars[component][:, cur_index].tolist()
+        axis = 'yaxis' if cur_index == 0 else f'yaxis{cur_index + 1}'
+        patch['layout'][axis]['range'] = y_range
+        avg_y = round(avg_list[cur_index], 4)
+        # add_hline puts shape j and its annotation j in subplot j
+        patch['layout']['shapes'][cur_index]['y0'] = avg_y
+        patch['layout']['shapes'][cur_index]['y1'] = avg_y
+        patch['layout']['annotations'][cur_index]['y'] = avg_y
+        patch['layout']['annotations'][cur_index]['text'] = avg_texts[cur_index]
+        _patch_bands(patch['data'][len(COMPONENTS) * cur_index + len(COMPONENTS) - 1], scenario, bands, clear_bands,
+                     cur_index)
+    scenario_texts = annotation_texts(scenario)
+    for k, text in enumerate(scenario_texts):
+        patch['layout']['annotations'][n_fuels + k]['text'] = text
+    for k, text in enumerate(breakeven.overlay_texts(inputs, scenario, catalog)):
+        patch['layout']['annotations'][n_fuels + len(scenario_texts) + k]['text'] = text
+    return patch
+
+
+def _patch_bands(fuel_trace, scenario, bands, clear_bands, cur_index):
+    if bands is None and clear_bands:
+        fuel_trace['error_y'] = dict(visible=False)
+        fuel_trace['hovertemplate'] = None
+    elif bands is not None:
+        fuel_trace['error_y'], fuel_trace['customdata'] = _error_bars(scenario, bands, cur_index)
+        fuel_trace['hovertemplate'] = ('%{y} (total P10 %{customdata[0]}, P50 %{customdata[1]}, '
+                                       'P90 %{customdata[2]})')
+
+
+def build_winning_fuel_heatmap(cheapest, ct_values, elec_values, fuels, catalog, title):
+    """Heatmap of the cheapest fuel index over carbon tax (x) x electricity price (y)."""
+    n = len(fuels)
+    colorscale = []
+    for k, i in enumerate(fuels):
+        colour = f'rgb({catalog[i].colour})'
+        colorscale += [[k / n, colour], [(k + 1) / n, colour]]
+    z = cheapest.T   # rows: electricity price, columns: carbon tax
+    labels = [[catalog[fuels[k]].label for k in row] for row in z.tolist()]
+    fig = go.Figure(go.Heatmap(
+        x=list(ct_values), y=list(elec_values), z=z,
+        zmin=-0.5, zmax=n - 0.5, colorscale=colorscale,
+        text=labels, hovertemplate='%{x}$/ton, %{y}$/kWh: %{text}<extra></extra>',
+        colorbar=dict(tickvals=list(range(n)), ticktext=[catalog[i].label for i in fuels])))
+    fig.update_xaxes(title_text='Carbon Tax ($/ton)')
+    fig.update_yaxes(title_text='Electricity Price ($/kWh)')
+    fig.update_layout(title_text=title, title_x=0.5, height=480, font_family="Roboto", template='simple_white')
+    return fig
+
+
+def build_lifecycle_figure(projection, fuels, catalog, title):
+    """Cumulative discounted $/sf of each fuel by year, carbon tax on a second axis."""
+    fig = go.Figure()
+    years = projection.years.tolist()
+    for k, i in enumerate(fuels):
+        fig.add_trace(go.Scatter(x=years, y=projection.district[:, k], name=catalog[i].label, mode='lines',
+                                 line=dict(color=f'rgb({catalog[i].colour})', width=3),
+                                 hovertemplate='%{y:.2f}$/sf'))
+    fig.add_trace(go.Scatter(x=years, y=projection.ct, name='Carbon Tax', mode='lines', yaxis='y2',
+                             line=dict(color='grey', dash='dot'), hovertemplate='%{y:.0f}$/ton'))
+    fig.update_layout(
+        title_text=title, title_x=0.5, height=520, font_family="Roboto", template='simple_white',
+        hovermode='x unified', hoverlabel=dict(namelength=-1),
+        xaxis=dict(title_text='Year'),
+        yaxis=dict(title_text='Cumulative Discounted $ per Square Foot', rangemode='tozero'),
+        yaxis2=dict(title_text='Carbon Tax ($/ton)', overlaying='y', side='right', rangemode='tozero',
+                    showgrid=False))
+    return fig
@@ -0,0 +1,70 @@
+import gc
+import os
+import shutil
+import tempfile
+
+#-----------------------------------------------------------------------
+#GUNICORN CONFIG (picked up automatically from the working directory)
+#-----------------------------------------------------------------------
+# Workers write their prometheus samples into a shared directory so that
+# /metrics on any worker reports the whole process group.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'dashboard-metrics'))
+
+# prometheus_client picks its value backend at import, so only after the
+# variable is set; importing it first leaves every worker with private counters
+from prometheus_client import multiprocess  # noqa: E402
+
+import shared_cache  # noqa: E402
+
+# Import dashboard (data, scenario cube, default figure) and warm it up
+# (dashboard.warm_up, in when_ready) once in the master; workers are forked
+# from it warm and share those pages. GUNICORN_PRELOAD=0 makes every worker
+# import and warm up for itself (post_worker_init).
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+def _fresh_start():
+    # samples from a previous run would otherwise be added to this one
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+    # a new deploy may change what the shared cache holds; start it empty
+    if shared_cache.SHARED_CACHE_PATH:
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(shared_cache.SHARED_CACHE_PATH + suffix)
+            except FileNotFoundError:
+                pass
+
+
+# here rather than in on_starting, which runs after a preloaded app has
+# already written to both; once per master, not again when SIGHUP rereads this file
+if os.environ.get('DASHBOARD_MASTER_PID') != str(os.getpid()):
+    os.environ['DASHBOARD_MASTER_PID'] = str(os.getpid())
+    _fresh_start()
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        import dashboard
+        dashboard.warm_up()
+        # the preloaded objects never die; keep the collector from writing to
+        # their pages in the workers, which would make private copies of them
+        gc.collect()
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    if not worker.cfg.preload_app:
+        import dashboard
+        dashboard.warm_up()
+
+
+def pre_fork(server, worker):
+    # a SQLite connection must not cross a fork (see shared_cache.SharedStore)
+    if shared_cache.store is not None:
+        shared_cache.store.close()
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,83 @@
+import hashlib
+
+import flask
+
+#-----------------------------------------------------------------------
+#HTTP CACHING (LAYOUT AND ASSETS)
+#-----------------------------------------------------------------------
+# The layout carries the pre-rendered default figure, so it is the biggest
+# response of a page load, and it only changes when app.layout is replaced.
+# It is serialized once and sent with a strong ETag and Cache-Control:
+# no-cache, as are the files in assets/: a returning browser revalidates
+# and gets an empty 304. Asset URLs with Dash's ?m=<mtime> fingerprint
+# never change content and may be kept for a year without asking.
+#
+# flask-compress 1.9 appends ':br' / ':gzip' to the ETag of what it
+# compresses and does not answer If-None-Match itself, so the 304s are
+# decided here, on the tag without that suffix, before it runs.
+
+ASSET_MAX_AGE = 365 * 24 * 3600
+ENCODING_SUFFIXES = (':br', ':gzip', ':deflate')
+
+
+def _base_tag(tag):
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)]
+    return tag
+
+
+def _not_modified(response):
+    """304 if the request's If-None-Match names the response's ETag, else None."""
+    etag, _ = response.get_etag()
+    sent = flask.request.if_none_match
+    if etag is None or not sent:
+        return None
+    for tag in sent.as_set(include_weak=True):
+        if sent.star_tag or _base_tag(tag) == etag:
+            not_modified = flask.Response(status=304)
+            not_modified.set_etag(tag)   # the tag as the client has it, suffix and all
+            for name in ('Cache-Control', 'Vary'):
+                if name in response.headers:
+                    not_modified.headers[name] = response.headers[name]
+            return not_modified
+    return None
+
+
+def init_app(server, app):
+    """Serve app's layout from a cached body and make layout and assets
+    conditional. Call after compression.init_app (see above)."""
+    layout_endpoint = app.config.routes_pathname_prefix + '_dash-layout'
+    assets_prefix = app.config.routes_pathname_prefix + app.config.assets_url_path.lstrip('/') + '/'
+    cached = [None, b'', '']   # app.layout the body was made from, body, etag
+
+    @server.before_request
+    def _serve_layout():
+        if flask.request.endpoint != layout_endpoint:
+            return None
+        layout, body, etag = cached
+        if layout is not app.layout:
+            layout = app.layout
+            body = app.serve_layout().get_data()
+            etag = hashlib.sha256(body).hexdigest()[:32]
+            cached[:] = layout, body, etag   # one assignment: other threads see all of it or none
+        response = flask.Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    @server.after_request
+    def _conditional(response):
+        is_asset = flask.request.path.startswith(assets_prefix)
+        if (flask.request.method != 'GET' or response.status_code != 200
+                or not (is_asset or flask.request.endpoint == layout_endpoint)):
+            return response
+        if is_asset:
+            if 'm' in flask.request.args:
+                response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+            else:
+                response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return _not_modified(response) or response
+
+    return server
@@ -0,0 +1,93 @@
+import collections
+import datetime
+import os
+
+import numpy as np
+
+from cost_engine import FUEL_CATALOG, CostResult, compute_costs_batch, fuel_pgj_rates
+
+#-----------------------------------------------------------------------
+#LIFECYCLE PROJECTION
+#-----------------------------------------------------------------------
+# Year-by-year cost of every typology x fuel from this year (start_year())
+# to END_YEAR under a carbon-price path. A year costs what the chart shows for that
+# year's carbon tax, except that the capital payments stop once the loan
+# (payback slider) is paid off. All years go through
+# cost_engine.compute_costs_batch as one batch of scenarios, so a 25-year
+# projection is one array operation of the same kind as one slider move.
+#
+# Payments are at the end of each year and discounted at the interest
+# slider's rate: capital is financed at that rate, so once the loan is
+# paid off the discounted payments add up to the capital cost itself.
+# Electricity prices are held at the slider value (real terms).
+
+END_YEAR = 2050
+TARGET_YEAR, TARGET_CT = 2030, 170   # the slider's 'projected' mark
+RISE_AFTER_TARGET = 15               # $/ton a year on the 'rising' path
+
+# the target paths never fall below the slider value: above TARGET_CT they
+# hold it until TARGET_YEAR
+PATHS = {
+    'target': f'Slider value now, at least {TARGET_CT}$/ton by {TARGET_YEAR}, then flat',
+    'rising': f'Slider value now, at least {TARGET_CT}$/ton by {TARGET_YEAR}, then +{RISE_AFTER_TARGET}$/ton a year',
+    'flat': 'Slider value every year',
+}
+DEFAULT_PATH = 'target'
+
+# years     (n_years,) calendar years
+# ct        (n_years,) carbon tax of each year, $/ton
+# costs     CostResult of (n_years, n_typologies, n_fuels) yearly $/sf, undiscounted
+# npv       (n_years, n_typologies, n_fuels) discounted $/sf up to and including each year
+# district  (n_years, n_fuels) npv averaged over typologies, weighted by floor area
+Projection = collections.namedtuple('Projection', ['years', 'ct', 'costs', 'npv', 'district'])
+
+
+def start_year():
+    """LIFECYCLE_START_YEAR, else the current year; asked on every projection
+    since a worker may well be running over New Year."""
+    return int(os.environ.get('LIFECYCLE_START_YEAR') or datetime.date.today().year)
+
+
+def years(start=None, end=END_YEAR):
+    start = start_year() if start is None else start
+    return np.arange(start, max(start, end) + 1)
+
+
+def carbon_path(path, ct_now, year):
+    """Carbon tax ($/ton) in each of year along one of PATHS, starting at ct_now."""
+    if path not in PATHS:
+        raise ValueError(f'unknown carbon price path {path!r}, expected one of {sorted(PATHS)}')
+    year = np.asarray(year, dtype=float)
+    if path == 'flat':
+        return np.full(year.shape, float(ct_now))
+    target_year = max(TARGET_YEAR, year[0] + 1)
+    ct = np.interp(year, [year[0], target_year], [ct_now, max(ct_now, TARGET_CT)])
+    if path == 'rising':
+        ct = ct + RISE_AFTER_TARGET * np.clip(year - target_year, 0, None)
+    return ct
+
+
+def project(inputs, path, ct_now, int_period, int_rate, elec_value, catalog=FUEL_CATALOG, year=None):
+    """Projection of inputs along a carbon price path; int_rate is a fraction."""
+    year = years() if year is None else np.asarray(year)
+    ct = carbon_path(path, ct_now, year)
+    n = len(year)
+    fuels = inputs.fuels
+    pgj_rate = fuel_pgj_rates(catalog, fuels, elec_value)
+    costs = compute_costs_batch(inputs,
+                                np.broadcast_to(pgj_rate, (n, len(fuels))),
+                                np.broadcast_to(catalog.column('ct_rate', fuels), (n, len(fuels))),
+                                np.broadcast_to(catalog.column('cop', fuels), (n, len(fuels))),
+                                # one loan for all years: (1, T, F) capital broadcasts over them
+                                ct, [int_rate], [int_period])
+
+    paying = (np.arange(n) < int_period)[:, None, None]   # loan paid off after int_period years
+    mech = costs.mech * paying
+    elec = costs.elec * paying
+    costs = CostResult(mech=mech, elec=elec, fuel=costs.fuel, total=mech + elec + costs.fuel)
+
+    discount = (1 + int_rate) ** -np.arange(1, n + 1, dtype=float)
+    npv = np.cumsum(costs.total * discount[:, None, None], axis=0)
+    sf = inputs.typology_sf
+    district = np.einsum('ytf,t->yf', npv, sf) / sf.sum()
+    return Projection(years=year, ct=ct, costs=costs, npv=npv, district=district)
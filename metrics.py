@@ -0,0 +1,127 @@
+import contextlib
+import os
+import time
+
+import flask
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+#-----------------------------------------------------------------------
+#METRICS
+#-----------------------------------------------------------------------
+# Prometheus histograms for the update_graph phases, request latency and
+# payload sizes, served as text on /metrics. Under gunicorn set
+# PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py does) so every worker writes
+# its samples there and /metrics aggregates all of them.
+
+LATENCY_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072, 262144, 524288, 1048576)
+
+PHASE_SECONDS = Histogram(
+    'dashboard_update_graph_phase_seconds',
+    'Time spent in each phase of the graph_output callback '
+    '(serialize covers callback return to response, including compression)',
+    ['phase'], buckets=LATENCY_BUCKETS)
+REQUEST_SECONDS = Histogram(
+    'dashboard_request_seconds', 'Wall time of each HTTP request',
+    ['route'], buckets=LATENCY_BUCKETS)
+RESPONSE_BYTES = Histogram(
+    'dashboard_response_bytes', 'Response body size',
+    ['route', 'encoding'], buckets=SIZE_BUCKETS)
+RESPONSE_RAW_BYTES = Histogram(
+    'dashboard_response_uncompressed_bytes', 'Response body size before compression',
+    ['route'], buckets=SIZE_BUCKETS)
+CACHE_LOOKUPS = Counter(
+    'dashboard_cache_lookups_total', 'Scenario/figure cache lookups',
+    ['cache', 'result'])
+COALESCED = Counter(
+    'dashboard_coalesced_requests_total',
+    'Cache misses that waited for an identical computation already in flight instead of repeating it',
+    ['cache'])
+PREFETCH_JOBS = Counter(
+    'dashboard_prefetch_jobs_total', 'Neighbouring slider positions handled by the background prefetcher',
+    ['result'])
+DATA_RELOADS = Counter(
+    'dashboard_data_reloads_total', 'Reloads of the district data file after it changed on disk',
+    ['result'])
+
+
+@contextlib.contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+def callback_done():
+    """Mark the end of the callback body; the rest of the request counts as serialization."""
+    if flask.has_request_context():
+        flask.g.callback_done = time.perf_counter()
+
+
+def cache_lookup(cache):
+    hit = CACHE_LOOKUPS.labels(cache, 'hit')
+    miss = CACHE_LOOKUPS.labels(cache, 'miss')
+
+    def on_lookup(is_hit):
+        (hit if is_hit else miss).inc()
+    return on_lookup
+
+
+def coalesced(cache):
+    counter = COALESCED.labels(cache)
+    return counter.inc
+
+
+def prefetch_job(result):
+    PREFETCH_JOBS.labels(result).inc()
+
+
+def data_reload(result):
+    DATA_RELOADS.labels(result).inc()
+
+
+def _registry():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def init_app(server):
+    """Register /metrics and the request hooks.
+
+    Call before compression.init_app so the after_request hook here runs
+    after flask-compress and sees the bytes actually sent.
+    """
+    @server.before_request
+    def _start_timer():
+        flask.g.request_start = time.perf_counter()
+
+    @server.after_request
+    def _observe(response):
+        end = time.perf_counter()
+        rule = flask.request.url_rule
+        route = rule.rule if rule is not None else 'unmatched'
+        start = flask.g.pop('request_start', None)
+        if start is not None:
+            REQUEST_SECONDS.labels(route).observe(end - start)
+        callback_end = flask.g.pop('callback_done', None)
+        if callback_end is not None:
+            PHASE_SECONDS.labels('serialize').observe(end - callback_end)
+        if not response.direct_passthrough:
+            RESPONSE_BYTES.labels(route, response.headers.get('Content-Encoding', 'identity')).observe(
+                response.calculate_content_length() or 0)
+            raw = response.headers.get('X-Uncompressed-Length')
+            if raw is not None:
+                RESPONSE_RAW_BYTES.labels(route).observe(int(raw))
+        return response
+
+    @server.route('/metrics')
+    def _metrics():
+        return flask.Response(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
+
+    return server
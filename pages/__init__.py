@@ -0,0 +1,93 @@
+import collections
+import importlib
+
+from dash import dcc, html, no_update
+from dash.dependencies import Input, Output, State
+
+#-----------------------------------------------------------------------
+#PAGES (IMPORTED ON FIRST VISIT)
+#-----------------------------------------------------------------------
+# Every page but the main one is a module in this package with
+#
+#   layout(context)              the page's components
+#   <callback>(context, *values) one function per entry of Page.callbacks
+#
+# Dash must know every callback when the browser loads _dash-dependencies,
+# before any page is visited, so the ids a page's callbacks connect are
+# declared here; the module itself, and whatever it imports, is only
+# imported by the first request that shows the page or runs one of its
+# callbacks. Adding a page adds a few tuples to the main app, not a module.
+
+# name       link text
+# module     imported on first use
+# callbacks  (function name, outputs, inputs); all prevent_initial_call,
+#            a page's layout() carries its initial values
+Page = collections.namedtuple('Page', ['name', 'module', 'callbacks'])
+
+# what a page may use from the main app
+# data      () -> dashboard.DataState being served; call it once per use
+#           and keep the result, it is replaced when the data file changes
+# catalog   cost_engine.FuelCatalog
+# defaults  normalized default slider tuple (ct, payback, elec, interest)
+Context = collections.namedtuple('Context', ['data', 'catalog', 'defaults'])
+
+PAGES = {
+    '/typologies': Page('Efficiency', 'pages.typologies', (
+        ('update_graph',
+         Output('typologies-graph', 'figure'),
+         [Input('typologies-ct-slider', 'value'),
+          Input('typologies-payback-slider', 'value'),
+          Input('boiler-eff-slider', 'value'),
+          Input('building-eff-slider', 'value'),
+          Input('boiler-eff-cost', 'value'),
+          Input('building-eff-cost', 'value')]),
+    )),
+}
+
+
+def load(path):
+    """The module of the page at path (imported once, thread-safe)."""
+    return importlib.import_module(PAGES[path].module)
+
+
+def links(style=None):
+    """One link to the main page and one to each page."""
+    return ([dcc.Link('District', href='/', style=style)] +
+            [dcc.Link(page.name, href=path, style=style) for path, page in PAGES.items()])
+
+
+def routing(location='url', shown='page-shown'):
+    """Components init_app routes on: the URL and the path the page shows."""
+    # the layout is served with the main page in it, whatever the URL
+    return [dcc.Location(id=location, refresh=False), dcc.Store(id=shown, data='/')]
+
+
+def _lazy(path, name, context):
+    def callback(*values):
+        return getattr(load(path), name)(context, *values)
+    callback.__name__ = f'{PAGES[path].module.rsplit(".", 1)[-1]}_{name}'
+    return callback
+
+
+def init_app(app, home, context, location='url', shown='page-shown', container='page-content'):
+    """Show home() or a page's layout in container as the URL changes and
+    register every page's callbacks. app needs suppress_callback_exceptions:
+    a page's ids are not in the initial layout."""
+
+    @app.callback([Output(container, 'children'), Output(shown, 'data')],
+                  [Input(location, 'pathname')],
+                  [State(shown, 'data')])
+    def route(pathname, current):
+        pathname = pathname or '/'
+        if pathname == current:
+            return no_update, no_update
+        if pathname in PAGES:
+            return load(pathname).layout(context), pathname
+        if pathname == '/':
+            return home(), pathname
+        return html.H5('Page not found', style={'text-align': 'center'}), pathname
+
+    for path, page in PAGES.items():
+        for name, outputs, inputs in page.callbacks:
+            app.callback(outputs, inputs, prevent_initial_call=True)(_lazy(path, name, context))
+    return app
@@ -1,28 +1,53 @@
-import pandas as pd
-from plotly.subplots import make_subplots
-import plotly.graph_objects as go
-import dash
-import dash_core_components as dcc
-import dash_html_components as html
-from amortization.amount import calculate_amortization_amount
-import plotly.io as pio
+import cost_engine
+from dash import dcc, html
+import figures
+import scenario_cache
 
-def create_layout(app):
-    pio.renderers.default = "browser"  # fixes graphics loading issue
-    app.css.config.serve_locally = True  # loads .css file in assets folder
-    app.scripts.config.serve_locally = True
-    return html.Div([
-        html.H2('Toronto 2030 District',
-                style={
-                    #'font-color': 'rgb(255,255,255)',
-                    'padding-top': '10px',
-                    'text-align': 'center',
-                    'padding-bottom': '0px',
-                    #'background-color': 'rgb(52,58,64)',
-                    'margin': '10px'
-                }
-                ),
+#-----------------------------------------------------------------------
+#TYPOLOGIES PAGE (EFFICIENCY)
+#-----------------------------------------------------------------------
+# The district chart with boiler and building efficiency settings. They
+# only change the inputs of the cost engine (fuel use, mechanical capital),
+# so the page reuses the main chart's pieces: evaluate_scenario for the
+# costs, build_patch on a copy of graph_output's skeleton for the figure,
+# and scenario_cache.figures (with its shared tier) under its own keys.
+# Imported on first visit, see pages/__init__.py.
+#
+#   boiler_eff     % of a combustion fuel's energy that becomes heat
+#   building_eff   % less heating energy than the average building
+#   boiler_cost    % change of the combustion fuels' mechanical capital
+#   building_cost  $/sf of efficiency upgrades, amortized like the rest of the capital
+
+DEFAULT_EFFICIENCY = (100, 0, 0.0, 0.0)   # boiler_eff, building_eff, boiler_cost, building_cost
+
+
+def normalize_efficiency(boiler_eff, building_eff, boiler_cost, building_cost):
+    """The page's controls as a hashable key; an emptied input counts as 0."""
+    return (int(round(float(boiler_eff or 100))),
+            int(round(float(building_eff or 0))),
+            round(max(float(boiler_cost or 0), -99.0), 1),
+            round(max(float(building_cost or 0), 0.0), 2))
 
+
+def efficiency_inputs(inputs, catalog, boiler_eff, building_eff, boiler_cost, building_cost):
+    """(inputs, catalog) with the efficiency settings applied."""
+    if (boiler_eff, building_eff, boiler_cost, building_cost) == DEFAULT_EFFICIENCY:
+        return inputs, catalog
+    # fuels with elec_share 0 are burnt; the boiler setting scales their cop
+    catalog = cost_engine.FuelCatalog([f._replace(cop=f.cop * boiler_eff / 100) if f.elec_share == 0 else f
+                                       for f in catalog.values()])
+    combustion = catalog.column('elec_share', inputs.fuels) == 0
+    mech_cost = (inputs.mech_cost * (1 + combustion * boiler_cost / 100)
+                 + building_cost * inputs.typology_sf[:, None])
+    inputs = cost_engine.make_inputs(inputs.typology_name, inputs.typology_occupany, inputs.typology_sf,
+                                     inputs.base_fuel_cost / (1 + building_eff / 100),
+                                     mech_cost, inputs.elec_cost, inputs.fuels)
+    return inputs, catalog
+
+
+def layout(context):
+    ct, payback, elec, interest = context.defaults
+    return html.Div([
         html.H5('Yearly Space Heating Cost per Square Foot in Toronto District by Fuel and Building Type',
                 style={
                     'padding-top': '0px',
@@ -39,8 +64,9 @@ def create_layout(app):
                 'margin-left': 'auto',
                 'margin-right': 'auto'
             },
-            id='graph_output',
-            figure={}
+            id='typologies-graph',
+            # the efficiency defaults leave the inputs as they are
+            figure=context.data().skeleton
         ),
         # -----------------------------------------------------------------------
         # CSS - CARBON TAX SLIDER
@@ -63,12 +89,12 @@ def create_layout(app):
                         }
                         ),
                 dcc.Slider(
-                    id='ct-slider',
+                    id='typologies-ct-slider',
                     updatemode='mouseup',
                     min=30,
                     max=340,
                     step=10,
-                    value=30,
+                    value=ct,
                     marks={
                         30: '30$/ton (current)',
                         170: '170$/ton (projected)',
@@ -99,14 +125,14 @@ def create_layout(app):
                         }
                         ),
                 dcc.Slider(
-                    id='payback-slider',
+                    id='typologies-payback-slider',
                     updatemode='mouseup',
-                    min=0,
+                    min=1,
                     max=40,
                     step=1,
-                    value=20,
+                    value=payback,
                     marks={
-                        0: '0 years',
+                        1: '1 year',
                         10: '10 years',
                         20: '20 years',
                         30: '30 years',
@@ -249,7 +275,7 @@ def create_layout(app):
                         min='-99',
                         placeholder='enter % change',
                         type='number',
-                        value='0'
+                        value=0
                     )
                     ])
             ]
@@ -299,7 +325,7 @@ def create_layout(app):
                         step='0.25',
                         placeholder='enter added $/sf',
                         type='number',
-                        value='0'
+                        value=0
                     )]
                 )
             ]
@@ -307,7 +333,7 @@ def create_layout(app):
         # -----------------------------------------------------------------------
         # CSS - DISCLAIMER
         # -----------------------------------------------------------------------
-        html.P('*a yearly interest rate of 3% is assumed',
+        html.P(f'*a yearly interest rate of {interest}% and electricity at {elec:.2f}$/kWh are assumed',
                style={
                    'font-size': '50%',
                    'padding-top': '20px',
@@ -318,3 +344,17 @@ def create_layout(app):
                }
                )
     ])
+
+
+def update_graph(context, ct_value, payback_value, boiler_eff, building_eff, boiler_cost, building_cost):
+    ct, payback, elec, interest = scenario_cache.normalize_inputs(ct_value, payback_value, *context.defaults[2:])
+    efficiency = normalize_efficiency(boiler_eff, building_eff, boiler_cost, building_cost)
+
+    data = context.data()
+
+    def build():
+        inputs, catalog = efficiency_inputs(data.district, context.catalog, *efficiency)
+        scenario = cost_engine.evaluate_scenario(inputs, ct, payback, interest / 100, elec, catalog)
+        return figures.build_patch(scenario, inputs, catalog)
+    return scenario_cache.figures.get_or_compute((data.version, 'typologies', ct, payback, elec, interest) + efficiency,
+                                                 build)
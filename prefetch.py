@@ -0,0 +1,128 @@
+import collections
+import contextlib
+import os
+import threading
+import time
+
+import scenario_cache
+
+#-----------------------------------------------------------------------
+#SPECULATIVE PREFETCH
+#-----------------------------------------------------------------------
+# The sliders move one step at a time on mouseup, so after serving a
+# slider position the next request is almost always one of its eight
+# neighbours (+-1 step on one slider). After each request the prefetcher
+# queues those neighbours for the client that asked; a new request from the
+# same client replaces whatever of its old neighbourhood is still queued.
+# PREFETCH_WORKERS daemon threads work through the queue, newest client
+# first, only while no foreground request is computing, and sleep after
+# each job so that together they use at most PREFETCH_CPU_SHARE of a core.
+
+PREFETCH_WORKERS = int(os.environ.get('PREFETCH_WORKERS', 1))
+PREFETCH_CPU_SHARE = float(os.environ.get('PREFETCH_CPU_SHARE', 0.25))
+PREFETCH_CLIENTS = int(os.environ.get('PREFETCH_CLIENTS', 64))   # queued neighbourhoods kept at most
+
+
+def neighbours(key):
+    """Normalized keys one slider step away from key, inside the slider ranges."""
+    out = []
+    for i, (name, (low, high)) in enumerate(scenario_cache.SLIDER_RANGES.items()):
+        step = scenario_cache.SLIDER_STEPS[name]
+        for direction in (1, -1):
+            value = key[i] + direction * step
+            if low - 1e-9 <= value <= high + 1e-9:
+                moved = list(key)
+                moved[i] = value
+                out.append(scenario_cache.normalize_inputs(*moved))
+    return out
+
+
+class Prefetcher:
+    """Bounded background warm-up of likely next keys.
+
+    warm(job) computes and caches one job; is_cached(job) says whether it
+    can be skipped; on_job(result), if set, gets 'computed', 'cached',
+    'cancelled' or 'failed' for every job taken off (or dropped from) the queue.
+    """
+
+    def __init__(self, warm, is_cached, workers=PREFETCH_WORKERS, cpu_share=PREFETCH_CPU_SHARE,
+                 max_clients=PREFETCH_CLIENTS, on_job=None):
+        self.warm = warm
+        self.is_cached = is_cached
+        self.workers = workers
+        self.cpu_share = cpu_share
+        self.max_clients = max_clients
+        self.on_job = on_job
+        self._pending = collections.OrderedDict()   # client -> deque of jobs, newest client last
+        self._foreground = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._pid = None
+
+    def _count(self, result, n=1):
+        if self.on_job is not None:
+            for _ in range(n):
+                self.on_job(result)
+
+    def _start(self):
+        # started on first use and again in a forked child, which inherits no threads
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._threads = [threading.Thread(target=self._run, name=f'prefetch-{k}', daemon=True)
+                         for k in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def schedule(self, client, jobs):
+        """Queue jobs for client, replacing the ones it still had queued."""
+        if self.workers <= 0 or self.cpu_share <= 0:
+            return
+        with self._cond:
+            self._start()
+            stale = self._pending.pop(client, ())
+            self._count('cancelled', len(stale))
+            self._pending[client] = collections.deque(jobs)
+            while len(self._pending) > self.max_clients:
+                _, dropped = self._pending.popitem(last=False)
+                self._count('cancelled', len(dropped))
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def foreground(self):
+        """Mark a foreground computation; prefetch jobs wait until none is running."""
+        with self._cond:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._foreground -= 1
+                self._cond.notify_all()
+
+    def _next(self):
+        with self._cond:
+            while not self._pending or self._foreground:
+                self._cond.wait()
+            client, jobs = next(reversed(self._pending.items()))
+            job = jobs.popleft()
+            if not jobs:
+                del self._pending[client]
+            return job
+
+    def _run(self):
+        while True:
+            job = self._next()
+            if self.is_cached(job):
+                self._count('cached')
+                continue
+            start = time.thread_time()
+            try:
+                self.warm(job)
+                self._count('computed')
+            except Exception:
+                self._count('failed')   # the foreground request will compute (and report) it
+            # duty cycle: busy for b seconds, idle long enough that all workers
+            # together stay under cpu_share of one core
+            busy = time.thread_time() - start
+            time.sleep(busy * (self.workers / self.cpu_share - 1))
@@ -0,0 +1,195 @@
+import collections
+import os
+import threading
+
+#-----------------------------------------------------------------------
+#SCENARIO CACHE
+#-----------------------------------------------------------------------
+# The four sliders only take a finite set of values, and users keep going
+# back to the same few positions, so computed scenarios and finished figures
+# are memoized under the normalized slider tuple, behind the version of the
+# data they were computed from (see dashboard.DataState).
+
+SCENARIO_CACHE_SIZE = int(os.environ.get('SCENARIO_CACHE_SIZE', 4096))
+FIGURE_CACHE_SIZE = int(os.environ.get('FIGURE_CACHE_SIZE', 512))
+BANDS_CACHE_SIZE = int(os.environ.get('BANDS_CACHE_SIZE', 256))
+PROJECTION_CACHE_SIZE = int(os.environ.get('PROJECTION_CACHE_SIZE', 256))
+DEFAULT_INPUTS = (30, 20, 0.16, 5)  # ct, payback, elec, interest slider values on page load
+# (min, max) and step of each slider in dashboard.py, in normalize_inputs order
+SLIDER_RANGES = {
+    'carbon_tax': (30, 340),           # $/ton
+    'amortization_period': (1, 40),    # years
+    'electricity_price': (0.0, 0.30),  # $/kWh
+    'interest_rate': (0.0, 10.0),      # %
+}
+SLIDER_STEPS = {'carbon_tax': 10, 'amortization_period': 1, 'electricity_price': 0.01, 'interest_rate': 0.5}
+
+
+def normalize_inputs(ct_value, payback_value, elec_value, interest_value):
+    """Slider values as a hashable key; snaps float noise to the slider steps."""
+    return (int(round(ct_value)),
+            int(round(payback_value)),
+            round(float(elec_value), 2),
+            round(float(interest_value), 1))
+
+
+class _Flight:
+    """A computation other callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class LRUCache:
+    """Thread-safe bounded LRU mapping with hit/miss/eviction counters.
+
+    on_lookup, if set, is called with True (hit) or False (miss) after every
+    get(); metrics.py uses it to export hit ratios. shared, if set, is a
+    shared_cache.SharedCache that get_or_compute() checks on a local miss
+    and fills after computing.
+
+    get_or_compute() is single-flight: concurrent misses on the same key wait
+    for the first caller's computation instead of repeating it, and
+    on_coalesce (if set) is called once for every such waiting caller.
+    """
+
+    def __init__(self, maxsize, on_lookup=None, shared=None, on_coalesce=None):
+        if maxsize < 0:
+            raise ValueError('maxsize must be >= 0')
+        self.maxsize = maxsize
+        self.on_lookup = on_lookup
+        self.shared = shared
+        self.on_coalesce = on_coalesce
+        self.coalesced = 0
+        self._flights = {}   # key -> _Flight of a computation in progress
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                value, hit = default, False
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+                hit = True
+        if self.on_lookup is not None:
+            self.on_lookup(hit)
+        return value
+
+    def put(self, key, value):
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute, keep=None):
+        """Cached value for key, calling compute() and storing it on a miss.
+        If keep(value) is false the value goes to this call and its waiters
+        but is not stored (e.g. a result cut short by a time budget)."""
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+        with self._lock:
+            value = self._data.get(key, missing)   # finished between get() and here
+            if value is not missing:
+                return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            if self.on_coalesce is not None:
+                self.on_coalesce()
+            return flight.wait()
+
+        try:
+            shared = self.shared
+            if shared is not None:
+                value = shared.get(key, missing)
+            if value is missing:
+                value = compute()
+                if keep is not None and not keep(value):
+                    flight.value = value
+                    return value
+                if shared is not None:
+                    shared.put(key, value)
+            self.put(key, value)
+            flight.value = value
+        except BaseException as e:
+            flight.error = e   # waiters see the same failure instead of retrying all at once
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return value
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._data) > maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        """Snapshot of the (key, value) pairs, least recently used first."""
+        with self._lock:
+            return list(self._data.items())
+
+    def invalidate(self, predicate):
+        """Drop every entry whose key satisfies predicate; returns how many."""
+        with self._lock:
+            stale = [key for key in self._data if predicate(key)]
+            for key in stale:
+                del self._data[key]
+        return len(stale)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'coalesced': self.coalesced,
+                'hit_ratio': self.hits / lookups if lookups else 0.0}
+
+
+DEFAULT_KEY = normalize_inputs(*DEFAULT_INPUTS)
+
+scenarios = LRUCache(SCENARIO_CACHE_SIZE)   # (version,) + key -> cost_engine.Scenario
+figures = LRUCache(FIGURE_CACHE_SIZE)       # (version,) + key + ... -> figure dict for graph_output
+bands = LRUCache(BANDS_CACHE_SIZE)          # (version,) + key -> uncertainty.Bands
+projections = LRUCache(PROJECTION_CACHE_SIZE)   # (version, carbon price path, start year) + key -> lifecycle.Projection
@@ -0,0 +1,225 @@
+"""Precomputed scenario cube over every slider position.
+
+    python scenario_cube.py [--data district_data.csv] [--out DIR]
+
+builds the cube offline; the dashboard memory-maps it at startup (and
+builds it itself if it is missing and small enough).
+"""
+import argparse
+import collections
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import annuity
+import cost_engine
+
+#-----------------------------------------------------------------------
+#SCENARIO CUBE
+#-----------------------------------------------------------------------
+# The sliders span 32 carbon taxes x 40 periods x 31 electricity prices x
+# 21 interest rates. Capital costs only depend on (interest, period) and
+# fuel costs only on (carbon tax, electricity), so the stacked bars of any
+# slider position are two table lookups. Only the cheapest fuel of every
+# slider position is stored over the whole grid, per typology and for the
+# district average, which is what the winning-fuel heatmap reads; the
+# totals it is picked from are computed one carbon tax at a time and not
+# kept (at 30 bars x 29 fuels they would be ~725 MB, the cheapest index ~25 MB).
+
+CT_VALUES = np.arange(30, 341, 10)
+PAYBACK_VALUES = annuity.PERIODS
+ELEC_VALUES = np.round(np.arange(0, 31) / 100, 2)
+INTEREST_VALUES = np.round(annuity.RATES * 100, 1)
+GRID_SHAPE = (len(CT_VALUES), len(PAYBACK_VALUES), len(ELEC_VALUES), len(INTEREST_VALUES))
+CUBE_MAX_BYTES = int(os.environ.get('CUBE_MAX_BYTES', 256 * 2**20))
+CUBE_FORMAT = 2
+
+# capital   (2, interest, payback, typology, fuel) mech/elec $/sf
+# fuel      (ct, elec, typology, fuel) fuel $/sf
+# cheapest  (ct, payback, elec, interest, typology) uint8 fuel index
+# cheapest_avg (ct, payback, elec, interest) uint8 fuel index of the lowest avg line
+# path      directory the arrays are mapped from
+ScenarioCube = collections.namedtuple(
+    'ScenarioCube',
+    ['capital', 'fuel', 'cheapest', 'cheapest_avg', 'pgj_rate', 'fuels', 'typology_name', 'path'])
+
+
+def cube_bytes(inputs):
+    """Size of the arrays written for inputs (what CUBE_MAX_BYTES bounds)."""
+    n, f = len(inputs.typology_name), len(inputs.fuels)
+    ct, payback, elec, interest = GRID_SHAPE
+    cheapest = int(np.prod(GRID_SHAPE)) * (n + 1)   # uint8, per typology and for the average
+    tables = (2 * interest * payback + ct * elec) * n * f * 8 + elec * f * 8
+    return cheapest + tables
+
+
+def fingerprint(inputs, catalog, data_version):
+    """Key of everything the cube depends on."""
+    h = hashlib.sha1()
+    h.update(f'{CUBE_FORMAT}:{data_version}:{inputs.typology_name}:{inputs.fuels}'.encode())
+    h.update(repr([tuple(catalog[i]) for i in inputs.fuels]).encode())
+    for a in (inputs.typology_sf, inputs.base_fuel_cost, inputs.mech_cost, inputs.elec_cost):
+        h.update(np.ascontiguousarray(a).tobytes())
+    return h.hexdigest()[:16]
+
+
+def grid_index(key):
+    """Cube coordinates of a normalized slider tuple, or None if off-grid."""
+    ct, payback, elec, interest = key
+    index = (int(np.searchsorted(CT_VALUES, ct)), int(np.searchsorted(PAYBACK_VALUES, payback)),
+             int(round(elec * 100)), int(round(interest * 2)))
+    values = (CT_VALUES, PAYBACK_VALUES, ELEC_VALUES, INTEREST_VALUES)
+    for k, v, x in zip(index, values, key):
+        if not 0 <= k < len(v) or abs(v[k] - x) > 1e-9:
+            return None
+    return index
+
+
+def component_tables(inputs, catalog):
+    """Capital and fuel $/sf tables, with the same arithmetic as cost_engine.compute_costs."""
+    fuels = inputs.fuels
+    capital = inputs.capital_psf[:, None, None] * annuity.TABLE[None, :, :, None, None]
+    ct_rate = catalog.column('ct_rate', fuels)
+    cop = catalog.column('cop', fuels)
+    pgj_rate = np.stack([cost_engine.fuel_pgj_rates(catalog, fuels, e) for e in ELEC_VALUES])
+    ct = CT_VALUES.astype(float)[:, None, None]
+    fuel_rate = (pgj_rate[None, :, :] + ct_rate * (ct - cost_engine.BASE_CT)) / cost_engine.BASE_PGJ_RATE / cop
+    fuel = inputs.base_fuel_cost[None, None, :, None] * fuel_rate[:, :, None, :]
+    return capital, fuel, pgj_rate
+
+
+class _NpyWriter:
+    """A .npy file of dtype and shape written in C order, one leading-axis block at a time."""
+
+    def __init__(self, path, dtype, shape):
+        self.dtype = np.dtype(dtype)
+        self._file = open(path, 'wb')
+        np.lib.format.write_array_header_1_0(
+            self._file, {'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False, 'shape': shape})
+
+    def write(self, block):
+        self._file.write(np.ascontiguousarray(block, dtype=self.dtype))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        with self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+
+def _write(inputs, catalog, target):
+    tmp = tempfile.mkdtemp(prefix='.tmp-', dir=os.path.dirname(target) or '.')
+    try:
+        capital, fuel, pgj_rate = component_tables(inputs, catalog)
+        np.save(os.path.join(tmp, 'capital.npy'), capital)
+        np.save(os.path.join(tmp, 'fuel.npy'), fuel)
+        np.save(os.path.join(tmp, 'pgj_rate.npy'), pgj_rate)
+        n = len(inputs.typology_name)
+        # plain writes and fsync rather than a memory map and its flush: those
+        # hold the GIL, these let a process rebuilding its cube (data reload)
+        # go on serving requests meanwhile
+        with _NpyWriter(os.path.join(tmp, 'cheapest.npy'), np.uint8, GRID_SHAPE + (n,)) as cheapest, \
+                _NpyWriter(os.path.join(tmp, 'cheapest_avg.npy'), np.uint8, GRID_SHAPE) as cheapest_avg:
+            # (interest, payback, n, f) -> (payback, interest, n, f) to match the cube axes
+            mech_elec = (capital[0] + capital[1]).transpose(1, 0, 2, 3)
+            for c in range(len(CT_VALUES)):   # one carbon tax per batch keeps memory flat
+                block = mech_elec[:, None] + fuel[c][None, :, None]   # (payback, elec, interest, n, f)
+                cheapest.write(block.argmin(axis=-1))
+                cheapest_avg.write(block.mean(axis=-2).argmin(axis=-1))
+        with open(os.path.join(tmp, 'meta.json'), 'w') as fh:
+            json.dump({'fuels': list(inputs.fuels), 'typology_name': list(inputs.typology_name)}, fh)
+        os.rename(tmp, target)   # atomic: other workers see all of it or nothing
+    except OSError:
+        if not os.path.isdir(target):
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load_cube(target):
+    with open(os.path.join(target, 'meta.json')) as fh:
+        meta = json.load(fh)
+    arrays = {name: np.load(os.path.join(target, f'{name}.npy'), mmap_mode='r')
+              for name in ('capital', 'fuel', 'cheapest', 'cheapest_avg', 'pgj_rate')}
+    return ScenarioCube(fuels=tuple(meta['fuels']), typology_name=tuple(meta['typology_name']), path=target,
+                        **arrays)
+
+
+def open_or_build(inputs, catalog, data_version, cache_dir, build=True, max_bytes=CUBE_MAX_BYTES):
+    """The cube for inputs, building it if allowed; None if it is too big or missing."""
+    target = os.path.join(cache_dir, f'cube-{fingerprint(inputs, catalog, data_version)}')
+    if not os.path.isdir(target):
+        if not build or cube_bytes(inputs) > max_bytes:
+            return None
+        os.makedirs(cache_dir, exist_ok=True)
+        # one process builds it, the others (workers reloading the same
+        # file at once) wait for its rename instead of building it again
+        with open(target + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.isdir(target):
+                _write(inputs, catalog, target)
+    return load_cube(target)
+
+
+def discard(cube):
+    """Delete the files of a cube that is no longer served. Processes that
+    still map it keep reading their mapping until they let go of it."""
+    shutil.rmtree(cube.path, ignore_errors=True)
+    try:
+        os.remove(cube.path + '.lock')
+    except FileNotFoundError:
+        pass
+
+
+def scenario(cube, key):
+    """cost_engine.Scenario of a normalized slider tuple read from the cube, or None if off-grid."""
+    index = grid_index(key)
+    if index is None:
+        return None
+    c, p, e, r = index
+    mech, elec = np.asarray(cube.capital[0, r, p]), np.asarray(cube.capital[1, r, p])
+    fuel = np.asarray(cube.fuel[c, e])
+    costs = cost_engine.CostResult(mech=mech, elec=elec, fuel=fuel, total=mech + elec + fuel)
+    return cost_engine.Scenario(ct=key[0], int_period=key[1], int_rate=key[3] / 100, elec_value=key[2],
+                                pgj_rate=np.asarray(cube.pgj_rate[e]), costs=costs)
+
+
+def winning_fuel(cube, payback, interest, typology=None):
+    """(ct, elec) matrix of the cheapest fuel index at one payback/interest
+    position, for one typology row or (typology=None) the district average."""
+    index = grid_index((CT_VALUES[0], payback, ELEC_VALUES[0], interest))
+    if index is None:
+        raise ValueError(f'payback={payback}, interest={interest} is not a slider position')
+    _, p, _, r = index
+    if typology is None:
+        return np.asarray(cube.cheapest_avg[:, p, :, r])
+    return np.asarray(cube.cheapest[:, p, :, r, typology])
+
+
+def main(argv=None):
+    import aggregation
+    import data_loader
+
+    parser = argparse.ArgumentParser(description='Build the scenario cube for a district data file.')
+    parser.add_argument('--data', default=os.environ.get('DISTRICT_DATA', 'district_data.csv'))
+    parser.add_argument('--out', default=data_loader.CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    district_data = data_loader.load_district(args.data)
+    typologies = cost_engine.load_inputs(district_data.typologies, cost_engine.FUEL_CATALOG)
+    # same bars as the dashboard plots
+    inputs = aggregation.group_inputs(typologies, aggregation.chart_grouping(typologies))
+    cube = open_or_build(inputs, cost_engine.FUEL_CATALOG, district_data.version, args.out,
+                         max_bytes=float('inf'))
+    print(f'{cube.cheapest.shape} -> {cube.path} ({cube_bytes(inputs) / 2**20:.1f} MB)')
+
+
+if __name__ == '__main__':
+    main()
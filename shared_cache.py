@@ -0,0 +1,211 @@
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import stat
+import threading
+import time
+
+import numpy as np
+import orjson
+
+import cost_engine
+import data_loader
+
+#-----------------------------------------------------------------------
+#SHARED CACHE (ALL WORKERS ON A HOST)
+#-----------------------------------------------------------------------
+# A second tier behind the per-process LRUCaches in scenario_cache.py: a
+# SQLite file in WAL mode that every gunicorn worker on the host opens, so
+# a scenario computed by one worker is a read for all the others. Entries
+# are keyed by a hash of the cache name, the data version and the
+# normalized slider tuple; each write is one transaction, so readers see a
+# whole entry or none. Past SHARED_CACHE_MAX_BYTES the least recently read
+# entries are evicted. Set SHARED_CACHE_PATH= (empty) to turn it off.
+#
+# Whoever can write the file decides what every worker serves, so it lives
+# in a directory only this user can enter (made with mode 0700), and a file
+# or directory another user owns or may write turns the tier off. Values
+# are stored as npz arrays and JSON, never pickles, so a planted file can
+# at worst hold wrong numbers.
+
+SHARED_CACHE_PATH = os.environ.get('SHARED_CACHE_PATH', os.path.join(data_loader.CACHE_DIR, 'shared', 'cache.sqlite'))
+SHARED_CACHE_MAX_BYTES = int(os.environ.get('SHARED_CACHE_MAX_BYTES', 256 * 2**20))
+SHARED_FORMAT = 2        # bump when what the caches hold changes shape
+TOUCH_INTERVAL = 30      # seconds between last_read updates of one entry
+EVICT_TO = 0.9           # evict down to this share of the budget
+
+log = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_read REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_read ON entries (last_read);
+'''
+
+
+def content_key(name, version, key):
+    return hashlib.sha256(repr((SHARED_FORMAT, name, version, key)).encode()).hexdigest()
+
+
+class SharedStore:
+    """Size-bounded key -> bytes store in one SQLite file, safe across threads,
+    processes and fork (connections are per thread and per pid)."""
+
+    def __init__(self, path, max_bytes=SHARED_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')   # a lost cache entry after a power cut is fine
+            conn.executescript(SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute('SELECT value, last_read FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > TOUCH_INTERVAL:   # keeps popular entries off the eviction end without a write per read
+            conn.execute('UPDATE entries SET last_read = ? WHERE key = ?', (now, key))
+        return row[0]
+
+    def put(self, key, value):
+        conn = self._connection()
+        with conn:   # one transaction: the entry and the eviction it causes land together
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('INSERT OR REPLACE INTO entries (key, value, size, last_read) VALUES (?, ?, ?, ?)',
+                         (key, value, len(value), time.time()))
+            total, = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()
+            if total > self.max_bytes:
+                overflow = total - int(self.max_bytes * EVICT_TO)
+                conn.execute('''
+                    DELETE FROM entries WHERE key IN (
+                        SELECT key FROM (
+                            SELECT key, SUM(size) OVER (ORDER BY last_read, key) - size AS before
+                            FROM entries)
+                        WHERE before < ?)''', (overflow,))
+
+    def close(self):
+        """Close this thread's connection, e.g. in a process about to fork."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    def clear(self):
+        self._connection().execute('DELETE FROM entries')
+
+    def stats(self):
+        count, size = self._connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return {'entries': count, 'bytes': size, 'max_bytes': self.max_bytes}
+
+
+class SharedCache:
+    """One named cache in a SharedStore; values go through encode/decode."""
+
+    def __init__(self, store, name, encode, decode, version='', on_lookup=None):
+        self.store = store
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+        self.version = version
+        self.on_lookup = on_lookup
+
+    def get(self, key, default=None):
+        try:
+            raw = self.store.get(content_key(self.name, self.version, key))
+        except sqlite3.Error:
+            raw = None   # the shared tier is an optimization, never a failure
+        if self.on_lookup is not None:
+            self.on_lookup(raw is not None)
+        return default if raw is None else self.decode(raw)
+
+    def put(self, key, value):
+        try:
+            self.store.put(content_key(self.name, self.version, key), self.encode(value))
+        except sqlite3.Error:
+            pass
+
+
+def _scenario_npz(scenario):
+    arrays = {name: getattr(scenario, name) for name in cost_engine.Scenario._fields if name != 'costs'}
+    arrays.update({'costs_' + name: part for name, part in scenario.costs._asdict().items()})
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def _scenario_from_npz(raw):
+    with np.load(io.BytesIO(raw), allow_pickle=False) as arrays:
+        costs = cost_engine.CostResult(**{name: arrays['costs_' + name] for name in cost_engine.CostResult._fields})
+        fields = {name: arrays[name] for name in cost_engine.Scenario._fields if name != 'costs'}
+    for name in ('ct', 'int_period', 'int_rate', 'elec_value'):
+        fields[name] = fields[name].item()   # back to the Python scalars the slider tuple holds
+    return cost_engine.Scenario(costs=costs, **fields)
+
+
+def _patch_json(patch):
+    # the plotly-json form of a dash.Patch, which Dash sends exactly like the Patch itself
+    return orjson.dumps(patch.to_plotly_json() if hasattr(patch, 'to_plotly_json') else patch,
+                        option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _private(path):
+    """Make path's directory (0700) if missing; False if it or the file at
+    path is owned or writable by another user."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    uid = os.getuid()
+    info = os.stat(directory)
+    # in a sticky directory such as /tmp others cannot replace our files
+    if not info.st_mode & stat.S_ISVTX and (info.st_uid != uid or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+        return False
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            info = os.lstat(path + suffix)
+        except FileNotFoundError:
+            continue
+        if not stat.S_ISREG(info.st_mode) or info.st_uid != uid or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            return False
+    return True
+
+
+def open_store(path=SHARED_CACHE_PATH):
+    """SharedStore at path, or None if it is turned off or not private."""
+    if not path:
+        return None
+    if not _private(path):
+        log.warning('shared cache %s is owned or writable by another user; shared tier turned off', path)
+        return None
+    return SharedStore(path)
+
+
+store = open_store()
+
+
+def scenario_cache(version, on_lookup=None):
+    """Shared tier for cost_engine.Scenario values (npz arrays)."""
+    if store is None:
+        return None
+    return SharedCache(store, 'scenarios', _scenario_npz, _scenario_from_npz, version, on_lookup)
+
+
+def figure_cache(version, on_lookup=None):
+    """Shared tier for graph_output patches."""
+    if store is None:
+        return None
+    return SharedCache(store, 'figures', _patch_json, orjson.loads, version, on_lookup)
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# importing dashboard in a test should not build the scenario cube, write to
+# the host-wide shared cache or poll the data file; set before any import
+os.environ.setdefault('BUILD_SCENARIO_CUBE', '0')
+os.environ.setdefault('SHARED_CACHE_PATH', '')
+os.environ.setdefault('DATA_POLL_INTERVAL', '0')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
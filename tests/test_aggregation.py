@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import aggregation
+import cost_engine
+
+FUELS = list(cost_engine.FUEL_CATALOG)
+OCCUPANCIES = ('Office', 'Retail', 'Residential', 'Institutional')
+
+
+def _district(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return cost_engine.make_inputs(
+        [f'T{k}' for k in range(n)], [OCCUPANCIES[k % len(OCCUPANCIES)] for k in range(n)],
+        rng.uniform(1e3, 3e5, n), rng.uniform(0.5, 5, n),
+        rng.uniform(0, 1e7, (n, len(FUELS))), rng.uniform(0, 5e5, (n, len(FUELS))), FUELS)
+
+
+def _default(inputs):
+    return cost_engine.evaluate_scenario(inputs, 30, 20, 0.05, 0.16)
+
+
+def _check_members(grouping, n):
+    rows = np.concatenate([aggregation.members(grouping, label) for label in grouping.labels])
+    assert np.array_equal(np.sort(rows), np.arange(n))   # every row, exactly once
+
+
+@pytest.mark.parametrize('n', [aggregation.MAX_BARS + 1, 2000, aggregation.OCCUPANCY_ROWS])
+def test_top_n_keeps_the_costliest_rows(n):
+    inputs = _district(n)
+    scenario = _default(inputs)
+    grouping = aggregation.choose_grouping(inputs, scenario)
+    assert grouping.mode == 'top_n'
+    assert len(grouping.labels) == aggregation.MAX_BARS
+    assert grouping.labels[-1] == aggregation.OTHER
+    mean = scenario.costs.total.mean(axis=1)
+    kept = [inputs.typology_name.index(label) for label in grouping.labels[:-1]]
+    assert mean[kept].min() >= np.delete(mean, kept).max()
+    _check_members(grouping, n)
+
+
+def test_occupancy_past_occupancy_rows():
+    n = aggregation.OCCUPANCY_ROWS + 1
+    inputs = _district(n)
+    grouping = aggregation.choose_grouping(inputs, _default(inputs))
+    assert grouping.mode == 'occupancy'
+    assert grouping.labels == OCCUPANCIES
+    _check_members(grouping, n)
+
+
+def test_small_district_is_not_grouped():
+    inputs = _district(aggregation.MAX_BARS)
+    grouping = aggregation.choose_grouping(inputs, _default(inputs))
+    assert grouping.mode == 'typology'
+    assert aggregation.group_inputs(inputs, grouping) is inputs
+    _check_members(grouping, aggregation.MAX_BARS)
+
+
+@pytest.mark.parametrize('n', [500, aggregation.OCCUPANCY_ROWS + 1])
+def test_buckets_are_floor_area_weighted(n):
+    inputs = _district(n)
+    grouping = aggregation.choose_grouping(inputs, _default(inputs))
+    bars = _default(aggregation.group_inputs(inputs, grouping)).costs.total
+    rows = _default(inputs).costs.total
+    for b, label in enumerate(grouping.labels):
+        rows_in = aggregation.members(grouping, label)
+        weights = inputs.typology_sf[rows_in]
+        np.testing.assert_allclose(bars[b], weights @ rows[rows_in] / weights.sum(), rtol=1e-9)
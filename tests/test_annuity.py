@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from amortization.amount import calculate_amortization_amount
+
+import annuity
+
+
+@pytest.mark.parametrize('rate', annuity.RATES[1:])
+def test_factor_matches_amortization(rate):
+    for period in annuity.PERIODS:
+        expected = calculate_amortization_amount(1.0, rate, period)
+        assert annuity.factor(rate, period) == pytest.approx(expected, rel=1e-12)
+
+
+def test_table_lookup_is_the_closed_form():
+    for i, rate in enumerate(annuity.RATES):
+        for j, period in enumerate(annuity.PERIODS):
+            assert annuity.factor(rate, period) == annuity.TABLE[i, j]
+            assert annuity.TABLE[i, j] == pytest.approx(float(annuity.annuity_factor(rate, period)), rel=1e-15)
+
+
+def test_zero_interest_is_straight_line():
+    # amortization divides by zero here; the dashboard repays 1/n a year
+    with pytest.raises(ZeroDivisionError):
+        calculate_amortization_amount(1.0, 0.0, 10)
+    assert np.array_equal(annuity.TABLE[0], 1 / annuity.PERIODS)
+    assert annuity.factor(0.0, 10) == 0.1
+    assert annuity.factor(0.0, 2.5) == 0.4   # off-grid, same limit
+
+
+def test_off_grid_uses_the_closed_form():
+    assert annuity.factor(0.0525, 20) == pytest.approx(calculate_amortization_amount(1.0, 0.0525, 20), rel=1e-12)
+    assert annuity.factor(0.05, 41) == pytest.approx(calculate_amortization_amount(1.0, 0.05, 41), rel=1e-12)
+
+
+def test_table_is_read_only():
+    with pytest.raises(ValueError):
+        annuity.TABLE[0, 0] = 1.0
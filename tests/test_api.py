@@ -0,0 +1,91 @@
+import gzip
+import json
+import os
+
+import brotli
+import flask
+import numpy as np
+import pytest
+
+import api
+import cost_engine
+
+DISTRICT_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'district_data.csv')
+
+SCENARIOS = [
+    {'carbon_tax': 170, 'amortization_period': 20, 'interest_rate': 5, 'electricity_price': 0.16},
+    {'carbon_tax': 30, 'amortization_period': 1, 'interest_rate': 0, 'electricity_price': 0.0},
+    {'carbon_tax': 340, 'amortization_period': 40, 'interest_rate': 10, 'electricity_price': 0.3,
+     'fuels': {'gh': {'pgj_rate': 45}}},
+]
+
+
+@pytest.fixture(scope='module')
+def inputs():
+    return cost_engine.read_inputs(DISTRICT_CSV)
+
+
+@pytest.fixture(scope='module')
+def client(inputs):
+    return api.init_app(flask.Flask(__name__), lambda: inputs).test_client()
+
+
+def _expected(inputs, scenario):
+    catalog = cost_engine.FUEL_CATALOG
+    pgj_rate = cost_engine.fuel_pgj_rates(catalog, inputs.fuels, scenario['electricity_price'])
+    for fuel, parameters in scenario.get('fuels', {}).items():
+        pgj_rate[inputs.fuels.index(fuel)] = parameters['pgj_rate']
+    return cost_engine.compute_costs(inputs, pgj_rate, catalog.column('ct_rate', inputs.fuels),
+                                     catalog.column('cop', inputs.fuels), scenario['carbon_tax'],
+                                     scenario['interest_rate'] / 100, scenario['amortization_period'])
+
+
+def _check(body, inputs):
+    assert body['typologies'] == list(inputs.typology_name)
+    assert body['fuels'] == list(inputs.fuels)
+    assert len(body['results']) == len(SCENARIOS)
+    for result, scenario in zip(body['results'], SCENARIOS):
+        assert result['scenario'] == {'fuels': {}, **scenario}
+        expected = _expected(inputs, scenario)
+        for component in api.COMPONENTS:
+            np.testing.assert_allclose(result[component], getattr(expected, component), rtol=1e-12)
+
+
+def test_batch_matches_the_engine(client, inputs):
+    response = client.post('/api/scenarios', json={'scenarios': SCENARIOS})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+    _check(json.loads(response.get_data()), inputs)
+
+
+@pytest.mark.parametrize('encoding, decompress', [('br', brotli.decompress), ('gzip', gzip.decompress)])
+def test_streamed_body_is_compressed(client, inputs, encoding, decompress):
+    response = client.post('/api/scenarios', json={'scenarios': SCENARIOS}, headers={'Accept-Encoding': encoding})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == encoding
+    _check(json.loads(decompress(response.get_data())), inputs)
+
+
+def test_chunks_join_into_one_document(inputs):
+    echo, parameters = api.parse_batch({'scenarios': SCENARIOS}, inputs)
+    pieces = list(api.response_body(inputs, echo, parameters, chunk=2))
+    assert len(pieces) == 4   # head, two chunks, tail
+    _check(json.loads(b''.join(pieces)), inputs)
+
+
+@pytest.mark.parametrize('change', [{'carbon_tax': 341}, {'interest_rate': -0.5}, {'electricity_price': 'high'},
+                                    {'amortization_period': 2.5}, {'fuels': {'xx': {'cop': 2}}},
+                                    {'fuels': {'ashp': {'cop': 0}}}])
+def test_out_of_range_is_rejected(client, change):
+    scenarios = [SCENARIOS[0], {**SCENARIOS[0], **change}]
+    response = client.post('/api/scenarios', json={'scenarios': scenarios})
+    assert response.status_code == 400
+    assert response.get_json()['index'] == 1
+
+
+def test_oversized_batch_is_rejected(client, inputs, monkeypatch):
+    response = client.post('/api/scenarios', json={'scenarios': [SCENARIOS[0]] * (api.API_MAX_SCENARIOS + 1)})
+    assert response.status_code == 413
+    monkeypatch.setattr(api, 'API_MAX_CELLS', 2 * len(inputs.typology_name) * len(inputs.fuels) - 1)
+    response = client.post('/api/scenarios', json={'scenarios': SCENARIOS[:2]})
+    assert response.status_code == 413
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+import breakeven
+import cost_engine
+
+DISTRICT_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'district_data.csv')
+
+# (carbon tax, payback, electricity, interest) slider positions
+SLIDERS = [(170, 20, 0.16, 5), (30, 5, 0.05, 0), (340, 40, 0.30, 10)]
+
+
+@pytest.fixture(scope='module')
+def inputs():
+    return cost_engine.read_inputs(DISTRICT_CSV)
+
+
+def _totals(inputs, ct, payback, elec, interest):
+    return cost_engine.evaluate_scenario(inputs, ct, payback, interest / 100, elec).costs.total
+
+
+def _pairs(inputs, table, column):
+    for row in table[table[column].notna()].itertuples():
+        yield (inputs.typology_name.index(row.typology_name), inputs.fuels.index(row.fuel_a),
+               inputs.fuels.index(row.fuel_b), getattr(row, column), row)
+
+
+@pytest.mark.parametrize('sliders', SLIDERS)
+def test_pair_costs_the_same_at_the_breakeven_carbon_tax(inputs, sliders):
+    ct, payback, elec, interest = sliders
+    table = breakeven.breakeven_table(inputs, ct, elec, interest / 100, payback)
+    checked = 0
+    for t, a, b, ct_star, row in _pairs(inputs, table, 'carbon_tax'):
+        total = _totals(inputs, ct_star, payback, elec, interest)[t]
+        assert total[a] == pytest.approx(total[b], rel=1e-9)
+        above = _totals(inputs, ct_star + 10, payback, elec, interest)[t]
+        winner = inputs.fuels.index(row.cheaper_above_ct)
+        assert above[winner] < above[a + b - winner]
+        checked += 1
+    assert checked
+
+
+@pytest.mark.parametrize('sliders', SLIDERS)
+def test_pair_costs_the_same_at_the_breakeven_electricity_price(inputs, sliders):
+    ct, payback, elec, interest = sliders
+    table = breakeven.breakeven_table(inputs, ct, elec, interest / 100, payback)
+    checked = 0
+    for t, a, b, elec_star, row in _pairs(inputs, table, 'elec_price'):
+        total = _totals(inputs, ct, payback, elec_star, interest)[t]
+        assert total[a] == pytest.approx(total[b], rel=1e-9)
+        above = _totals(inputs, ct, payback, elec_star + 0.01, interest)[t]
+        winner = inputs.fuels.index(row.cheaper_above_elec)
+        assert above[winner] < above[a + b - winner]
+        checked += 1
+    assert checked
+
+
+def test_unreachable_breakevens_are_not_reported(inputs):
+    ct_star = breakeven.carbon_tax_breakeven(inputs, 0.16, 1 / 20)
+    table = breakeven.breakeven_table(inputs, 170, 0.16, 0.0, 20)
+    assert (ct_star < 0).any()                  # the district has pairs that only cross at a negative tax
+    assert not (table['carbon_tax'] < 0).any()
+    assert not (table['elec_price'] < 0).any()
+    # the fuel that wins above the unreachable break-even wins at every tax
+    row = table[table['carbon_tax'].isna() & table['cheaper_above_ct'].notna()].iloc[0]
+    t, a, b = (inputs.typology_name.index(row.typology_name), inputs.fuels.index(row.fuel_a),
+               inputs.fuels.index(row.fuel_b))
+    winner = inputs.fuels.index(row.cheaper_above_ct)
+    for ct in (0, 30, 340):
+        total = _totals(inputs, ct, 20, 0.16, 0)[t]
+        assert total[winner] < total[a + b - winner]
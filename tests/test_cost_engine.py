@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from amortization.amount import calculate_amortization_amount
+
+import cost_engine
+
+DISTRICT_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'district_data.csv')
+
+# the fuel values dictionary of the original dashboard.py, before fuels.csv
+FV = {'ng':   {'pgj_rate': 9,    'ct_rate': 0.061, 'cop': 1.0},
+      'bh':   {'pgj_rate': 18,   'ct_rate': 0.007, 'cop': 1.0},
+      'gh':   {'pgj_rate': 60,   'ct_rate': 0.028, 'cop': 1.0},
+      'er':   {'pgj_rate': 44,   'ct_rate': 0.028, 'cop': 1.0},
+      'ashp': {'pgj_rate': 44,   'ct_rate': 0.028, 'cop': 2.8},
+      'gshp': {'pgj_rate': 44,   'ct_rate': 0.028, 'cop': 3.1},
+      'hyb':  {'pgj_rate': 52.7, 'ct_rate': 0.028, 'cop': 2.8}}
+
+# (carbon tax, payback, electricity, interest) slider positions
+SLIDERS = [(30, 20, 0.16, 5), (170, 1, 0.0, 0.5), (340, 40, 0.30, 10), (90, 7, 0.08, 2.5)]
+
+
+def _baseline(dfa, ct_value, payback_value, elec_value, interest_value):
+    """The pandas loop the callback ran before cost_engine, column for column."""
+    ct = ct_value
+    int_period = payback_value
+    int_rate = interest_value / 100
+    fv = {i: dict(v) for i, v in FV.items()}
+    fv['er']['pgj_rate'] = elec_value / 0.0036
+    fv['ashp']['pgj_rate'] = elec_value / 0.0036
+    fv['gshp']['pgj_rate'] = elec_value / 0.0036
+    fv['hyb']['pgj_rate'] = ((elec_value * 0.95) / 0.0036) + ((29+9) * 0.05)
+    base_pgj_rate = 44
+    for i in fv:
+        dfa[f'{i}_mech_psf'] = calculate_amortization_amount(dfa[f'{i}_mech_cost'], int_rate, int_period) / dfa.typology_sf
+        dfa[f'{i}_elec_psf'] = calculate_amortization_amount(dfa[f'{i}_elec_cost'], int_rate, int_period) / dfa.typology_sf
+        dfa[f'{i}_fuel_psf'] = (dfa.base_fuel_cost * ((fv[i]['pgj_rate'] + (fv[i]['ct_rate'] * (ct - 30))) / base_pgj_rate)) * (1 / fv[i]['cop'])
+        dfa[f'{i}_total_psf'] = dfa[f'{i}_mech_psf'] + dfa[f'{i}_elec_psf'] + dfa[f'{i}_fuel_psf']
+    return dfa
+
+
+@pytest.fixture(scope='module')
+def district():
+    df = pd.read_csv(DISTRICT_CSV)
+    return df, cost_engine.load_inputs(df, list(FV))
+
+
+@pytest.mark.parametrize('sliders', SLIDERS)
+def test_evaluate_scenario_matches_the_baseline_loop(district, sliders):
+    df, inputs = district
+    ct, payback, elec, interest = sliders
+    expected = _baseline(df.copy(), ct, payback, elec, interest)
+    costs = cost_engine.evaluate_scenario(inputs, ct, payback, interest / 100, elec).costs
+    for part in cost_engine.CostResult._fields:
+        reference = expected[[f'{i}_{part}_psf' for i in FV]].to_numpy()
+        np.testing.assert_allclose(getattr(costs, part), reference, rtol=1e-9, atol=1e-12)
+
+
+def test_batch_matches_one_at_a_time(district):
+    _, inputs = district
+    catalog = cost_engine.FUEL_CATALOG
+    ct, payback, elec, interest = (np.array(column, dtype=float) for column in zip(*SLIDERS))
+    pgj_rate = np.stack([cost_engine.fuel_pgj_rates(catalog, inputs.fuels, e) for e in elec])
+    n = len(SLIDERS)
+    batch = cost_engine.compute_costs_batch(
+        inputs, pgj_rate, np.tile(catalog.column('ct_rate', inputs.fuels), (n, 1)),
+        np.tile(catalog.column('cop', inputs.fuels), (n, 1)), ct, interest / 100, payback)
+    for k, (c, p, e, r) in enumerate(SLIDERS):
+        single = cost_engine.evaluate_scenario(inputs, c, p, r / 100, e).costs
+        for whole, one in zip(batch, single):
+            np.testing.assert_array_equal(whole[k], one)
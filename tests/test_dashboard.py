@@ -0,0 +1,143 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import dashboard
+import scenario_cache
+
+SLIDERS = ('ct-slider', 'payback-slider', 'elec-slider', 'interest-slider')
+
+
+@pytest.fixture(scope='module')
+def client():
+    return dashboard.server.test_client()
+
+
+def _component(node, component_id):
+    if isinstance(node, dict):
+        if node.get('props', {}).get('id') == component_id:
+            return node['props']
+        node = list(node.values())
+    if isinstance(node, list):
+        for child in node:
+            found = _component(child, component_id)
+            if found is not None:
+                return found
+    return None
+
+
+def _drilldown(client, x):
+    values = [{'points': [{'x': x}]} if x else None] + list(scenario_cache.DEFAULT_KEY)
+    ids = ['graph_output'] + list(SLIDERS)
+    props = ['clickData'] + ['value'] * len(SLIDERS)
+    body = {'output': '..drilldown-table.data...drilldown-table.columns...drilldown-title.children..',
+            'outputs': [{'id': 'drilldown-table', 'property': 'data'},
+                        {'id': 'drilldown-table', 'property': 'columns'},
+                        {'id': 'drilldown-title', 'property': 'children'}],
+            'inputs': [{'id': i, 'property': p, 'value': v} for i, p, v in zip(ids, props, values)],
+            'changedPropIds': ['graph_output.clickData']}
+    return client.post('/_dash-update-component', json=body)
+
+
+def test_drilldown_lists_the_clicked_bar(client):
+    label = dashboard.data.grouping.labels[0]
+    response = _drilldown(client, label)
+    assert response.status_code == 200
+    outputs = json.loads(response.get_data())['response']
+    records = outputs['drilldown-table']['data']
+    assert records and len(records) <= dashboard.DRILLDOWN_ROWS
+    assert outputs['drilldown-title']['children'].startswith(f'{label}:')
+    assert set(dashboard.fv) <= set(records[0])
+
+
+def test_drilldown_on_a_faceted_bar(client):
+    # past figures.FACET_FUELS the x axis is [fuel label, bar]
+    label = dashboard.data.grouping.labels[-1]
+    response = _drilldown(client, [dashboard.fv[dashboard.data.district.fuels[0]].label, label])
+    assert response.status_code == 200
+    outputs = json.loads(response.get_data())['response']
+    assert outputs['drilldown-title']['children'].startswith(f'{label}:')
+
+
+def test_drilldown_without_a_click(client):
+    assert _drilldown(client, None).status_code == 204
+
+
+def test_reload_discards_the_previous_files(tmp_path, monkeypatch):
+    import data_loader
+
+    source = tmp_path / 'district_data.csv'
+    source.write_text(open(dashboard.DATA_PATH).read())
+    cache_dir = tmp_path / 'cache'
+    monkeypatch.setenv('BUILD_SCENARIO_CUBE', '1')
+    monkeypatch.setattr(data_loader, 'CACHE_DIR', str(cache_dir))
+    monkeypatch.setattr(dashboard, 'DATA_PATH', str(source))
+    monkeypatch.setattr(dashboard.app, 'layout', dashboard.app.layout)
+    monkeypatch.setattr(dashboard, 'data', dashboard.load_data(str(source)))
+    old = dashboard.data.cube
+    assert old is not None and os.path.isdir(old.path)
+
+    lines = source.read_text().splitlines()
+    lines[1] = lines[1].replace(',1.26,', ',1.3,', 1)   # one row's base fuel cost
+    source.write_text('\n'.join(lines) + '\n')
+    assert dashboard.reload_data() == 'rows'
+    assert not os.path.exists(old.path)
+    assert os.path.isdir(dashboard.data.cube.path)
+    kept = sorted(name for name in os.listdir(cache_dir) if not name.endswith('.lock'))
+    assert kept == sorted([os.path.basename(dashboard.data.cube.path),
+                           f'district_data.csv-{dashboard.data.source.version}'])
+
+
+def test_import_has_no_side_effects():
+    # no warm-up requests and no watcher thread until something serves
+    code = ('import threading, dashboard, scenario_cache; '
+            'print(len(scenario_cache.figures.items()), sorted(t.name for t in threading.enumerate()))')
+    env = dict(os.environ)
+    env.pop('DATA_POLL_INTERVAL', None)
+    out = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert out.stdout.split('\n')[-2] == "0 ['MainThread']"
+
+
+def test_bands_cut_short_are_not_cached(monkeypatch):
+    import uncertainty
+
+    monkeypatch.setattr(uncertainty, 'WORKERS', 0)   # only the first chunk, as if out of budget
+    key = scenario_cache.normalize_inputs(120, 15, 0.1, 3)
+    patch = dashboard.get_patch(key, uncertain=True)
+    assert patch is not None
+    assert (dashboard.data.version,) + key not in scenario_cache.bands
+    assert (dashboard.data.version,) + key + (True, False) not in scenario_cache.figures
+    assert (dashboard.data.version,) + key in scenario_cache.scenarios
+
+
+def test_new_year_redraws_the_layout(client, monkeypatch):
+    monkeypatch.setattr(dashboard.app, 'layout', dashboard.app.layout)
+    monkeypatch.setattr(dashboard, 'layout_year', dashboard.layout_year)
+    before = dashboard.app.layout
+    client.get('/')
+    assert dashboard.app.layout is before
+    monkeypatch.setenv('LIFECYCLE_START_YEAR', str(dashboard.layout_year + 1))
+    client.get('/')
+    assert dashboard.app.layout is not before
+    figure = _component(json.loads(client.get('/_dash-layout').get_data()), 'lifecycle_output')['figure']
+    assert figure['data'][0]['x'][0] == dashboard.layout_year
+
+
+def test_compressed_responses_report_their_raw_size(client):
+    response = client.get('/_dash-layout', headers={'Accept-Encoding': 'br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert int(response.headers['X-Uncompressed-Length']) > int(response.headers['Content-Length'])
+    exposition = client.get('/metrics').get_data(as_text=True)
+    assert 'dashboard_response_uncompressed_bytes_count{route="/_dash-layout"}' in exposition
+
+
+def test_unreachable_breakevens_show_as_na(client):
+    records = dashboard.breakeven_records(scenario_cache.DEFAULT_KEY)
+    values = [r[c] for r in records for c in ('carbon_tax', 'elec_price')]
+    assert None in values and all(v is None or v >= 0 for v in values)
+    columns = _component(json.loads(client.get('/_dash-layout').get_data()), 'breakeven-table')['columns']
+    assert {c['id']: c.get('format', {}).get('nully') for c in columns}['carbon_tax'] == 'n/a'
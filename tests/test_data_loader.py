@@ -0,0 +1,47 @@
+import sys
+
+import pandas as pd
+import pytest
+
+import data_loader
+
+
+@pytest.fixture
+def no_pyarrow(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)   # import pyarrow raises ImportError
+
+
+def test_parquet_without_pyarrow_says_so(tmp_path, no_pyarrow):
+    path = tmp_path / 'district.parquet'
+    path.write_bytes(b'PAR1')
+    with pytest.raises(ImportError, match='need pyarrow installed'):
+        data_loader.read_source(str(path))
+
+
+def test_parquet_source_matches_csv(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = tmp_path / 'district.parquet'
+    pd.read_csv('district_data.csv').to_parquet(path)
+    pd.testing.assert_frame_equal(data_loader.read_source(str(path)), data_loader.read_source('district_data.csv'))
+
+
+def test_extra_columns_are_left_out(tmp_path):
+    frame = pd.read_csv('district_data.csv')
+    frame.insert(2, 'note', ['corner lot, 2 floors'] * len(frame))
+    frame['address'] = [f'{k} Main St' for k in range(len(frame))]
+    path = tmp_path / 'district.csv'
+    frame.to_csv(path, index=False)
+    df = data_loader.read_source(str(path))
+    assert 'note' not in df and 'address' not in df
+    pd.testing.assert_frame_equal(df, data_loader.read_source('district_data.csv'))
+    district = data_loader.load_district(str(path), str(tmp_path / 'cache'))
+    assert list(district.typologies.columns) == list(pd.read_csv('district_data.csv').columns)
+
+
+def test_extra_columns_are_left_out_of_parquet(tmp_path):
+    pytest.importorskip('pyarrow')
+    frame = pd.read_csv('district_data.csv')
+    frame['note'] = 'x'
+    path = tmp_path / 'district.parquet'
+    frame.to_parquet(path)
+    pd.testing.assert_frame_equal(data_loader.read_source(str(path)), data_loader.read_source('district_data.csv'))
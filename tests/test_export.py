@@ -0,0 +1,40 @@
+import io
+import sys
+
+import pandas as pd
+import pytest
+
+import dashboard
+import export
+
+
+@pytest.fixture(scope='module')
+def client():
+    return dashboard.server.test_client()
+
+
+def test_csv_export(client):
+    response = client.get('/api/export?carbon_tax=30,40&format=csv')
+    assert response.status_code == 200
+    frame = pd.read_csv(io.BytesIO(response.get_data()))
+    assert list(frame.columns) == list(export.COLUMNS)
+    assert set(frame.carbon_tax) == {30, 40}
+    assert len(frame) == 2 * len(dashboard.data.district.typology_name) * len(dashboard.data.district.fuels)
+
+
+def test_parquet_export_matches_csv(client):
+    pytest.importorskip('pyarrow')
+    parquet = pd.read_parquet(io.BytesIO(client.get('/api/export?carbon_tax=30,40&format=parquet').get_data()))
+    csv = pd.read_csv(io.BytesIO(client.get('/api/export?carbon_tax=30,40&format=csv').get_data()))
+    assert len(parquet) == len(csv)
+    assert (parquet.total - csv.total).abs().max() < 1e-6
+
+
+def test_parquet_without_pyarrow(client, monkeypatch, capsys):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    response = client.get('/api/export?format=parquet')
+    assert response.status_code == 501
+    assert b'pyarrow' in response.get_data()
+    with pytest.raises(SystemExit):
+        export.main(['--format', 'parquet'])
+    assert 'pyarrow' in capsys.readouterr().err
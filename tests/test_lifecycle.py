@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import annuity
+import cost_engine
+import lifecycle
+
+
+@pytest.fixture(scope='module')
+def inputs():
+    return cost_engine.load_inputs(pd.read_csv('district_data.csv'), cost_engine.FUEL_CATALOG)
+
+
+def test_every_year_is_a_snapshot_until_the_loan_is_paid(inputs):
+    int_period, int_rate, elec_value = 10, 0.05, 0.16
+    result = lifecycle.project(inputs, 'rising', 30, int_period, int_rate, elec_value, year=np.arange(2026, 2051))
+    for k, ct in enumerate(result.ct):
+        costs = cost_engine.evaluate_scenario(inputs, ct, int_period, int_rate, elec_value).costs
+        assert np.array_equal(result.costs.fuel[k], costs.fuel)
+        if k < int_period:
+            assert np.array_equal(result.costs.total[k], costs.total)
+        else:   # capital stops once paid off
+            assert not result.costs.mech[k].any() and not result.costs.elec[k].any()
+            assert np.array_equal(result.costs.total[k], costs.fuel)
+
+
+def test_discounted_loan_payments_are_the_capital_cost(inputs):
+    result = lifecycle.project(inputs, 'flat', 30, 20, 0.05, 0.16, year=np.arange(2026, 2051))
+    discount = 1.05 ** -np.arange(1, 26.0)
+    paid = (result.costs.mech + result.costs.elec) * discount[:, None, None]
+    assert np.allclose(paid.sum(axis=0), inputs.capital_psf.sum(axis=0))
+
+
+def test_npv_by_hand():
+    # one building, one electric fuel: 100,000$ capital on 1,000 sf, 2 year loan at 10%
+    catalog = cost_engine.FUEL_CATALOG
+    inputs = cost_engine.make_inputs(['a'], ['Office'], [1000.0], [2.0], [[100_000.0]], [[0.0]], ('er',))
+    result = lifecycle.project(inputs, 'flat', 50, 2, 0.10, 0.10, catalog, year=[2030, 2031, 2032])
+    payment = 100.0 * annuity.annuity_factor(0.10, 2)   # $/sf a year, 57.619...
+    fuel = cost_engine.evaluate_scenario(inputs, 50, 2, 0.10, 0.10, catalog).costs.fuel[0, 0]
+    expected = [(payment + fuel) / 1.1,
+                (payment + fuel) / 1.1 + (payment + fuel) / 1.1 ** 2,
+                (payment + fuel) / 1.1 + (payment + fuel) / 1.1 ** 2 + fuel / 1.1 ** 3]
+    assert payment == pytest.approx(57.6190476, rel=1e-8)
+    assert result.npv[:, 0, 0] == pytest.approx(expected, rel=1e-12)
+    assert result.district[:, 0] == pytest.approx(expected, rel=1e-12)
+
+
+@pytest.mark.parametrize('ct_now', [30, 170, 250])
+def test_target_paths_never_fall_below_today(ct_now):
+    year = np.arange(2026, 2051)
+    target = lifecycle.carbon_path('target', ct_now, year)
+    rising = lifecycle.carbon_path('rising', ct_now, year)
+    assert target[0] == ct_now
+    assert np.all(np.diff(target) >= 0) and np.all(target >= ct_now)
+    assert target[year == lifecycle.TARGET_YEAR] == max(ct_now, lifecycle.TARGET_CT)
+    assert np.all(target[year >= lifecycle.TARGET_YEAR] == max(ct_now, lifecycle.TARGET_CT))
+    assert np.all(rising >= target)
+    assert rising[-1] == max(ct_now, lifecycle.TARGET_CT) + lifecycle.RISE_AFTER_TARGET * (2050 - lifecycle.TARGET_YEAR)
+
+
+def test_start_year_is_asked_every_time(monkeypatch, inputs):
+    import dashboard
+    import scenario_cache
+
+    monkeypatch.setenv('LIFECYCLE_START_YEAR', '2040')
+    assert lifecycle.years()[0] == 2040
+    first = dashboard.get_projection('target', scenario_cache.DEFAULT_KEY)
+    monkeypatch.setenv('LIFECYCLE_START_YEAR', '2041')
+    second = dashboard.get_projection('target', scenario_cache.DEFAULT_KEY)
+    assert (first.years[0], second.years[0]) == (2040, 2041)
+    assert len(second.years) == 2050 - 2041 + 1
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+import scenario_cache
+
+THREADS = 8
+
+
+def _race(cache, compute):
+    """get_or_compute('k', compute) from THREADS threads at once; returns
+    each thread's value or exception once the waiters are all parked."""
+    outcomes = [None] * THREADS
+
+    def call(i):
+        try:
+            outcomes[i] = cache.get_or_compute('k', compute)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    return threads, outcomes
+
+
+def _wait_for_waiters(cache):
+    deadline = time.monotonic() + 10
+    while cache.coalesced < THREADS - 1:
+        assert time.monotonic() < deadline, 'callers did not coalesce'
+        time.sleep(0.001)
+
+
+def test_concurrent_misses_compute_once():
+    cache = scenario_cache.LRUCache(4)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(10)
+        return object()
+
+    threads, outcomes = _race(cache, compute)
+    _wait_for_waiters(cache)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert all(value is outcomes[0] for value in outcomes)
+    assert cache.get('k') is outcomes[0]
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached():
+    cache = scenario_cache.LRUCache(4)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(10)
+        raise RuntimeError('boom')
+
+    threads, outcomes = _race(cache, compute)
+    _wait_for_waiters(cache)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert all(isinstance(e, RuntimeError) for e in outcomes)
+    assert 'k' not in cache
+    assert cache.get_or_compute('k', lambda: 42) == 42   # the next caller computes again
+
+
+def test_put_evicts_least_recently_used_at_maxsize():
+    cache = scenario_cache.LRUCache(3)
+    for key in 'abc':
+        cache.put(key, key.upper())
+    assert cache.get('a') == 'A'          # a is now the most recently used
+    cache.put('d', 'D')                   # evicts b, the least recently used
+    assert [key for key, _ in cache.items()] == ['c', 'a', 'd']
+    cache.put('c', 'C2')                  # overwriting refreshes c without evicting
+    cache.put('e', 'E')                   # evicts a
+    assert [key for key, _ in cache.items()] == ['d', 'c', 'e']
+    assert cache.get('b') is None and cache.get('c') == 'C2'
+    assert len(cache) == 3
+    assert cache.stats()['evictions'] == 2
+
+
+def test_maxsize_zero_stores_nothing():
+    cache = scenario_cache.LRUCache(0)
+    cache.put('a', 1)
+    assert len(cache) == 0 and cache.get('a') is None
+    with pytest.raises(ValueError):
+        scenario_cache.LRUCache(-1)
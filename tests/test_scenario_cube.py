@@ -0,0 +1,72 @@
+import os
+import threading
+
+import numpy as np
+
+import cost_engine
+import scenario_cube
+
+
+def _inputs():
+    fuels = tuple(cost_engine.FUEL_CATALOG)[:2]
+    return cost_engine.make_inputs(['a', 'b'], ['Office', 'Retail'], [1000.0, 2000.0], [1.2, 1.5],
+                                   [[1e6, 2e6], [3e5, 4e5]], [[0.0, 5e4], [0.0, 1e4]], fuels)
+
+
+def test_concurrent_builders_build_once(tmp_path, monkeypatch):
+    writes = []
+    write = scenario_cube._write
+
+    def counting(*args):
+        writes.append(args[-1])
+        write(*args)
+    monkeypatch.setattr(scenario_cube, '_write', counting)
+    inputs = _inputs()
+    cubes = []
+    threads = [threading.Thread(target=lambda: cubes.append(
+        scenario_cube.open_or_build(inputs, cost_engine.FUEL_CATALOG, 'v1', str(tmp_path), max_bytes=float('inf'))))
+        for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(writes) == 1
+    assert len({cube.path for cube in cubes}) == 1
+    key = (30, 20, 0.16, 5.0)
+    expected = cost_engine.evaluate_scenario(inputs, 30, 20, 0.05, 0.16).costs.total
+    assert np.allclose(scenario_cube.scenario(cubes[0], key).costs.total, expected)
+
+
+def test_discard_removes_the_files_but_not_the_map(tmp_path):
+    cube = scenario_cube.open_or_build(_inputs(), cost_engine.FUEL_CATALOG, 'v1', str(tmp_path),
+                                       max_bytes=float('inf'))
+    before = np.array(cube.cheapest_avg)
+    scenario_cube.discard(cube)
+    assert os.listdir(tmp_path) == []
+    assert np.array_equal(np.asarray(cube.cheapest_avg), before)
+
+
+def test_budget_is_what_is_written(tmp_path):
+    cube = scenario_cube.open_or_build(_inputs(), cost_engine.FUEL_CATALOG, 'v1', str(tmp_path),
+                                       max_bytes=float('inf'))
+    written = sum(os.path.getsize(os.path.join(cube.path, name)) for name in os.listdir(cube.path)
+                  if name.endswith('.npy'))
+    assert abs(written - scenario_cube.cube_bytes(_inputs())) < 1024   # .npy headers
+    # ~30 bars of a large district and 29 fuels stay well inside the default budget
+    assert scenario_cube.cube_bytes(_many(30, 29)) < scenario_cube.CUBE_MAX_BYTES
+
+
+def test_cheapest_matches_the_engine(tmp_path):
+    inputs = _inputs()
+    cube = scenario_cube.open_or_build(inputs, cost_engine.FUEL_CATALOG, 'v1', str(tmp_path),
+                                       max_bytes=float('inf'))
+    for ct, payback, elec, interest in [(30, 20, 0.16, 5.0), (340, 1, 0.0, 10.0), (170, 40, 0.3, 0.0)]:
+        total = cost_engine.evaluate_scenario(inputs, ct, payback, interest / 100, elec).costs.total
+        c, p, e, r = scenario_cube.grid_index((ct, payback, elec, interest))
+        assert np.array_equal(cube.cheapest[c, p, e, r], total.argmin(axis=1))
+        assert cube.cheapest_avg[c, p, e, r] == total.mean(axis=0).argmin()
+
+
+def _many(n, f):
+    return cost_engine.make_inputs([f't{k}' for k in range(n)], ['Office'] * n, np.ones(n), np.ones(n),
+                                   np.ones((n, f)), np.ones((n, f)), tuple(f'f{k}' for k in range(f)))
@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+
+import cost_engine
+import shared_cache
+
+
+def test_scenario_round_trip_without_pickle(tmp_path):
+    store = shared_cache.open_store(str(tmp_path / 'cache.sqlite'))
+    cache = shared_cache.SharedCache(store, 'scenarios', shared_cache._scenario_npz,
+                                     shared_cache._scenario_from_npz)
+    scenario = cost_engine.Scenario(ct=30, int_period=20, int_rate=0.05, elec_value=0.16,
+                                    pgj_rate=np.array([10.0, 44.4]),
+                                    costs=cost_engine.CostResult(*(np.arange(6.0).reshape(2, 3) + k
+                                                                   for k in range(4))))
+    cache.put((30, 20, 0.16, 5), scenario)
+    back = cache.get((30, 20, 0.16, 5))
+    assert (back.ct, back.int_period, back.int_rate, back.elec_value) == (30, 20, 0.05, 0.16)
+    assert type(back.ct) is int and type(back.int_rate) is float
+    assert np.array_equal(back.pgj_rate, scenario.pgj_rate)
+    for got, expected in zip(back.costs, scenario.costs):
+        assert np.array_equal(got, expected)
+
+
+def test_directory_is_made_private(tmp_path):
+    path = tmp_path / 'shared' / 'cache.sqlite'
+    assert shared_cache.open_store(str(path)) is not None
+    assert os.stat(path.parent).st_mode & 0o777 == 0o700
+
+
+def test_writable_by_others_is_refused(tmp_path):
+    path = tmp_path / 'cache.sqlite'
+    path.write_bytes(b'')
+    os.chmod(path, 0o666)
+    assert shared_cache.open_store(str(path)) is None
+    directory = tmp_path / 'open'
+    directory.mkdir()
+    os.chmod(directory, 0o777)
+    assert shared_cache.open_store(str(directory / 'cache.sqlite')) is None
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+import cost_engine
+import scenario_cache
+import uncertainty
+from uncertainty import BASE_CT, BASE_PGJ_RATE, PARAMETERS, PERCENTILES
+
+FUELS = tuple(cost_engine.FUEL_CATALOG)
+
+
+def _inputs():
+    n, f = 3, len(FUELS)
+    return cost_engine.make_inputs(['a', 'b', 'c'], ['Office'] * 3, [1000.0, 2000.0, 500.0], [1.2, 0.8, 2.0],
+                                   np.full((n, f), 1e6), np.zeros((n, f)), FUELS)
+
+
+def test_histogram_percentiles_match_the_samples():
+    dists = uncertainty.fuel_distributions(FUELS, 0.16)
+    low, high = uncertainty.rate_range(dists, 100)
+    counts = uncertainty._chunk_histogram(dists, 100, 0, 0, 100_000, low, high)
+    rng = np.random.default_rng(np.random.SeedSequence(0, spawn_key=(0,)))
+    draws = {p: uncertainty._draw(rng, dists[p], 100_000) for p in PARAMETERS}
+    rate = (draws['pgj_rate'] + draws['ct_rate'] * (100 - BASE_CT)) / BASE_PGJ_RATE / draws['cop']
+    assert np.all(rate >= low - 1e-12) and np.all(rate <= high + 1e-12)
+    approx = uncertainty._percentiles(counts, low, high, PERCENTILES)
+    assert np.allclose(approx, np.percentile(rate, PERCENTILES, axis=0), atol=2 * (high - low).max() / uncertainty.BINS)
+
+
+def test_bands_are_ordered():
+    inputs = _inputs()
+    scenario = cost_engine.evaluate_scenario(inputs, 100, 20, 0.05, 0.16)
+    result = uncertainty.bands(inputs, scenario, samples=20_000, chunk=20_000)
+    assert result.samples == 20_000
+    assert np.all(result.low <= result.mid) and np.all(result.mid <= result.high)
+    # the wide ones are wide, point-valued fuels collapse to the scenario itself
+    k = FUELS.index('gh')
+    assert np.all(result.high[:, k] > result.low[:, k])
+    k = FUELS.index('er')
+    assert np.allclose(result.mid[:, k], scenario.costs.total[:, k])
+
+
+def test_same_seed_same_bands():
+    first, used = uncertainty.rate_percentiles(FUELS, 100, 0.16, samples=20_000, chunk=20_000, seed=7)
+    again, _ = uncertainty.rate_percentiles(FUELS, 100, 0.16, samples=20_000, chunk=20_000, seed=7)
+    other, _ = uncertainty.rate_percentiles(FUELS, 100, 0.16, samples=20_000, chunk=20_000, seed=8)
+    assert used == 20_000
+    assert np.array_equal(first, again)
+    assert not np.array_equal(first, other)
+
+
+def test_pool_chunks_add_up_to_the_serial_histogram(monkeypatch):
+    monkeypatch.setattr(uncertainty, 'WORKERS', 2)
+    try:
+        pooled, used = uncertainty.rate_percentiles(FUELS, 100, 0.16, samples=40_000, chunk=10_000, budget=120)
+    finally:
+        uncertainty.shutdown()
+    assert used == 40_000
+    dists = uncertainty.fuel_distributions(FUELS, 0.16)
+    low, high = uncertainty.rate_range(dists, 100)
+    counts = sum(uncertainty._chunk_histogram(dists, 100, uncertainty.SEED, c, 10_000, low, high) for c in range(4))
+    assert np.array_equal(pooled, uncertainty._percentiles(counts, low, high, PERCENTILES))
+
+
+def test_out_of_budget_uses_the_first_chunks_only(monkeypatch):
+    monkeypatch.setattr(uncertainty, 'WORKERS', 0)   # nothing but chunk 0 can finish
+    rates, used = uncertainty.rate_percentiles(FUELS, 100, 0.16, samples=40_000, chunk=10_000)
+    alone, _ = uncertainty.rate_percentiles(FUELS, 100, 0.16, samples=10_000, chunk=10_000)
+    assert used == 10_000
+    assert np.array_equal(rates, alone)
+    assert not uncertainty.complete(uncertainty.Bands(None, None, None, used), samples=40_000)
+
+
+@pytest.fixture
+def cache():
+    return scenario_cache.LRUCache(8)
+
+
+def test_cut_short_results_are_not_cached(cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return uncertainty.Bands(None, None, None, len(calls) * uncertainty.SAMPLES // 2)
+    first = cache.get_or_compute('key', compute, keep=uncertainty.complete)
+    assert first.samples < uncertainty.SAMPLES and 'key' not in cache
+    second = cache.get_or_compute('key', compute, keep=uncertainty.complete)
+    assert second.samples == uncertainty.SAMPLES and 'key' in cache
+    assert cache.get_or_compute('key', compute, keep=uncertainty.complete) is second
+    assert len(calls) == 2
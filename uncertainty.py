@@ -0,0 +1,220 @@
+import collections
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+
+from cost_engine import BASE_CT, BASE_PGJ_RATE, FUEL_CATALOG, fuel_pgj_rates
+
+#-----------------------------------------------------------------------
+#PRICE UNCERTAINTY (MONTE CARLO)
+#-----------------------------------------------------------------------
+# pgj_rate, ct_rate and cop of each fuel can be given as a distribution
+# instead of the catalog's point value. For every typology the yearly $/sf
+# is capital + base_fuel_cost * rate with
+#
+#   rate = (pgj_rate + ct_rate * (ct - BASE_CT)) / BASE_PGJ_RATE / cop
+#
+# and base_fuel_cost >= 0, so the P10/P50/P90 of every typology (and of the
+# avg line) are the P10/P50/P90 of the fuel's rate put through that same
+# line. Only the per-fuel rate is sampled: chunks of samples are drawn in a
+# process pool, each chunk is binned into a fixed-range histogram per fuel
+# and the histograms are summed, so 10^6 samples cost a few KB of IPC.
+#
+# Each chunk has its own seed derived from (seed, chunk number), so for a
+# given seed the bands only depend on how many chunks finished; chunk 0 runs
+# in the calling thread, and only the contiguous prefix of chunks that
+# finished within the time budget is used.
+
+PARAMETERS = ('pgj_rate', 'ct_rate', 'cop')
+PERCENTILES = (10, 50, 90)
+SAMPLES = int(os.environ.get('UNCERTAINTY_SAMPLES', 200_000))
+CHUNK = int(os.environ.get('UNCERTAINTY_CHUNK', 25_000))
+BUDGET = float(os.environ.get('UNCERTAINTY_BUDGET', 0.5))   # seconds per band computation
+SEED = int(os.environ.get('UNCERTAINTY_SEED', 0))
+WORKERS = int(os.environ.get('UNCERTAINTY_WORKERS', min(4, os.cpu_count() or 1)))
+BINS = 4096
+
+# kind    'point' | 'uniform' | 'triangular'
+# params  (value,) | (low, high) | (low, mode, high)
+Distribution = collections.namedtuple('Distribution', ['kind', 'params'])
+
+# client-facing defaults: hydrogen prices and heat-pump COP are the wide ones.
+# pgj_rate of fuels that track the electricity slider comes from the slider
+DEFAULT_DISTRIBUTIONS = {
+    'ng':   {'pgj_rate': Distribution('triangular', (7, 9, 13))},
+    'bh':   {'pgj_rate': Distribution('triangular', (14, 18, 30)),
+             'ct_rate':  Distribution('uniform', (0.004, 0.012))},
+    'gh':   {'pgj_rate': Distribution('triangular', (35, 60, 95))},
+    'ashp': {'cop':      Distribution('triangular', (2.2, 2.8, 3.2))},
+    'gshp': {'cop':      Distribution('triangular', (2.6, 3.1, 3.6))},
+    'hyb':  {'cop':      Distribution('triangular', (2.2, 2.8, 3.2))},
+}
+
+# low, mid, high   P10/P50/P90 total $/sf, (n_typologies, n_fuels)
+# samples          number of samples that finished within the budget
+Bands = collections.namedtuple('Bands', ['low', 'mid', 'high', 'samples'])
+
+
+def _check(kind, params):
+    sizes = {'point': 1, 'uniform': 2, 'triangular': 3}
+    if kind not in sizes or len(params) != sizes[kind]:
+        raise ValueError(f'bad distribution {kind}{tuple(params)}')
+    if list(params) != sorted(params):
+        raise ValueError(f'distribution bounds out of order: {kind}{tuple(params)}')
+    return Distribution(kind, tuple(float(p) for p in params))
+
+
+def read_distributions(path):
+    """{fuel: {parameter: Distribution}} from a JSON file like
+    {"gh": {"pgj_rate": ["triangular", 35, 60, 95]}}."""
+    with open(path) as f:
+        raw = json.load(f)
+    out = {}
+    for fuel, spec in raw.items():
+        if fuel not in FUEL_CATALOG:
+            raise ValueError(f'unknown fuel {fuel!r}')
+        for parameter, (kind, *params) in spec.items():
+            if parameter not in PARAMETERS:
+                raise ValueError(f'{fuel}: {parameter!r} is not one of {PARAMETERS}')
+            out.setdefault(fuel, {})[parameter] = _check(kind, params)
+    return out
+
+
+DISTRIBUTIONS = (read_distributions(os.environ['UNCERTAINTY_FILE']) if os.environ.get('UNCERTAINTY_FILE')
+                 else DEFAULT_DISTRIBUTIONS)
+
+
+def fuel_distributions(fuels, elec_value, distributions=None, catalog=FUEL_CATALOG):
+    """Per-parameter lists of Distribution in fuel order, point values where nothing is given."""
+    distributions = DISTRIBUTIONS if distributions is None else distributions
+    pgj_rate = fuel_pgj_rates(catalog, fuels, elec_value)
+    out = {}
+    for parameter in PARAMETERS:
+        column = []
+        for k, i in enumerate(fuels):
+            given = distributions.get(i, {}).get(parameter)
+            if parameter == 'pgj_rate' and catalog[i].elec_share:
+                given = None   # set by the electricity slider
+            if given is None:
+                value = pgj_rate[k] if parameter == 'pgj_rate' else getattr(catalog[i], parameter)
+                given = Distribution('point', (float(value),))
+            column.append(given)
+        out[parameter] = column
+    return out
+
+
+def _draw(rng, column, size):
+    out = np.empty((size, len(column)))
+    for k, (kind, params) in enumerate(column):
+        if kind == 'point':
+            out[:, k] = params[0]
+        elif kind == 'uniform':
+            out[:, k] = rng.uniform(params[0], params[1], size)
+        elif params[0] == params[2]:
+            out[:, k] = params[1]
+        else:
+            out[:, k] = rng.triangular(params[0], params[1], params[2], size)
+    return out
+
+
+def rate_range(dists, ct):
+    """Exact (low, high) of each fuel's rate over the support of the distributions."""
+    bounds = {p: np.array([[d.params[0], d.params[-1]] for d in dists[p]]) for p in PARAMETERS}
+    ct_term = bounds['ct_rate'] * (ct - BASE_CT)
+    num = bounds['pgj_rate'][:, :, None] + ct_term[:, None, :]       # (fuel, pgj end, ct_rate end)
+    corners = num[:, :, :, None] / bounds['cop'][:, None, None, :] / BASE_PGJ_RATE
+    corners = corners.reshape(len(corners), -1)
+    return corners.min(axis=1), corners.max(axis=1)
+
+
+def _chunk_histogram(dists, ct, seed, chunk, size, low, high):
+    """Histogram (fuel, BINS) of `size` sampled rates; runs in the pool."""
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk,)))
+    draws = {p: _draw(rng, dists[p], size) for p in PARAMETERS}
+    rate = (draws['pgj_rate'] + draws['ct_rate'] * (ct - BASE_CT)) / BASE_PGJ_RATE / draws['cop']
+    width = np.where(high > low, high - low, 1.0)
+    bins = np.clip(((rate - low) / width * BINS).astype(np.int64), 0, BINS - 1)
+    offsets = np.arange(len(low)) * BINS
+    return np.bincount((bins + offsets).ravel(), minlength=len(low) * BINS).reshape(len(low), BINS)
+
+
+def _percentiles(counts, low, high, percentiles):
+    """(percentile, fuel) rates from the summed histograms, linear within a bin."""
+    total = counts.sum(axis=1)
+    cum = np.cumsum(counts, axis=1)
+    out = np.empty((len(percentiles), len(low)))
+    for j, q in enumerate(percentiles):
+        for k in range(len(low)):
+            target = q / 100 * total[k]
+            b = min(int(np.searchsorted(cum[k], target)), BINS - 1)
+            before = cum[k, b - 1] if b else 0
+            within = (target - before) / counts[k, b] if counts[k, b] else 0.5
+            out[j, k] = low[k] + (b + within) / BINS * (high[k] - low[k])
+    return out
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    # spawn: the web workers are multi-threaded, forking them is not safe
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def rate_percentiles(fuels, ct, elec_value, samples=SAMPLES, seed=SEED, budget=BUDGET,
+                     distributions=None, catalog=FUEL_CATALOG, percentiles=PERCENTILES, chunk=CHUNK):
+    """(percentile, fuel) matrix of the fuel rate and the number of samples behind it."""
+    dists = fuel_distributions(fuels, elec_value, distributions, catalog)
+    low, high = rate_range(dists, ct)
+    n_chunks = max(1, -(-samples // chunk))
+    sizes = [min(chunk, samples - c * chunk) for c in range(n_chunks)]
+    deadline = time.perf_counter() + budget
+    futures = []
+    if n_chunks > 1 and WORKERS > 0:
+        pool = _executor()
+        futures = [pool.submit(_chunk_histogram, dists, ct, seed, c, sizes[c], low, high)
+                   for c in range(1, n_chunks)]
+    counts = _chunk_histogram(dists, ct, seed, 0, sizes[0], low, high)
+    used = sizes[0]
+    for c, future in enumerate(futures, start=1):
+        try:
+            counts = counts + future.result(timeout=max(0.0, deadline - time.perf_counter()))
+            used += sizes[c]
+        except concurrent.futures.TimeoutError:
+            break   # out of budget, later chunks would leave a gap in the seed sequence
+    for future in futures:
+        future.cancel()
+    return _percentiles(counts, low, high, percentiles), used
+
+
+def complete(result, samples=SAMPLES):
+    """False for Bands cut short by the time budget."""
+    return result.samples >= samples
+
+
+def bands(inputs, scenario, **kwargs):
+    """P10/P50/P90 total $/sf of every typology x fuel at a slider position,
+    plus the same for the avg lines (fuel vector). kwargs go to rate_percentiles."""
+    rates, used = rate_percentiles(inputs.fuels, scenario.ct, scenario.elec_value, **kwargs)
+    capital = scenario.costs.mech + scenario.costs.elec
+    low, mid, high = (capital + inputs.base_fuel_cost[:, None] * r[None, :] for r in rates)
+    return Bands(low=low, mid=mid, high=high, samples=used)